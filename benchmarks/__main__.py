@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+End-to-end benchmark suite: pubsub throughput, RPC latency and message marshalling, reported as JSON.
+
+The router runs in this process; its WebSocket clients run in a forked process.
+
+    python -m benchmarks [--suite pubsub|rpc|marshal] [--output FILE]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import sys
+
+import wouter
+from benchmarks import harness
+from benchmarks import marshal
+from benchmarks import pubsub
+from benchmarks import rpc
+from wouter.router import serializer
+
+SUITES = ('pubsub', 'rpc', 'marshal')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', action='append', choices=SUITES, help='suite to run, all by default; repeatable')
+    parser.add_argument('--output', help='file to write the JSON results to, standard output by default')
+    parser.add_argument('--serializer', default='wamp.2.json', choices=[s for s in serializer.serializers],
+                        help='WAMP subprotocol of the clients')
+    parser.add_argument('--subscribers', default='1,100,10000', help='comma separated subscriber counts')
+    parser.add_argument('--events', type=int, default=100000, help='events delivered per pubsub measurement')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='seconds to wait for the events of a pubsub measurement after publishing them')
+    parser.add_argument('--calls', type=int, default=10000, help='calls per RPC measurement')
+    parser.add_argument('--concurrency', default='1,16', help='comma separated numbers of calls in flight')
+    parser.add_argument('--payload-size', type=int, default=64, help='characters of the event and call argument')
+    parser.add_argument('-n', '--count', type=int, default=100000, help='operations per marshalling measurement')
+    options = parser.parse_args(args)
+    suites = options.suite or SUITES
+
+    harness.raise_file_limit()
+    results = {
+        'wouter': wouter.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'serializer': options.serializer,
+    }
+
+    if 'pubsub' in suites or 'rpc' in suites:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        url = harness.start_router(loop)
+        if 'pubsub' in suites:
+            results['pubsub'] = pubsub.run(loop, url,
+                                           subscribers=[int(n) for n in options.subscribers.split(',')],
+                                           events=options.events,
+                                           payload_size=options.payload_size,
+                                           serializer_id=options.serializer,
+                                           timeout=options.timeout)
+        if 'rpc' in suites:
+            results['rpc'] = [rpc.run(loop, url,
+                                      calls=options.calls,
+                                      concurrency=int(n),
+                                      payload_size=options.payload_size,
+                                      serializer_id=options.serializer)
+                              for n in options.concurrency.split(',')]
+    if 'marshal' in suites:
+        results['marshal'] = marshal.run(options.count)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
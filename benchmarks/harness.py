@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Benchmark harness: an in-process router driven by WebSocket clients running in a forked process.
+
+The router keeps the benchmark process and its event loop to itself, so client work is not measured as router work,
+and each process stays within its file descriptor limit with thousands of connections open.
+"""
+import asyncio
+import multiprocessing
+import resource
+import statistics
+import traceback
+from typing import Any, Callable, Dict, List
+
+from wouter.router import router
+
+
+def raise_file_limit():
+    """Allow as many open files as the hard limit does, for benchmarks with thousands of connections."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_router(loop: asyncio.AbstractEventLoop) -> str:
+    """Start the router on a free local port and return its URL."""
+    async def start():
+        return await router.start_router('127.0.0.1', 0)
+
+    server = loop.run_until_complete(start())
+    return 'ws://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+
+
+def run_clients(loop: asyncio.AbstractEventLoop, target: Callable[..., Any], *args) -> Any:
+    """
+    Run the coroutine function target(*args) in a forked process, serving the router on loop until it returns.
+
+    :return: the result of target, which must be picklable.
+    """
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(sender, target, args))
+    process.start()
+    sender.close()
+    try:
+        ok, result = loop.run_until_complete(loop.run_in_executor(None, receiver.recv))
+    finally:
+        receiver.close()
+        process.join()
+    if not ok:
+        raise RuntimeError('benchmark clients failed:\n' + result)
+    return result
+
+
+def _child(sender, target: Callable[..., Any], args: tuple):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        sender.send((True, loop.run_until_complete(target(*args))))
+    except Exception:
+        sender.send((False, traceback.format_exc()))
+    finally:
+        sender.close()
+
+
+async def gather_batched(coroutines: List[Any], batch: int = 250) -> List[Any]:
+    """Await coroutines a batch at a time, so that thousands of clients do not all connect at once."""
+    results = []
+    for start in range(0, len(coroutines), batch):
+        results.extend(await asyncio.gather(*coroutines[start:start + batch]))
+    return results
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latencies, in seconds, as milliseconds."""
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': at(0.5),
+        'p90_ms': at(0.9),
+        'p99_ms': at(0.99),
+        'p999_ms': at(0.999),
+        'max_ms': ordered[-1] * 1000,
+    }
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Marshal and unmarshal microbenchmarks for every Message class.
+"""
+import time
+from typing import Any, Dict, List
+
+from wouter.router import message
+
+PAYLOAD = ['Hello, world!']
+
+# A representative raw message of every type.
+SAMPLES = [
+    [1, 'com.example.realm', {'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}}],
+    [2, 9129137332, {'roles': {'broker': {}, 'dealer': {}}}],
+    [3, {'message': 'The realm does not exist.'}, 'wamp.error.no_such_realm'],
+    [6, {}, 'wamp.close.close_realm'],
+    [8, 48, 7814135, {}, 'com.myapp.error.object_write_protected', ['Object is write protected.'], {'severity': 3}],
+    [16, 239714735, {}, 'com.myapp.mytopic1', PAYLOAD, {'color': 'orange', 'sizes': [23, 42, 7]}],
+    [17, 239714735, 4429313566],
+    [32, 713845233, {}, 'com.myapp.mytopic1'],
+    [33, 713845233, 5512315355],
+    [34, 85346237, 5512315355],
+    [35, 85346237],
+    [36, 5512315355, 4429313566, {}, PAYLOAD, {'color': 'orange', 'sizes': [23, 42, 7]}],
+    [48, 7814135, {}, 'com.myapp.echo', PAYLOAD, {'x': 1}],
+    [50, 7814135, {}, PAYLOAD, {'x': 1}],
+    [64, 25349185, {}, 'com.myapp.myprocedure1'],
+    [65, 25349185, 2103333224],
+    [66, 788923562, 2103333224],
+    [67, 788923562],
+    [68, 6131533, 9823527, {}, PAYLOAD, {'x': 1}],
+    [70, 6131533, {}, PAYLOAD, {'x': 1}],
+]
+
+
+def _rate(function, argument, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        function(argument)
+    return count / (time.perf_counter() - started)
+
+
+def run(count: int = 100000) -> List[Dict[str, Any]]:
+    """Return marshal and unmarshal operations per second of each message class."""
+    results = []
+    for raw in SAMPLES:
+        msg = message.decode(raw)
+        cls = type(msg)
+        results.append({
+            'message': cls.__name__,
+            'marshal_per_second': _rate(cls.marshal, msg, count),
+            'unmarshal_per_second': _rate(message.decode, raw, count),
+        })
+    return results
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Memory and allocation benchmark for the Message classes.
+
+Compares the slotted classes in wouter.router.message against equivalent classes carrying a per-instance __dict__ (the
+layout before __slots__ was introduced), reporting bytes per message and messages allocated per second.
+
+    python -m benchmarks.message_memory [-n COUNT]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from wouter.router import message
+
+SAMPLES = [
+    (message.Event, (5512315355, 4429313566, {}, ['Hello, world!'])),
+    (message.Publish, (239714735, {}, 'com.myapp.mytopic1', ['Hello, world!'])),
+    (message.Call, (7814135, {}, 'com.myapp.echo', ['Hello, world!'])),
+    (message.Invocation, (6131533, 9823527, {}, ['Hello, world!'])),
+    (message.Yield, (6131533, {}, ['Hello, world!'])),
+    (message.Result, (7814135, {}, ['Hello, world!'])),
+]
+
+
+def with_dict(cls: type) -> type:
+    """Return a copy of cls whose instances store their fields in a __dict__, as every message did before __slots__."""
+    # Reuse the real constructor on a plain class so both variants run the same code; only the layout differs.
+    return type(cls.__name__, (object,), {'__init__': cls.__init__, 'type': cls.type})
+
+
+def bytes_per_message(cls: type, args: tuple, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    messages = [cls(*args) for _ in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    # Exclude the list holding the messages.
+    used -= messages.__sizeof__()
+    return used / count
+
+
+def messages_per_second(cls: type, args: tuple, count: int) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(count):
+        cls(*args)
+    return count / (time.perf_counter() - start)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=100000, help='messages allocated per measurement')
+    options = parser.parse_args(args)
+
+    print('{:<12} {:>14} {:>14} {:>16} {:>16}'.format(
+        'message', 'bytes (dict)', 'bytes (slots)', 'msg/s (dict)', 'msg/s (slots)'))
+    for cls, fields in SAMPLES:
+        before = with_dict(cls)
+        print('{:<12} {:>14.1f} {:>14.1f} {:>16,.0f} {:>16,.0f}'.format(
+            cls.__name__,
+            bytes_per_message(before, fields, options.count),
+            bytes_per_message(cls, fields, options.count),
+            messages_per_second(before, fields, options.count),
+            messages_per_second(cls, fields, options.count)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+PUBLISH to EVENT throughput: one publisher and a growing number of subscribers to one topic.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Sequence
+
+from benchmarks import harness
+from wouter import client
+from wouter.router import serializer
+
+TOPIC = 'com.example.bench'
+
+
+async def _clients(url: str, realm: str, subscribers: int, publications: int, payload: str,
+                   serializer_id: str, timeout: float) -> Dict[str, Any]:
+    serializer_ = serializer.serializers[serializer_id]
+    expected = subscribers * publications
+    done = asyncio.get_event_loop().create_future()
+    received = 0
+
+    def on_event(event):
+        nonlocal received
+        received += 1
+        if received == expected:
+            done.set_result(None)
+
+    async def subscriber():
+        subscriber_ = client.Client(serializer_)
+        await subscriber_.connect(url, realm)
+        await subscriber_.subscribe(TOPIC, on_event)
+        return subscriber_
+
+    subscribers_ = await harness.gather_batched([subscriber() for _ in range(subscribers)])
+    publisher = client.Client(serializer_)
+    await publisher.connect(url, realm)
+
+    started = time.perf_counter()
+    for _ in range(publications):
+        await publisher.publish(TOPIC, [payload])
+    try:
+        await asyncio.wait_for(done, timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    await harness.gather_batched([c.close() for c in subscribers_ + [publisher]])
+    return {
+        'subscribers': subscribers,
+        'publications': publications,
+        'events': expected,
+        'missing': expected - received,
+        'seconds': elapsed,
+        # publish() returns once the message is written, so time publications up to the delivery of their events
+        'publications_per_second': publications / elapsed,
+        'events_per_second': received / elapsed,
+    }
+
+
+def run(loop: asyncio.AbstractEventLoop, url: str, subscribers: Sequence[int] = (1, 100, 10000),
+        events: int = 100000, payload_size: int = 64, serializer_id: str = 'wamp.2.json',
+        timeout: float = 60.0) -> List[Dict[str, Any]]:
+    """
+    Measure event throughput for each number of subscribers.
+
+    :param events: is the number of events to deliver per measurement, spread over as many publications as needed.
+    :param timeout: is the number of seconds to wait for the events after the last publication. Events not delivered
+        by then are reported as missing.
+    """
+    results = []
+    for count in subscribers:
+        publications = max(10, events // count)
+        results.append(harness.run_clients(loop, _clients, url, 'bench.pubsub.%d' % count, count, publications,
+                                           'x' * payload_size, serializer_id, timeout))
+    return results
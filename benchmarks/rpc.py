@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+CALL to RESULT latency: callers invoking an echo procedure through the dealer.
+"""
+import asyncio
+import time
+from typing import Any, Dict
+
+from benchmarks import harness
+from wouter import client
+from wouter.router import serializer
+
+PROCEDURE = 'com.example.echo'
+
+
+async def _clients(url: str, realm: str, calls: int, concurrency: int, payload: str,
+                   serializer_id: str) -> Dict[str, Any]:
+    serializer_ = serializer.serializers[serializer_id]
+    callee = client.Client(serializer_)
+    await callee.connect(url, realm)
+    await callee.register(PROCEDURE, lambda *args: list(args))
+    caller = client.Client(serializer_)
+    await caller.connect(url, realm)
+
+    latencies = []
+
+    async def calling(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            await caller.call(PROCEDURE, [payload])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[calling(calls // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    await asyncio.gather(callee.close(), caller.close())
+    return {
+        'calls': len(latencies),
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'calls_per_second': len(latencies) / elapsed,
+        'latency': harness.percentiles(latencies),
+    }
+
+
+def run(loop: asyncio.AbstractEventLoop, url: str, calls: int = 10000, concurrency: int = 1, payload_size: int = 64,
+        serializer_id: str = 'wamp.2.json') -> Dict[str, Any]:
+    """Measure call latency with a number of calls in flight at once."""
+    return harness.run_clients(loop, _clients, url, 'bench.rpc.%d' % concurrency, calls, concurrency,
+                               'x' * payload_size, serializer_id)
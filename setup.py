@@ -28,6 +28,13 @@ with open('HISTORY.rst') as history_file:
 
 requirements = ['Click>=6.0', 'websockets>=5.0.1']
 
+# Compiled codecs used in place of the pure-Python serializers when installed.
+extra_requirements = {
+    'ujson': ['ujson'],
+    'msgpack': ['msgpack>=0.5.6'],
+    'cbor': ['cbor2'],
+}
+
 setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest', ]
@@ -51,6 +58,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="ISC license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
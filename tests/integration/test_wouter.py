@@ -19,8 +19,16 @@
 
 """Tests for `wouter` package."""
 
+import asyncio
+
 import pytest
 
+from wouter import client
+from wouter.router import rawsocket
+from wouter.router import realm
+from wouter.router import router
+from wouter.router import serializer
+
 
 @pytest.fixture
 def response():
@@ -36,3 +44,86 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+@pytest.fixture
+def url():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def start():
+        return await router.start_router('127.0.0.1', 0)
+
+    server = loop.run_until_complete(start())
+    yield 'ws://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    asyncio.set_event_loop(None)
+    loop.close()
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(asyncio.wait_for(coroutine, 5))
+
+
+@pytest.mark.parametrize('serializer_', [serializer.JSON, serializer.MSGPACK, serializer.CBOR])
+def test_pubsub(url, serializer_):
+    async def pubsub():
+        subscriber = client.Client(serializer_)
+        await subscriber.connect(url, 'realm1')
+        events = asyncio.Queue()
+        await subscriber.subscribe('com.example', events.put_nowait, match='prefix')
+        publisher = client.Client(serializer_)
+        await publisher.connect(url, 'realm1')
+        await publisher.publish('com.example.topic', ['x'], {'y': 1}, acknowledge=True)
+        event = await events.get()
+        await subscriber.close()
+        await publisher.close()
+        return event
+
+    event = run(pubsub())
+
+    assert event.args == ['x']
+    assert event.kwargs == {'y': 1}
+    assert event.details == {'topic': 'com.example.topic'}
+
+
+def test_rpc(url):
+    async def rpc():
+        callee = client.Client()
+        await callee.connect(url, 'realm1')
+        await callee.register('com.example.add', lambda a, b: [a + b])
+        caller = client.Client()
+        await caller.connect(url, 'realm1')
+        result = await caller.call('com.example.add', [1, 2])
+        with pytest.raises(client.ClientError) as e:
+            await caller.call('com.example.missing')
+        await callee.close()
+        await caller.close()
+        return result, e.value
+
+    result, error = run(rpc())
+
+    assert result.args == [3]
+    assert error.error == 'wamp.error.no_such_procedure'
+
+
+@pytest.mark.parametrize('serializer_', [serializer.JSON, serializer.MSGPACK])
+def test_rawsocket(url, serializer_, tmpdir):
+    path = str(tmpdir.join('wouter.sock'))
+
+    async def rpc():
+        await rawsocket.start_rawsocket_unix(path)
+        callee = client.Client(serializer_)
+        await callee.connect('unix://' + path, 'realm1')
+        await callee.register('com.example.add', lambda a, b: [a + b])
+        caller = client.Client(serializer_)
+        await caller.connect(url, 'realm1')
+        result = await caller.call('com.example.add', [1, 2])
+        await callee.close()
+        await caller.close()
+        return result
+
+    assert run(rpc()).args == [3]
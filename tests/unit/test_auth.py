@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import threading
+
+import pytest
+
+from wouter.router import auth
+from wouter.router import error
+
+
+@pytest.fixture
+def users():
+    auth.methods.extend([auth.WAMPCRA, auth.TICKET])
+    auth.users.update({
+        'alice': auth.User('frontend', 'secret'),
+        'bob': auth.User('backend', 'secret', salt='salt', iterations=100, keylen=32),
+        'carol': auth.User('device', auth.derive_key('ticket', 'salt', 100).decode(), salt='salt', iterations=100),
+    })
+    yield auth.users
+    auth.reset()
+
+
+class TestChallenge:
+    def test_wampcra(self, users):
+        attempt = auth.challenge(7, 'realm1', {'authmethods': ['wampcra'], 'authid': 'alice'})
+
+        assert attempt.authmethod == auth.WAMPCRA
+        assert attempt.user is users['alice']
+        challenge = json.loads(attempt.extra()['challenge'])
+        assert challenge['session'] == 7
+        assert challenge['authrole'] == 'frontend'
+
+    def test_salted(self, users):
+        attempt = auth.challenge(7, 'realm1', {'authmethods': ['wampcra'], 'authid': 'bob'})
+
+        assert attempt.extra()['salt'] == 'salt'
+        assert attempt.extra()['iterations'] == 100
+
+    def test_preference(self, users):
+        attempt = auth.challenge(7, 'realm1', {'authmethods': ['ticket', 'wampcra'], 'authid': 'alice'})
+
+        assert attempt.authmethod == auth.WAMPCRA
+
+    def test_anonymous(self, users):
+        auth.methods.append(auth.ANONYMOUS)
+
+        assert auth.challenge(7, 'realm1', {}) is None
+
+    def test_no_method(self, users):
+        with pytest.raises(error.WampError) as e:
+            auth.challenge(7, 'realm1', {'authmethods': ['cryptosign'], 'authid': 'alice'})
+
+        assert e.value.error == error.NO_AUTH_METHOD
+
+    @pytest.mark.parametrize('authmethods', [5, 'ticket', [['ticket']], {'ticket': 1}])
+    def test_invalid_methods(self, users, authmethods):
+        with pytest.raises(error.WampError) as e:
+            auth.challenge(7, 'realm1', {'authmethods': authmethods, 'authid': 'alice'})
+
+        assert e.value.error == error.NO_AUTH_METHOD
+
+    def test_unknown_authid(self, users):
+        with pytest.raises(error.WampError) as e:
+            auth.challenge(7, 'realm1', {'authmethods': ['ticket'], 'authid': 'mallory'})
+
+        assert e.value.error == error.AUTHENTICATION_FAILED
+
+
+class TestAuthenticator:
+    def verify(self, loop, authid, authmethod, signature=None, secret='secret'):
+        attempt = auth.challenge(1, 'realm1', {'authmethods': [authmethod], 'authid': authid})
+        if signature is None:
+            user = attempt.user
+            key = auth.derive_key(secret, user.salt, user.iterations, user.keylen) if user.salt else secret.encode()
+            signature = auth.sign(key, attempt.challenge)
+        return loop.run_until_complete(auth.get().verify(loop, attempt, signature))
+
+    def test_wampcra(self, loop, users):
+        assert self.verify(loop, 'alice', auth.WAMPCRA)
+        assert not self.verify(loop, 'alice', auth.WAMPCRA, secret='guess')
+        assert len(auth.get()) == 0
+
+    def test_wampcra_salted(self, loop, users):
+        assert self.verify(loop, 'bob', auth.WAMPCRA)
+        assert not self.verify(loop, 'bob', auth.WAMPCRA, secret='guess')
+        assert len(auth.get()) == 1
+
+    def test_ticket(self, loop, users):
+        assert self.verify(loop, 'alice', auth.TICKET, 'secret')
+        assert not self.verify(loop, 'alice', auth.TICKET, 'guess')
+
+    def test_ticket_salted(self, loop, users):
+        assert self.verify(loop, 'carol', auth.TICKET, 'ticket')
+        assert not self.verify(loop, 'carol', auth.TICKET, 'guess')
+        assert len(auth.get()) == 1
+
+    def test_cached(self, loop, users, monkeypatch):
+        assert self.verify(loop, 'carol', auth.TICKET, 'ticket')
+        monkeypatch.setattr(auth, 'derive_key', None)
+
+        assert self.verify(loop, 'carol', auth.TICKET, 'ticket')
+        assert not self.verify(loop, 'alice', auth.TICKET, 'guess')
+
+    def test_cache_size(self, loop, users):
+        auth.options['cache_size'] = 1
+        self.verify(loop, 'bob', auth.WAMPCRA)
+        self.verify(loop, 'carol', auth.TICKET, 'ticket')
+
+        assert len(auth.get()) == 1
+
+    def test_off_loop(self, loop, users, monkeypatch):
+        threads = []
+
+        def derive_key(*args):
+            threads.append(threading.current_thread())
+            return derive(*args)
+
+        derive = auth.derive_key
+        monkeypatch.setattr(auth, 'derive_key', derive_key)
+
+        assert self.verify(loop, 'bob', auth.WAMPCRA)
+        # The client side signature is derived first, in the test.
+        assert threads[-1] is not threading.main_thread()
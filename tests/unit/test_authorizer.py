@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import asyncio
+
+from wouter.router import authorizer
+from wouter.router import dealer
+from wouter.router import ids
+from wouter.router import message
+
+
+class Session:
+    peer = False
+
+    def __init__(self, loop=None, authrole='frontend'):
+        self.loop = loop
+        self.id = 1
+        self.authid = 'alice'
+        self.authrole = authrole
+        self.authmethod = 'ticket'
+        self.sent = []
+        self.request_ids = ids.SequentialIds()
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def static(**kwargs):
+    return authorizer.Authorizer(dealer.Dealer(), [
+        authorizer.Permission('frontend', 'com.myapp', ['subscribe', 'call'], 'prefix'),
+        authorizer.Permission('frontend', 'com..update', ['publish'], 'wildcard'),
+        authorizer.Permission('frontend', 'com.myapp.admin', ['register']),
+    ], **kwargs)
+
+
+class TestStatic:
+    def test_permitted(self):
+        authorizer_ = static()
+        session_ = Session()
+
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'subscribe') is True
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'publish') is False
+        assert authorizer_.authorize(session_, 'com.other.update', 'publish') is True
+        assert authorizer_.authorize(session_, 'com.myapp.admin', 'register') is True
+        assert authorizer_.authorize(session_, 'com.myapp.admin', 'call') is True
+        assert authorizer_.authorize(session_, 'com.other.topic1', 'subscribe') is False
+
+    def test_unknown_role(self):
+        assert static().authorize(Session(authrole='backend'), 'com.myapp.topic1', 'subscribe') is False
+
+    def test_cached(self, monkeypatch):
+        authorizer_ = static()
+        authorizer_.authorize(Session(), 'com.myapp.topic1', 'subscribe')
+        monkeypatch.setattr(authorizer_, 'permitted', None)
+
+        assert authorizer_.authorize(Session(), 'com.myapp.topic1', 'subscribe') is True
+        assert len(authorizer_) == 1
+
+    def test_expired(self):
+        authorizer_ = static(ttl=0)
+        authorizer_.authorize(Session(), 'com.myapp.topic1', 'subscribe')
+        authorizer_.remove('frontend', 'com.myapp', 'prefix')
+        authorizer_.add(authorizer.Permission('frontend', 'com.myapp', ['subscribe'], 'prefix'))
+
+        assert authorizer_.authorize(Session(), 'com.myapp.topic1', 'subscribe') is True
+
+    def test_cache_size(self):
+        authorizer_ = static(cache_size=2)
+        for topic in ('com.myapp.topic1', 'com.myapp.topic2', 'com.myapp.topic3'):
+            authorizer_.authorize(Session(), topic, 'subscribe')
+
+        assert len(authorizer_) == 2
+
+    def test_invalidated(self):
+        authorizer_ = static()
+        session_ = Session()
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'publish') is False
+
+        authorizer_.add(authorizer.Permission('frontend', 'com.myapp.topic1', ['publish']))
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'publish') is True
+
+        authorizer_.remove('frontend', 'com.myapp', 'prefix')
+        assert authorizer_.authorize(session_, 'com.myapp.topic2', 'subscribe') is False
+
+
+class TestDynamic:
+    def authorizer(self, loop, **kwargs):
+        callee = Session()
+        dealer_ = dealer.Dealer(loop=loop)
+        dealer_.register(callee, 'com.myapp.authorize')
+        return authorizer.Authorizer(dealer_, [], 'com.myapp.authorize', **kwargs), callee
+
+    def test_allowed(self, loop):
+        authorizer_, callee = self.authorizer(loop)
+        session_ = Session(loop)
+        decision = authorizer_.authorize(session_, 'com.myapp.topic1', 'publish')
+
+        invocation = callee.sent[-1]
+        assert invocation.args[0]['authrole'] == 'frontend'
+        assert invocation.args[1:] == ['com.myapp.topic1', 'publish']
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'publish') is decision
+
+        authorizer_.dealer.yield_(callee, message.Yield(request_id=invocation.request_id, options={}, args=[True]))
+        assert loop.run_until_complete(decision) is True
+        assert authorizer_.authorize(session_, 'com.myapp.topic1', 'publish') is True
+        assert len(callee.sent) == 1
+
+    def test_denied(self, loop):
+        authorizer_, callee = self.authorizer(loop)
+        decision = authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish')
+        authorizer_.dealer.yield_(callee, message.Yield(request_id=callee.sent[-1].request_id, options={},
+                                                        args=[False]))
+
+        assert loop.run_until_complete(decision) is False
+        assert authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish') is False
+
+    def test_error(self, loop):
+        authorizer_, callee = self.authorizer(loop)
+        decision = authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish')
+        authorizer_.dealer.error(callee, message.Error(request_type=message.Type.INVOCATION,
+                                                       request_id=callee.sent[-1].request_id,
+                                                       details={},
+                                                       error='com.myapp.error'))
+
+        assert not loop.run_until_complete(decision)
+        assert len(authorizer_) == 0
+        assert isinstance(authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish'), asyncio.Future)
+        assert len(callee.sent) == 2
+
+    def test_timeout(self, loop):
+        authorizer_, callee = self.authorizer(loop, timeout=0.01)
+        decision = authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish')
+
+        assert not loop.run_until_complete(decision)
+        assert len(authorizer_) == 0
+        assert len(authorizer_.dealer.invocations) == 0
+
+    def test_unregistered(self, loop):
+        authorizer_ = authorizer.Authorizer(dealer.Dealer(), [], 'com.myapp.authorize')
+
+        assert authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish') is False
+        assert len(authorizer_) == 0
+
+    def test_static_first(self, loop):
+        authorizer_, callee = self.authorizer(loop)
+        authorizer_.add(authorizer.Permission('frontend', 'com.myapp.topic1', ['publish']))
+
+        assert authorizer_.authorize(Session(loop), 'com.myapp.topic1', 'publish') is True
+        assert callee.sent == []
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+
+import pytest
+
+from wouter import bench
+from wouter.router import realm
+from wouter.router import router
+
+
+@pytest.fixture
+def url():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def start():
+        return await router.start_router('127.0.0.1', 0)
+
+    server = loop.run_until_complete(start())
+    yield 'ws://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    asyncio.set_event_loop(None)
+    loop.close()
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+def test_run(url):
+    rates = {'publish': 50, 'call': 50, 'subscribe': 20, 'register': 20}
+    results = asyncio.get_event_loop().run_until_complete(
+        bench.run(url, 'bench', sessions=3, duration=0.2, rates=rates))
+    operations = results['operations']
+
+    assert set(operations) == set(rates)
+    assert operations['publish']['issued'] == 10
+    assert operations['call']['issued'] == 10
+    for summary in operations.values():
+        assert summary['completed'] == summary['issued']
+        assert summary['errors'] == {}
+        assert sum(summary['histogram']['counts']) == summary['completed']
+    assert results['events_received'] == 20
+
+    report = bench.report(results)
+    assert 'publish latency histogram' in report
+
+
+def test_run_idle(url):
+    results = asyncio.get_event_loop().run_until_complete(
+        bench.run(url, 'bench', sessions=1, duration=0.05, rates={'publish': 0}))
+
+    assert results['operations'] == {}
+    assert 'events received: 0' in bench.report(results)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import json
+
+import pytest
+
+from wouter.router import broker
+from wouter.router import error
+from wouter.router import history
+from wouter.router import message
+from wouter.router import serializer
+
+
+class TestEventFanout:
+    def test_frame(self):
+        fanout = broker.EventFanout(publication_id=4429313566, details={}, args=['Hello, world!'])
+        frame = fanout.frame(5512315355)
+
+        assert json.loads(frame) == [36, 5512315355, 4429313566, {}, ['Hello, world!']]
+
+    def test_frame_matches_marshal(self):
+        kwargs = {'color': 'orange', 'sizes': [23, 42, 7]}
+        fanout = broker.EventFanout(publication_id=4429313566, details={'topic': 'com.myapp.topic1'}, kwargs=kwargs)
+
+        for subscription_id in (1, 5512315355, 2 ** 53):
+            event = message.Event(subscription_id=subscription_id,
+                                  publication_id=4429313566,
+                                  details={'topic': 'com.myapp.topic1'},
+                                  kwargs=kwargs)
+            assert json.loads(fanout.frame(subscription_id)) == event.marshal()
+
+    def test_no_payload(self):
+        fanout = broker.EventFanout(publication_id=4429313566, details={})
+
+        assert json.loads(fanout.frame(1)) == [36, 1, 4429313566, {}]
+
+
+class Receiver:
+    def __init__(self, serializer_):
+        self.serializer = serializer_
+
+
+class TestFanOut:
+    def test_shared_subscription(self):
+        a, b, c = Receiver(serializer.JSON), Receiver(serializer.JSON), Receiver(serializer.JSON)
+        frames = list(broker.fan_out(4429313566, {}, ['x'], None, {5512315355: [a, b], 5512315356: [c]}))
+
+        assert [receiver for receiver, _, _ in frames] == [a, b, c]
+        assert [subscription_id for _, _, subscription_id in frames] == [5512315355, 5512315355, 5512315356]
+        assert frames[0][1] is frames[1][1]
+        assert json.loads(frames[2][1]) == [36, 5512315356, 4429313566, {}, ['x']]
+
+    def test_mixed_serializers(self):
+        receivers = [Receiver(serializer.JSON), Receiver(serializer.MSGPACK), Receiver(serializer.CBOR)]
+        frames = list(broker.fan_out(4429313566, {}, ['x'], {'y': 1}, {5512315355: receivers}))
+
+        for receiver, frame, _ in frames:
+            assert receiver.serializer.unserialize(frame) == [36, 5512315355, 4429313566, {}, ['x'], {'y': 1}]
+
+    def test_no_subscriptions(self):
+        assert list(broker.fan_out(4429313566, {}, ['x'], None, {})) == []
+
+    def test_shared_fanout(self):
+        fanout = broker.EventFanout(4429313566, {}, ['x'])
+        frame = fanout.frame(5512315355)
+        frames = list(broker.fan_out(4429313566, {}, ['x'], None, {5512315355: [Receiver(serializer.JSON)]}, fanout))
+
+        assert frames[0][1] == frame
+        assert list(fanout._templates) == [serializer.JSON]
+
+
+class Session:
+    def __init__(self, serializer_=serializer.JSON):
+        self.serializer = serializer_
+        self.frames = []
+        self.sent = []
+
+    def send_frame(self, frame, key=None):
+        self.frames.append(json.loads(frame))
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class TestBroker:
+    def test_subscribe_shared(self):
+        broker_ = broker.Broker()
+        a, b = Session(), Session()
+        subscription = broker_.subscribe(a, 'com.myapp.topic1')
+
+        assert broker_.subscribe(b, 'com.myapp.topic1') is subscription
+        assert subscription.subscribers == {a, b}
+        assert broker_.subscribe(a, 'com.myapp.topic1', broker.MATCH_PREFIX) is not subscription
+
+    def test_subscribe_invalid_match(self):
+        with pytest.raises(error.WampError) as excinfo:
+            broker.Broker().subscribe(Session(), 'com.myapp.topic1', 'regex')
+
+        assert excinfo.value.error == error.INVALID_ARGUMENT
+
+    def test_unsubscribe(self):
+        broker_ = broker.Broker()
+        a, b = Session(), Session()
+        subscription = broker_.subscribe(a, 'com.myapp.topic1')
+        broker_.subscribe(b, 'com.myapp.topic1')
+
+        assert broker_.unsubscribe(a, subscription.id)
+        assert not broker_.unsubscribe(a, subscription.id)
+        assert broker_.match('com.myapp.topic1') == [subscription]
+        assert broker_.unsubscribe(b, subscription.id)
+        assert broker_.match('com.myapp.topic1') == []
+        assert broker_.subscriptions == {}
+
+    @pytest.mark.parametrize('uri, match', [('com.myapp', broker.MATCH_PREFIX),
+                                            ('com..topic1', broker.MATCH_WILDCARD)])
+    def test_unsubscribe_prunes_trie(self, uri, match):
+        broker_ = broker.Broker()
+        session_ = Session()
+        subscription = broker_.subscribe(session_, uri, match)
+        broker_.unsubscribe(session_, subscription.id)
+
+        assert not broker_._prefix
+        assert not broker_._wildcard
+
+    @pytest.mark.parametrize('topic, expected', [
+        ('com.myapp.topic1', ['com.myapp.topic1', 'com.myapp', 'com.myapp.top', 'com..topic1']),
+        ('com.myapp.topic2', ['com.myapp', 'com.myapp.top']),
+        ('com.myapp', ['com.myapp']),
+        ('com.myappx.topic1', ['com.myapp', 'com..topic1']),
+        ('com.other.topic1', ['com..topic1']),
+        ('com.other.topic1.x', []),
+        ('org.myapp.topic1', []),
+    ])
+    def test_match(self, topic, expected):
+        broker_ = broker.Broker()
+        session_ = Session()
+        broker_.subscribe(session_, 'com.myapp.topic1')
+        broker_.subscribe(session_, 'com.myapp', broker.MATCH_PREFIX)
+        broker_.subscribe(session_, 'com.myapp.top', broker.MATCH_PREFIX)
+        broker_.subscribe(session_, 'com..topic1', broker.MATCH_WILDCARD)
+
+        assert sorted(s.uri for s in broker_.match(topic)) == sorted(expected)
+
+    def test_lookup(self):
+        broker_ = broker.Broker()
+        subscription = broker_.subscribe(Session(), 'com..topic1', broker.MATCH_WILDCARD)
+
+        assert broker_.lookup('com..topic1', broker.MATCH_WILDCARD) is subscription
+        assert broker_.lookup('com..topic1') is None
+        assert broker_.lookup('com.', broker.MATCH_PREFIX) is None
+
+    def test_publish(self):
+        broker_ = broker.Broker()
+        publisher, exact, prefix = Session(), Session(), Session()
+        exact_id = broker_.subscribe(exact, 'com.myapp.topic1').id
+        prefix_id = broker_.subscribe(prefix, 'com.myapp', broker.MATCH_PREFIX).id
+        broker_.subscribe(publisher, 'com.myapp.topic1')
+
+        publish = message.Publish(request_id=1, options={'acknowledge': True}, topic='com.myapp.topic1', args=[1])
+        publication_id = broker_.publish(publisher, publish)
+
+        assert exact.frames == [[36, exact_id, publication_id, {}, [1]]]
+        assert prefix.frames == [[36, prefix_id, publication_id, {'topic': 'com.myapp.topic1'}, [1]]]
+        assert publisher.frames == []
+        assert publisher.sent[0].publication_id == publication_id
+
+    def test_publish_history(self):
+        broker_ = broker.Broker(history.History([('com.myapp.topic1', broker.MATCH_EXACT)]))
+        subscriber = Session()
+        subscription_id = broker_.subscribe(subscriber, 'com.myapp.topic1').id
+        broker_.publish(Session(), message.Publish(request_id=1, options={}, topic='com.myapp.topic1', args=[1]))
+
+        publication, = broker_.history.publications(['com.myapp.topic1'])
+        assert subscriber.frames == [json.loads(publication.fanouts[0].frame(subscription_id))]
+
+    def test_publish_include_me(self):
+        broker_ = broker.Broker()
+        publisher = Session()
+        broker_.subscribe(publisher, 'com.myapp.topic1')
+        publish = message.Publish(request_id=1, options={'exclude_me': False}, topic='com.myapp.topic1')
+        broker_.publish(publisher, publish)
+
+        assert len(publisher.frames) == 1
+        assert publisher.sent == []
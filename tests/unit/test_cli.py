@@ -20,6 +20,9 @@
 """Tests for `wouter` package."""
 
 import pytest
+from click.testing import CliRunner
+
+from wouter import cli
 
 
 @pytest.fixture
@@ -36,3 +39,73 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+def test_help():
+    result = CliRunner().invoke(cli.main, ['--help'])
+
+    assert result.exit_code == 0
+    assert '--rawsocket-port' in result.output
+
+
+def test_peer_address():
+    result = CliRunner().invoke(cli.main, ['--peer', 'localhost'])
+
+    assert result.exit_code == 2
+    assert 'HOST:PORT' in result.output
+
+
+def test_workers_with_links():
+    result = CliRunner().invoke(cli.main, ['--workers', '2', '--link-port', '9002'])
+
+    assert result.exit_code == 2
+
+
+def test_links_without_secret():
+    result = CliRunner().invoke(cli.main, ['--link-port', '9002'], env={'WOUTER_LINK_SECRET': ''})
+
+    assert result.exit_code == 2
+    assert 'require --link-secret' in result.output
+
+
+def test_bench_help():
+    result = CliRunner().invoke(cli.main, ['bench', '--help'])
+
+    assert result.exit_code == 0
+    assert '--publish-rate' in result.output
+
+
+def test_history_topic():
+    result = CliRunner().invoke(cli.main, ['--history', 'prefix:com.my app'])
+
+    assert result.exit_code == 2
+    assert 'invalid topic' in result.output
+
+
+def test_shard_with_workers():
+    result = CliRunner().invoke(cli.main, ['--workers', '2', '--shard', 'realm1'])
+
+    assert result.exit_code == 2
+
+
+def test_auth_without_users():
+    result = CliRunner().invoke(cli.main, ['--auth-method', 'wampcra'])
+
+    assert result.exit_code == 2
+    assert 'require --users' in result.output
+
+
+def test_invalid_users(tmpdir):
+    users = tmpdir.join('users.json')
+    users.write('{"alice": {"secret": "secret"}}')
+    result = CliRunner().invoke(cli.main, ['--auth-method', 'ticket', '--users', str(users)])
+
+    assert result.exit_code == 2
+    assert 'invalid users file' in result.output
+
+
+def test_invalid_permission():
+    result = CliRunner().invoke(cli.main, ['--permission', 'frontend:prefix:com.myapp:delete'])
+
+    assert result.exit_code == 2
+    assert 'invalid actions' in result.output
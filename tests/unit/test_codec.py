@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest
+
+from wouter.router import codec
+
+VALUES = [
+    None, True, False, 0, 1, -1, -32, -33, 127, 128, 255, 256, 65536, 2 ** 32, 2 ** 53, 2 ** 64 - 1, -2 ** 63,
+    1.5, -0.25, '', 'a' * 31, 'a' * 32, 'é' * 300, b'', b'\x00' * 300, [], [1] * 15, [1] * 16, {}, {'a': 1},
+    {str(i): i for i in range(20)}, [36, 5512315355, 4429313566, {}, ['Hello', {'x': [1.5, None]}]],
+]
+
+
+class TestMsgPack:
+    @pytest.mark.parametrize('value', VALUES)
+    def test_round_trip(self, value):
+        assert codec.msgpack_unpackb(codec.msgpack_packb(value)) == value
+
+    def test_known_encoding(self):
+        assert codec.msgpack_packb([1, 'a', {}]) == b'\x93\x01\xa1a\x80'
+
+    def test_float32(self):
+        assert codec.msgpack_unpackb(b'\xca\x3f\xc0\x00\x00') == 1.5
+
+    def test_trailing_data(self):
+        with pytest.raises(ValueError):
+            codec.msgpack_unpackb(b'\x01\x02')
+
+    def test_unsupported_type(self):
+        with pytest.raises(TypeError):
+            codec.msgpack_packb(object())
+
+    @pytest.mark.parametrize('length', [0, 15, 16, 65536])
+    def test_array_start(self, length):
+        data = codec.msgpack_packb(list(range(length)))
+        count, offset = codec.msgpack_array_start(data)
+
+        assert count == length
+        if length:
+            assert codec.msgpack_unpack_from(data, offset) == (0, offset + 1)
+
+    def test_array_start_not_array(self):
+        with pytest.raises(ValueError):
+            codec.msgpack_array_start(codec.msgpack_packb({}))
+
+    @pytest.mark.parametrize('data', [b'', b'\x92\x01', b'\xcd\x01', b'\x81\x90\x01', b'\xc1'])
+    def test_invalid(self, data):
+        with pytest.raises(ValueError):
+            codec.msgpack_unpackb(data)
+        with pytest.raises(ValueError):
+            codec.msgpack_unpack_from(data, 0)
+
+    def test_array_start_truncated(self):
+        with pytest.raises(ValueError):
+            codec.msgpack_array_start(b'\xdc\x01')
+
+
+class TestCBOR:
+    @pytest.mark.parametrize('value', VALUES)
+    def test_round_trip(self, value):
+        assert codec.cbor_loads(codec.cbor_dumps(value)) == value
+
+    def test_known_encoding(self):
+        assert codec.cbor_dumps([1, 'a', {}]) == b'\x83\x01\x61a\xa0'
+
+    def test_half_float(self):
+        assert codec.cbor_loads(bytes.fromhex('f93e00')) == 1.5
+
+    def test_indefinite_length(self):
+        assert codec.cbor_loads(bytes.fromhex('9f0102ff')) == [1, 2]
+        assert codec.cbor_loads(bytes.fromhex('bf61610161629f0203ffff')) == {'a': 1, 'b': [2, 3]}
+        assert codec.cbor_loads(bytes.fromhex('7f657374726561646d696e67ff')) == 'streaming'
+
+    def test_tag(self):
+        assert codec.cbor_loads(bytes.fromhex('c11a514b67b0')) == 1363896240
+
+    @pytest.mark.parametrize('length', [0, 23, 24, 256, 65536])
+    def test_array_start(self, length):
+        data = codec.cbor_dumps(list(range(length)))
+        count, offset = codec.cbor_array_start(data)
+
+        assert count == length
+        if length:
+            assert codec.cbor_decode_from(data, offset) == (0, offset + 1)
+
+    def test_array_start_indefinite(self):
+        assert codec.cbor_array_start(bytes.fromhex('9f0102ff')) == (None, 1)
+
+    def test_array_start_not_array(self):
+        with pytest.raises(ValueError):
+            codec.cbor_array_start(codec.cbor_dumps({}))
+
+    @pytest.mark.parametrize('data', ['', '8201', '1901', 'a18001', '9f01'])
+    def test_invalid(self, data):
+        with pytest.raises(ValueError):
+            codec.cbor_loads(bytes.fromhex(data))
+        with pytest.raises(ValueError):
+            codec.cbor_decode_from(bytes.fromhex(data), 0)
+
+    @pytest.mark.parametrize('data', ['', '9901'])
+    def test_array_start_truncated(self, data):
+        with pytest.raises(ValueError):
+            codec.cbor_array_start(bytes.fromhex(data))
+
+    def test_decode_from_break(self):
+        with pytest.raises(ValueError):
+            codec.cbor_decode_from(b'\xff', 0)
+
+    def test_trailing_data(self):
+        with pytest.raises(ValueError):
+            codec.cbor_loads(b'\x01\x02')
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+import collections
+
+import pytest
+
+from wouter.router import dealer
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import message
+from wouter.router import timer
+
+
+class Session:
+    peer = False
+
+    def __init__(self, name=''):
+        self.name = name
+        self.sent = []
+        self.request_ids = ids.SequentialIds()
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+    def __repr__(self):
+        return self.name
+
+
+def call(dealer_, caller, procedure='com.myapp.echo', request_id=1):
+    return dealer_.call(caller, message.Call(request_id=request_id, options={}, procedure=procedure))
+
+
+class TestRegister:
+    def test_single(self):
+        dealer_ = dealer.Dealer()
+        registration = dealer_.register(Session(), 'com.myapp.echo')
+
+        assert dealer_.lookup('com.myapp.echo') is registration
+        with pytest.raises(error.WampError) as excinfo:
+            dealer_.register(Session(), 'com.myapp.echo')
+        assert excinfo.value.error == error.PROCEDURE_ALREADY_EXISTS
+
+    def test_shared(self):
+        dealer_ = dealer.Dealer()
+        a, b = Session(), Session()
+        registration = dealer_.register(a, 'com.myapp.echo', dealer.INVOKE_ROUNDROBIN)
+
+        assert dealer_.register(b, 'com.myapp.echo', dealer.INVOKE_ROUNDROBIN) is registration
+        assert list(registration.callees) == [a, b]
+
+    @pytest.mark.parametrize('invoke', [dealer.INVOKE_SINGLE, dealer.INVOKE_RANDOM])
+    def test_policy_mismatch(self, invoke):
+        dealer_ = dealer.Dealer()
+        dealer_.register(Session(), 'com.myapp.echo', dealer.INVOKE_ROUNDROBIN)
+
+        with pytest.raises(error.WampError):
+            dealer_.register(Session(), 'com.myapp.echo', invoke)
+
+    def test_same_session(self):
+        dealer_ = dealer.Dealer()
+        session_ = Session()
+        dealer_.register(session_, 'com.myapp.echo', dealer.INVOKE_FIRST)
+
+        with pytest.raises(error.WampError):
+            dealer_.register(session_, 'com.myapp.echo', dealer.INVOKE_FIRST)
+
+    @pytest.mark.parametrize('invoke', ['fastest', [], None, 1])
+    def test_invalid_policy(self, invoke):
+        with pytest.raises(error.WampError) as excinfo:
+            dealer.Dealer().register(Session(), 'com.myapp.echo', invoke)
+        assert excinfo.value.error == error.INVALID_ARGUMENT
+
+    def test_unregister(self):
+        dealer_ = dealer.Dealer()
+        a, b = Session(), Session()
+        registration = dealer_.register(a, 'com.myapp.echo', dealer.INVOKE_RANDOM)
+        dealer_.register(b, 'com.myapp.echo', dealer.INVOKE_RANDOM)
+
+        assert dealer_.unregister(a, registration.id)
+        assert not dealer_.unregister(a, registration.id)
+        assert list(registration.callees) == [b]
+        assert dealer_.unregister(b, registration.id)
+        assert dealer_.lookup('com.myapp.echo') is None
+        assert dealer_.registrations == {}
+
+
+class TestPolicies:
+    def callees(self, invoke, count=3):
+        dealer_ = dealer.Dealer()
+        sessions = [Session(str(i)) for i in range(count)]
+        for session_ in sessions:
+            dealer_.register(session_, 'com.myapp.echo', invoke)
+        return dealer_, sessions
+
+    def test_first(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_FIRST)
+
+        assert {call(dealer_, Session()).callee for _ in range(3)} == {sessions[0]}
+
+    def test_last(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_LAST)
+
+        assert {call(dealer_, Session()).callee for _ in range(3)} == {sessions[-1]}
+
+    def test_roundrobin(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_ROUNDROBIN)
+
+        assert [call(dealer_, Session()).callee for _ in range(6)] == sessions * 2
+
+    def test_random(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_RANDOM)
+        dealer_.unregister(sessions[0], dealer_.lookup('com.myapp.echo').id)
+
+        assert {call(dealer_, Session()).callee for _ in range(50)} == set(sessions[1:])
+
+    def test_least_outstanding(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_LEAST_OUTSTANDING)
+        pending = [call(dealer_, Session(), request_id=i) for i in range(6)]
+
+        assert collections.Counter(p.callee for p in pending) == {s: 2 for s in sessions}
+
+        # Answer both invocations of the second callee; it becomes the least busy.
+        for p in pending:
+            if p.callee is sessions[1]:
+                dealer_.yield_(p.callee, message.Yield(request_id=p.invocation_id, options={}))
+
+        assert call(dealer_, Session()).callee is sessions[1]
+
+    def test_least_outstanding_many_updates(self):
+        dealer_, sessions = self.callees(dealer.INVOKE_LEAST_OUTSTANDING, count=2)
+        callees = dealer_.lookup('com.myapp.echo').callees
+        for _ in range(100):
+            callees.begin(sessions[1])
+            callees.end(sessions[1])
+
+        assert len(callees._heap) <= 2 * len(sessions) + 16
+        assert callees.select() in sessions
+
+
+class TestCall:
+    def test_invocation(self):
+        dealer_ = dealer.Dealer()
+        callee, caller = Session(), Session()
+        registration = dealer_.register(callee, 'com.myapp.echo')
+        dealer_.call(caller, message.Call(request_id=7, options={}, procedure='com.myapp.echo', args=[1]))
+
+        invocation = callee.sent[0]
+        assert isinstance(invocation, message.Invocation)
+        assert invocation.registration_id == registration.id
+        assert invocation.args == [1]
+
+        dealer_.yield_(callee, message.Yield(request_id=invocation.request_id, options={}, args=[2]))
+        assert caller.sent[0].marshal() == [50, 7, {}, [2]]
+        assert len(dealer_.invocations) == 0
+
+    def test_yield_from_other_session(self):
+        dealer_ = dealer.Dealer()
+        callee, caller = Session(), Session()
+        dealer_.register(callee, 'com.myapp.echo')
+        pending = call(dealer_, caller)
+        request_id = callee.sent[0].request_id
+        dealer_.yield_(caller, message.Yield(request_id=request_id, options={}))
+
+        assert caller.sent == []
+        assert dealer_.invocations.get(callee, request_id) is pending
+
+    def test_error(self):
+        dealer_ = dealer.Dealer()
+        callee, caller = Session(), Session()
+        dealer_.register(callee, 'com.myapp.echo')
+        call(dealer_, caller, request_id=7)
+        dealer_.error(callee, message.Error(request_type=message.Type.INVOCATION,
+                                            request_id=callee.sent[0].request_id,
+                                            details={},
+                                            error='com.myapp.error'))
+
+        assert caller.sent[0].marshal() == [8, 48, 7, {}, 'com.myapp.error']
+
+    def test_no_such_procedure(self):
+        with pytest.raises(error.WampError) as excinfo:
+            call(dealer.Dealer(), Session())
+        assert excinfo.value.error == error.NO_SUCH_PROCEDURE
+
+
+class TestDetach:
+    def test_callee(self):
+        dealer_ = dealer.Dealer()
+        callee, caller = Session(), Session()
+        dealer_.register(callee, 'com.myapp.echo')
+        call(dealer_, caller, request_id=7)
+        call(dealer_, caller, request_id=8)
+        dealer_.detach(callee)
+
+        assert [msg.marshal() for msg in caller.sent] == [
+            [8, 48, 7, {'message': 'callee left'}, 'wamp.error.canceled'],
+            [8, 48, 8, {'message': 'callee left'}, 'wamp.error.canceled']]
+        assert len(dealer_.invocations) == 0
+
+    def test_caller(self):
+        dealer_ = dealer.Dealer()
+        callee, caller, other = Session(), Session(), Session()
+        dealer_.register(callee, 'com.myapp.echo')
+        call(dealer_, caller)
+        pending = call(dealer_, other)
+        dealer_.detach(caller)
+
+        assert len(dealer_.invocations) == 1
+        dealer_.yield_(callee, message.Yield(request_id=callee.sent[0].request_id, options={}))
+        assert caller.sent == []
+        assert dealer_.invocations.get(callee, pending.invocation_id) is pending
+
+    def test_least_outstanding(self):
+        dealer_ = dealer.Dealer()
+        first, second, caller = Session('first'), Session('second'), Session()
+        dealer_.register(first, 'com.myapp.echo', dealer.INVOKE_LEAST_OUTSTANDING)
+        dealer_.register(second, 'com.myapp.echo', dealer.INVOKE_LEAST_OUTSTANDING)
+        assert call(dealer_, caller).callee is first
+        dealer_.detach(caller)
+
+        # The abandoned invocation no longer counts against the first callee.
+        assert call(dealer_, Session()).callee is first
+
+
+class TestCallTable:
+    def test_pop_caller(self):
+        table = dealer.CallTable(timer.TimerWheel())
+        caller, callee = Session(), Session()
+        made = [dealer.PendingCall(caller, request_id, callee, 10 + request_id, None) for request_id in range(3)]
+        for pending in made:
+            table.add(pending)
+        table.add(dealer.PendingCall(Session(), 1, callee, 20, None))
+
+        assert sorted(table.pop_caller(caller), key=lambda pending: pending.request_id) == made
+        assert table.pop_caller(caller) == []
+        assert len(table) == 1
+
+    def test_pop_callee(self):
+        table = dealer.CallTable(timer.TimerWheel())
+        callee = Session()
+        pending = dealer.PendingCall(Session(), 1, callee, 10, None)
+        table.add(pending)
+        table.add(dealer.PendingCall(Session(), 1, Session(), 10, None))
+
+        assert table.pop_callee(callee) == [pending]
+        assert table.pop_callee(callee) == []
+        assert len(table) == 1
+
+    def test_pop(self):
+        table = dealer.CallTable(timer.TimerWheel())
+        callee = Session()
+        pending = dealer.PendingCall(Session(), 1, callee, 10, None)
+        table.add(pending)
+
+        assert len(table) == 1
+        assert table.pop(callee, 11) is None
+        assert table.pop(Session(), 10) is None
+        assert table.pop(callee, 10) is pending
+        assert table.pop(callee, 10) is None
+        assert len(table) == 0
+
+    def test_timeout(self):
+        loop = asyncio.new_event_loop()
+        try:
+            table = dealer.CallTable(timer.TimerWheel(loop=loop))
+            expired = []
+            fast = dealer.PendingCall(Session(), 1, Session(), 10, None)
+            slow = dealer.PendingCall(Session(), 2, Session(), 11, None)
+            table.add(fast, 0.02, expired.append)
+            table.add(slow, 10, expired.append)
+            loop.run_until_complete(asyncio.sleep(0.1))
+
+            assert expired == [fast]
+            assert table.pop(slow.callee, 11) is slow
+            assert len(table.wheel) == 0
+        finally:
+            loop.close()
+
+
+class TestCallTimeout:
+    def test_canceled(self):
+        loop = asyncio.new_event_loop()
+        try:
+            dealer_ = dealer.Dealer(loop=loop)
+            callee, caller = Session(), Session()
+            dealer_.register(callee, 'com.myapp.slow')
+            dealer_.call(caller, message.Call(request_id=7, options={'timeout': 20}, procedure='com.myapp.slow'))
+            loop.run_until_complete(asyncio.sleep(0.1))
+
+            assert caller.sent[0].marshal() == [8, 48, 7, {}, 'wamp.error.canceled']
+
+            # A late yield is ignored.
+            dealer_.yield_(callee, message.Yield(request_id=callee.sent[0].request_id, options={}))
+            assert len(caller.sent) == 1
+        finally:
+            loop.close()
+
+    @pytest.mark.parametrize('timeout', ['1s', True, -1, float('inf'), float('nan'), 10 ** 400])
+    def test_invalid_timeout(self, timeout):
+        dealer_ = dealer.Dealer()
+        callee = Session()
+        dealer_.register(callee, 'com.myapp.slow')
+
+        with pytest.raises(error.WampError) as excinfo:
+            dealer_.call(Session(), message.Call(request_id=7, options={'timeout': timeout},
+                                                 procedure='com.myapp.slow'))
+        assert excinfo.value.error == error.INVALID_ARGUMENT
+        assert len(dealer_.invocations) == 0
+        assert callee.sent == []
+
+    def test_table_unchanged_on_timer_error(self):
+        loop = asyncio.new_event_loop()
+        try:
+            table = dealer.CallTable(timer.TimerWheel(loop=loop))
+
+            with pytest.raises(OverflowError):
+                table.add(dealer.PendingCall(Session(), 1, Session(), 10, None), float('inf'))
+            assert len(table) == 0
+            assert table._calls == {} and table._callers == {}
+        finally:
+            loop.close()
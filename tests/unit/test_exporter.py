@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+import json
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.monitor import exporter
+from wouter.monitor import metrics
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+
+
+@pytest.fixture
+def realms():
+    metrics.reset()
+    yield realm.realms
+    realm.realms.clear()
+    realm.sessions.clear()
+    metrics.reset()
+
+
+def scrape(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+
+class TestRender:
+    def test_traffic(self, loop, realms):
+        session_ = session.Session(Transport(), serializer.JSON, loop=loop)
+        hello = json.dumps([1, 'realm1', {'roles': {'subscriber': {}}}])
+        subscribe = json.dumps([32, 1, {}, 'com.example.topic'])
+        session_.receive(hello)
+        session_.receive(subscribe)
+        session_.receive(json.dumps([16, 2, {'exclude_me': False}, 'com.example.topic']))
+        loop.run_until_complete(asyncio.sleep(0))
+        values = scrape(exporter.render())
+
+        assert values['wouter_messages_received_total{type="HELLO"}'] == '1'
+        assert values['wouter_messages_received_total{type="PUBLISH"}'] == '1'
+        assert values['wouter_messages_sent_total{type="WELCOME"}'] == '1'
+        assert values['wouter_messages_sent_total{type="EVENT"}'] == '1'
+        assert int(values['wouter_bytes_received_total']) > len(hello) + len(subscribe)
+        assert int(values['wouter_bytes_sent_total']) > 0
+        assert values['wouter_subscriptions{realm="realm1"}'] == '1'
+        assert values['wouter_registrations{realm="realm1"}'] == '0'
+        assert values['wouter_routing_seconds_count{type="SUBSCRIBE"}'] == '1'
+        assert values['wouter_routing_seconds_bucket{type="SUBSCRIBE",le="+Inf"}'] == '1'
+
+    def test_label_escaped(self, realms):
+        realm.get('realm\\"1"\nx')
+        text = exporter.render()
+
+        assert 'wouter_subscriptions{realm="realm\\\\\\"1\\"\\nx"} 0\n' in text
+
+    def test_empty(self, realms):
+        text = exporter.render()
+
+        assert '# TYPE wouter_routing_seconds histogram' in text
+        assert 'wouter_bytes_sent_total 0' in text
+
+
+class TestEndpoint:
+    def request(self, loop, path):
+        async def get():
+            server = await exporter.start_monitor('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(('GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % path).encode('ascii'))
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        return loop.run_until_complete(get())
+
+    def test_metrics(self, loop, realms):
+        response = self.request(loop, '/metrics')
+
+        assert response.startswith(b'HTTP/1.0 200 OK\r\n')
+        assert b'\r\n\r\n# HELP wouter_messages_received_total' in response
+
+    def test_not_found(self, loop, realms):
+        assert self.request(loop, '/other').startswith(b'HTTP/1.0 404 Not Found\r\n')
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import asyncio
+import json
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.router import broker
+from wouter.router import history
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+
+
+def run_once(loop):
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+class TestHistory:
+    def test_record(self):
+        history_ = history.History([('com.myapp.topic1', broker.MATCH_EXACT)])
+
+        assert history_.record(1, 'com.myapp.topic1', ['a']) is not None
+        assert history_.record(2, 'com.myapp.topic2', ['b']) is None
+        assert list(history_.topics()) == ['com.myapp.topic1']
+
+    def test_pattern(self):
+        history_ = history.History([('com.myapp', broker.MATCH_PREFIX), ('com..status', broker.MATCH_WILDCARD)])
+        for publication_id, topic in enumerate(['com.myapp.topic1', 'com.device.status', 'com.device.other']):
+            history_.record(publication_id, topic)
+
+        assert list(history_.topics()) == ['com.myapp.topic1', 'com.device.status']
+
+    def test_limit(self):
+        history_ = history.History([('com.myapp.topic1', broker.MATCH_EXACT)], limit=3)
+        for publication_id in range(5):
+            history_.record(publication_id, 'com.myapp.topic1', [publication_id])
+
+        publications = history_.publications(['com.myapp.topic1'])
+        assert [p.fanouts[0].frame(1) for p in publications] == ['[36,1,2,{},[2]]', '[36,1,3,{},[3]]',
+                                                                 '[36,1,4,{},[4]]']
+        assert len(history_.publications(['com.myapp.topic1'], limit=2)) == 2
+        assert len(history_.publications(['com.myapp.topic1'], limit=10)) == 3
+        assert history_.publications(['com.myapp.topic1'], limit=0) == []
+
+    def test_max_age(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(history.time, 'monotonic', lambda: now[0])
+        history_ = history.History([('com.myapp.topic1', broker.MATCH_EXACT)], max_age=10)
+        history_.record(1, 'com.myapp.topic1')
+        now[0] = 105.0
+        history_.record(2, 'com.myapp.topic1')
+
+        assert len(history_.publications(['com.myapp.topic1'], max_age=2)) == 1
+        now[0] = 112.0
+        assert len(history_.publications(['com.myapp.topic1'])) == 1
+
+    def test_max_topics(self):
+        history_ = history.History([('com.myapp', broker.MATCH_PREFIX)], max_topics=2)
+        history_.record(1, 'com.myapp.topic1')
+        history_.record(2, 'com.myapp.topic2')
+        history_.record(3, 'com.myapp.topic1')
+        history_.record(4, 'com.myapp.topic3')
+
+        assert list(history_.topics()) == ['com.myapp.topic1', 'com.myapp.topic3']
+
+    @pytest.mark.parametrize('uri, match', [
+        ('com.myapp.a', broker.MATCH_EXACT),
+        ('com.myapp', broker.MATCH_PREFIX),
+        ('com.my', broker.MATCH_PREFIX),
+        ('com.myapp.', broker.MATCH_PREFIX),
+        ('org', broker.MATCH_PREFIX),
+        ('com..status', broker.MATCH_WILDCARD),
+        ('com.myapp.', broker.MATCH_WILDCARD),
+        ('..', broker.MATCH_WILDCARD),
+    ])
+    def test_matching(self, uri, match):
+        topics = ['com.myapp', 'com.myapp.a', 'com.myapp.b.c', 'com.myapplication.a', 'com.device.status', 'com.status']
+        history_ = history.History([('com', broker.MATCH_PREFIX)])
+        for publication_id, topic in enumerate(topics):
+            history_.record(publication_id, topic)
+        broker_ = broker.Broker()
+        subscription = broker_.subscribe(None, uri, match)
+
+        assert sorted(history_.matching(uri, match)) == [t for t in sorted(topics) if subscription in broker_.match(t)]
+
+    def test_matching_evicted(self):
+        history_ = history.History([('com', broker.MATCH_PREFIX)], max_topics=1)
+        history_.record(1, 'com.myapp.a.b')
+        history_.record(2, 'com.device')
+
+        assert history_.matching('com.myapp', broker.MATCH_PREFIX) == []
+        assert history_.matching('com', broker.MATCH_PREFIX) == ['com.device']
+        assert list(history_._index.children['com'].children) == ['device']
+
+    def test_order(self):
+        history_ = history.History([('com.myapp', broker.MATCH_PREFIX)])
+        for publication_id, topic in enumerate(['com.myapp.a', 'com.myapp.b', 'com.myapp.a']):
+            history_.record(publication_id, topic)
+
+        publications = history_.publications(['com.myapp.a', 'com.myapp.b'])
+        assert [p.topic for p in publications] == ['com.myapp.a', 'com.myapp.b', 'com.myapp.a']
+
+
+@pytest.fixture
+def realms():
+    history.topics.append(('com.myapp', broker.MATCH_PREFIX))
+    yield realm.realms
+    history.topics.clear()
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+def encode(serializer_, msg):
+    payload = serializer_.serialize(msg)
+    return serializer_.join([payload]) if serializer_.batched else payload
+
+
+def decode_last(serializer_, transport):
+    payload = transport.payloads[-1]
+    return serializer_.unserialize(serializer_.split(payload)[-1] if serializer_.batched else payload)
+
+
+def establish(loop, transport, serializer_=serializer.JSON):
+    session_ = session.Session(transport, serializer_, loop=loop)
+    session_.receive(encode(serializer_, [1, 'realm1', {'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}}}]))
+    run_once(loop)
+    return session_
+
+
+class TestGetEvents:
+    def test_exact(self, loop, realms):
+        publisher = establish(loop, Transport())
+        for i in range(3):
+            publisher.receive(json.dumps([16, i, {}, 'com.myapp.topic1', [i]]))
+        transport = Transport()
+        subscriber = establish(loop, transport)
+        subscriber.receive('[32,1,{},"com.myapp.topic1"]')
+        run_once(loop)
+        subscription_id = json.loads(transport.payloads[-1])[2]
+        subscriber.receive(json.dumps([48, 2, {}, 'wamp.subscription.get_events', [subscription_id, 2]]))
+        run_once(loop)
+
+        result = json.loads(transport.payloads[-1])
+        assert result[:3] == [50, 2, {}]
+        events = result[3][0]
+        assert [event[4] for event in events] == [[1], [2]]
+        assert all(event[:2] == [36, subscription_id] and event[3] == {} for event in events)
+
+    @pytest.mark.parametrize('serializer_', [serializer.MSGPACK, serializer.get('wamp.2.cbor.batched')],
+                             ids=lambda s: s.id)
+    def test_pattern(self, loop, realms, serializer_):
+        publisher = establish(loop, Transport())
+        publisher.receive('[16,1,{},"com.myapp.topic1",["a"]]')
+        publisher.receive('[16,2,{},"com.myapp.topic2",["b"]]')
+        transport = Transport()
+        subscriber = establish(loop, transport, serializer_)
+        subscriber.receive(encode(serializer_, [32, 1, {'match': 'prefix'}, 'com.myapp.topic']))
+        run_once(loop)
+        subscription_id = decode_last(serializer_, transport)[2]
+        subscriber.receive(encode(serializer_, [48, 2, {}, 'wamp.subscription.get_events', [subscription_id]]))
+        run_once(loop)
+
+        events = decode_last(serializer_, transport)[3][0]
+        assert [(event[3], event[4]) for event in events] == [({'topic': 'com.myapp.topic1'}, ['a']),
+                                                              ({'topic': 'com.myapp.topic2'}, ['b'])]
+
+    def test_not_subscribed(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport).receive('[48,2,{},"wamp.subscription.get_events",[1234]]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1]) == [8, 48, 2, {}, 'wamp.error.no_such_subscription']
+
+    @pytest.mark.parametrize('args', ['[]', '["1"]', '[1,-1]', '[1,null,"1"]', '[1,2,3,4]'])
+    def test_invalid_argument(self, loop, realms, args):
+        transport = Transport()
+        establish(loop, transport).receive('[48,2,{},"wamp.subscription.get_events",%s]' % args)
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[4] == 'wamp.error.invalid_argument'
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import threading
+
+from wouter.router import ids
+
+
+class TestRandomIds:
+    def test_range(self):
+        generator = ids.RandomIds(batch=64)
+        values = [generator.generate() for _ in range(1000)]
+
+        assert all(1 <= value <= ids.MAX_ID for value in values)
+        assert len(set(values)) == len(values)
+
+    def test_refill(self):
+        generator = ids.RandomIds(batch=4)
+        generator.generate()
+
+        assert len(generator._pool) == 3
+        for _ in range(3):
+            generator.generate()
+        assert generator._pool == []
+        generator.generate()
+        assert len(generator._pool) == 3
+
+    def test_live(self):
+        generator = ids.RandomIds(batch=4)
+        generator._pool = [3, 2, 1]
+
+        assert generator.generate(live={1, 2}) == 3
+
+
+class TestSequentialIds:
+    def test_sequence(self):
+        generator = ids.SequentialIds()
+
+        assert [generator.generate() for _ in range(3)] == [1, 2, 3]
+
+    def test_wrap(self):
+        generator = ids.SequentialIds()
+        generator._next = ids.MAX_ID
+
+        assert generator.generate() == ids.MAX_ID
+        assert generator.generate() == 1
+
+    def test_live(self):
+        generator = ids.SequentialIds()
+
+        assert generator.generate(live={1, 2}) == 3
+
+
+class TestSharedIds:
+    def test_threads(self):
+        generator = ids.SharedIds(ids.SequentialIds())
+        values = []
+
+        def generate():
+            values.extend(generator.generate() for _ in range(10000))
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(values) == list(range(1, 40001))
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+import hashlib
+import hmac
+import json
+import struct
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.router import link
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+
+
+class LinkTransport(Transport):
+    def messages(self):
+        frames = self.payloads
+        self.payloads = []
+        return [serializer.MSGPACK.unserialize(frame[4:]) for frame in frames]
+
+
+@pytest.fixture
+def realms():
+    yield realm.realms
+    realm.realms.clear()
+    realm.sessions.clear()
+    link.links.clear()
+
+
+def run_once(loop):
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def establish(loop):
+    transport = Transport()
+    session_ = session.Session(transport, serializer.JSON, loop=loop)
+    session_.receive(json.dumps([1, 'realm1', {'roles': {'caller': {}, 'callee': {}, 'subscriber': {}}}]))
+    run_once(loop)
+    transport.payloads.clear()
+    return session_, transport
+
+
+def connect(**kwargs):
+    link_ = link.Link(**kwargs)
+    transport = LinkTransport()
+    link_.connection_made(transport)
+    return link_, transport
+
+
+def frame(msg):
+    payload = serializer.MSGPACK.serialize(msg)
+    return struct.pack('>I', len(payload)) + payload
+
+
+class TestAnnouncements:
+    def test_existing_registrations(self, loop, realms):
+        callee, _ = establish(loop)
+        callee.receive(json.dumps([64, 1, {'invoke': 'roundrobin'}, 'com.example.add']))
+        _, transport = connect()
+
+        assert transport.messages() == [[link.REGISTER, 'realm1', 'com.example.add', 'roundrobin']]
+
+    def test_register_and_unregister(self, loop, realms):
+        _, transport = connect()
+        callee, callee_transport = establish(loop)
+        callee.receive(json.dumps([64, 1, {}, 'com.example.add']))
+        run_once(loop)
+        registration_id = json.loads(callee_transport.payloads[0])[2]
+        callee.receive(json.dumps([66, 2, registration_id]))
+
+        assert transport.messages() == [[link.REGISTER, 'realm1', 'com.example.add', 'single'],
+                                        [link.UNREGISTER, 'realm1', 'com.example.add']]
+
+    def test_subscribe_and_unsubscribe(self, loop, realms):
+        _, transport = connect()
+        subscriber, subscriber_transport = establish(loop)
+        subscriber.receive(json.dumps([32, 1, {'match': 'prefix'}, 'com.example']))
+        other, _ = establish(loop)
+        other.receive(json.dumps([32, 1, {'match': 'prefix'}, 'com.example']))
+        run_once(loop)
+        subscription_id = json.loads(subscriber_transport.payloads[0])[2]
+        subscriber.receive(json.dumps([34, 2, subscription_id]))
+        other.receive(json.dumps([34, 2, subscription_id]))
+
+        assert transport.messages() == [[link.SUBSCRIBE, 'realm1', 'com.example', 'prefix'],
+                                        [link.UNSUBSCRIBE, 'realm1', 'com.example', 'prefix']]
+
+    def test_existing_subscriptions(self, loop, realms):
+        subscriber, _ = establish(loop)
+        subscriber.receive(json.dumps([32, 1, {'match': 'wildcard'}, 'com..topic']))
+        _, transport = connect()
+
+        assert transport.messages() == [[link.SUBSCRIBE, 'realm1', 'com..topic', 'wildcard']]
+
+    def test_publish(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.SUBSCRIBE, 'realm1', 'com.example', 'prefix']))
+        publisher, _ = establish(loop)
+        publisher.receive(json.dumps([16, 1, {}, 'com.example.topic', ['x']]))
+
+        msg = transport.messages()[0]
+        assert msg[:2] == [link.PUBLISH, 'realm1']
+        assert msg[3:] == ['com.example.topic', ['x'], None]
+
+    def test_publish_without_interest(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.SUBSCRIBE, 'realm1', 'com.example.other', 'exact']))
+        publisher, _ = establish(loop)
+        publisher.receive(json.dumps([16, 1, {}, 'com.example.topic', ['x']]))
+
+        assert transport.messages() == []
+
+    def test_publish_after_unsubscribe(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.SUBSCRIBE, 'realm1', 'com.example.topic', 'exact']))
+        link_.data_received(frame([link.UNSUBSCRIBE, 'realm1', 'com.example.topic', 'exact']))
+        publisher, _ = establish(loop)
+        publisher.receive(json.dumps([16, 1, {}, 'com.example.topic', ['x']]))
+
+        assert transport.messages() == []
+
+
+class TestRemote:
+    def test_publish(self, loop, realms):
+        subscriber, subscriber_transport = establish(loop)
+        subscriber.receive(json.dumps([32, 1, {}, 'com.example.topic']))
+        run_once(loop)
+        subscription_id = json.loads(subscriber_transport.payloads.pop())[2]
+        link_, _ = connect()
+        link_.data_received(frame([link.PUBLISH, 'realm1', 5, 'com.example.topic', ['x'], None]))
+        run_once(loop)
+
+        assert json.loads(subscriber_transport.payloads[0]) == [36, subscription_id, 5, {}, ['x']]
+
+    def test_call_remote_callee(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'single']))
+        caller, caller_transport = establish(loop)
+        caller.receive(json.dumps([48, 7, {}, 'com.example.add', [1, 2]]))
+
+        call = transport.messages()[0]
+        assert call[:2] == [link.CALL, 'realm1']
+        assert call[3:] == ['com.example.add', [1, 2], None]
+
+        link_.data_received(frame([link.RESULT, 'realm1', call[2], [3], None]))
+        run_once(loop)
+        assert json.loads(caller_transport.payloads[0]) == [50, 7, {}, [3]]
+
+    def test_call_remote_error(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'single']))
+        caller, caller_transport = establish(loop)
+        caller.receive(json.dumps([48, 7, {}, 'com.example.add']))
+        call = transport.messages()[0]
+        link_.data_received(frame([link.ERROR, 'realm1', call[2], 'com.example.error', {}, None, None]))
+        run_once(loop)
+
+        assert json.loads(caller_transport.payloads[0]) == [8, 48, 7, {}, 'com.example.error']
+
+    def test_call_from_remote(self, loop, realms):
+        callee, callee_transport = establish(loop)
+        callee.receive(json.dumps([64, 1, {}, 'com.example.add']))
+        run_once(loop)
+        callee_transport.payloads.clear()
+        link_, transport = connect()
+        transport.messages()
+        link_.data_received(frame([link.CALL, 'realm1', 9, 'com.example.add', [1, 2], None]))
+        run_once(loop)
+
+        invocation = json.loads(callee_transport.payloads[0])
+        assert invocation[0] == 68
+        callee.receive(json.dumps([70, invocation[1], {}, [3]]))
+        assert transport.messages() == [[link.RESULT, 'realm1', 9, [3], None]]
+
+    def test_call_from_remote_no_procedure(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.CALL, 'realm1', 9, 'com.example.add', [1, 2], None]))
+
+        msg = transport.messages()[0]
+        assert msg[:4] == [link.ERROR, 'realm1', 9, 'wamp.error.no_such_procedure']
+
+    def test_call_from_remote_stays_local(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'roundrobin']))
+        callee, callee_transport = establish(loop)
+        callee.receive(json.dumps([64, 1, {'invoke': 'roundrobin'}, 'com.example.add']))
+        run_once(loop)
+        callee_transport.payloads.clear()
+        transport.messages()
+
+        for request_id in range(2):
+            link_.data_received(frame([link.CALL, 'realm1', request_id, 'com.example.add', [], None]))
+        run_once(loop)
+
+        assert transport.messages() == []
+        assert [json.loads(p)[0] for p in callee_transport.payloads] == [68, 68]
+
+    def test_connection_lost(self, loop, realms):
+        link_, _ = connect()
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'single']))
+        assert realm.get('realm1').dealer.lookup('com.example.add') is not None
+
+        link_.connection_lost(None)
+        assert realm.get('realm1').dealer.lookup('com.example.add') is None
+        assert link_ not in link.links
+
+    def test_connection_lost_in_flight(self, loop, realms):
+        link_, _ = connect()
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'single']))
+        caller, caller_transport = establish(loop)
+        caller.receive(json.dumps([48, 7, {}, 'com.example.add', [1, 2]]))
+        link_.connection_lost(None)
+        run_once(loop)
+
+        assert json.loads(caller_transport.payloads[-1]) == [8, 48, 7, {'message': 'callee left'},
+                                                             'wamp.error.canceled']
+
+    def test_unsubscribe_on_leave(self, loop, realms):
+        link_, transport = connect()
+        transport.messages()
+        subscriber, _ = establish(loop)
+        subscriber.receive(json.dumps([32, 1, {}, 'com.example.topic']))
+        subscriber.connection_lost()
+
+        assert transport.messages() == [[link.SUBSCRIBE, 'realm1', 'com.example.topic', 'exact'],
+                                        [link.UNSUBSCRIBE, 'realm1', 'com.example.topic', 'exact']]
+
+    def test_split_frames(self, loop, realms):
+        link_, _ = connect()
+        data = frame([link.REGISTER, 'realm1', 'com.example.add', 'single'])
+        link_.data_received(data[:3])
+        link_.data_received(data[3:])
+
+        assert realm.get('realm1').dealer.lookup('com.example.add') is not None
+
+    def test_invalid(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([99, 'realm1']))
+
+        assert transport.closed
+
+    def test_invalid_match(self, loop, realms):
+        link_, transport = connect()
+        link_.data_received(frame([link.SUBSCRIBE, 'realm1', 'com.example', 'regex']))
+
+        assert transport.closed
+
+    def test_closed(self, loop, realms):
+        link_, _ = connect()
+        link_.connection_lost(None)
+
+        assert link_.closed.done()
+
+    def test_max_length(self, loop, realms):
+        link_, transport = connect(max_length=16)
+        link_.data_received(struct.pack('>I', 17))
+
+        assert transport.closed
+        assert link_._buffer == struct.pack('>I', 17)
+
+
+class TestAuthentication:
+    def test_accept(self, loop, realms):
+        callee, _ = establish(loop)
+        callee.receive(json.dumps([64, 1, {}, 'com.example.add']))
+        link_, transport = connect(secret=b'secret', accepting=True)
+        (type_, challenge), = transport.messages()
+
+        assert type_ == link.CHALLENGE
+        assert link_ not in link.links
+
+        signature = hmac.new(b'secret', challenge, hashlib.sha256).digest()
+        link_.data_received(frame([link.AUTHENTICATE, signature]))
+
+        assert link_ in link.links
+        assert transport.messages() == [[link.REGISTER, 'realm1', 'com.example.add', 'single']]
+
+    def test_connect(self, loop, realms):
+        link_, transport = connect(secret=b'secret')
+
+        assert transport.messages() == []
+
+        link_.data_received(frame([link.CHALLENGE, b'challenge']))
+
+        assert transport.messages() == [[link.AUTHENTICATE,
+                                         hmac.new(b'secret', b'challenge', hashlib.sha256).digest()]]
+        assert link_ in link.links
+
+    def test_end_to_end(self, loop, realms):
+        accepting, accepting_transport = connect(secret=b'secret', accepting=True)
+        connecting, connecting_transport = connect(secret=b'secret')
+        connecting.data_received(b''.join(accepting_transport.payloads))
+        accepting.data_received(b''.join(connecting_transport.payloads))
+
+        assert accepting.authenticated and connecting.authenticated
+        assert not accepting_transport.closed and not connecting_transport.closed
+
+    def test_wrong_secret(self, loop, realms):
+        accepting, transport = connect(secret=b'secret', accepting=True)
+        connecting, connecting_transport = connect(secret=b'other')
+        connecting.data_received(b''.join(transport.payloads))
+        accepting.data_received(b''.join(connecting_transport.payloads))
+
+        assert transport.closed
+        assert accepting not in link.links
+
+    def test_no_secret(self, loop, realms):
+        accepting, transport = connect(secret=b'secret', accepting=True)
+        connecting, connecting_transport = connect()
+        connecting.data_received(b''.join(transport.payloads))
+
+        assert connecting_transport.closed
+        assert accepting not in link.links
+
+    @pytest.mark.parametrize('msg', [[link.REGISTER, 'realm1', 'com.example.add', 'single'],
+                                     [link.AUTHENTICATE, 'signature'],
+                                     [link.AUTHENTICATE]])
+    def test_unauthenticated(self, loop, realms, msg):
+        link_, transport = connect(secret=b'secret', accepting=True)
+        link_.data_received(frame(msg))
+
+        assert transport.closed
+        assert realm.get('realm1').dealer.lookup('com.example.add') is None
+
+    def test_unchallenged(self, loop, realms):
+        link_, transport = connect(secret=b'secret')
+        link_.data_received(frame([link.REGISTER, 'realm1', 'com.example.add', 'single']))
+
+        assert transport.closed
+        assert transport.messages() == []
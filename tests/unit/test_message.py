@@ -18,36 +18,40 @@
 import pytest
 
 from wouter.router import message
+from wouter.router import serializer
 
 
 class TestHello:
     def test_ctor(self):
-        hello = message.Hello(realm='test', details={'roles': ['publisher', 'subscriber', 'caller', 'callee']})
+        hello = message.Hello(realm='test',
+                              details={'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}})
         assert hello.type.value == 1
 
     def test_ctor_invalid_details(self):
         with pytest.raises(ValueError):
             message.Hello(realm='test', details={})
 
-    def test_ctor_invalid_role(self):
+    @pytest.mark.parametrize('roles', [{'a': {}}, ['publisher'], [[1]], 5, 'caller'])
+    def test_ctor_invalid_role(self, roles):
         with pytest.raises(ValueError):
-            message.Hello(realm='test', details={'roles': ['a']})
+            message.Hello(realm='test', details={'roles': roles})
 
     def test_marshal(self):
-        hello = message.Hello(realm='test', details={'roles': ['publisher', 'subscriber', 'caller', 'callee']})
+        hello = message.Hello(realm='test',
+                              details={'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}})
         msg = hello.marshal()
 
         assert msg[0] == 1
         assert msg[1] == 'test'
-        assert msg[2]['roles'] == ['publisher', 'subscriber', 'caller', 'callee']
+        assert msg[2]['roles'] == {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}
 
     def test_unmarshal(self):
-        msg = [1, 'test', {'roles': ['publisher', 'subscriber', 'caller', 'callee']}]
+        msg = [1, 'test', {'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}}]
         hello = message.Hello.unmarshal(msg=msg)
 
         assert hello.type == message.Type.HELLO
         assert hello.realm == 'test'
-        assert hello.details == {'roles': ['publisher', 'subscriber', 'caller', 'callee']}
+        assert hello.details == {'roles': {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}}
 
 
 class TestWelcome:
@@ -105,6 +109,37 @@ class TestAbort:
         assert abort.reason == 'wamp.error.protocol_violation'
 
 
+class TestChallenge:
+    def test_marshal(self):
+        challenge = message.Challenge(authmethod='wampcra', extra={'challenge': '{}'})
+
+        assert challenge.marshal() == [4, 'wampcra', {'challenge': '{}'}]
+
+    def test_unmarshal(self):
+        challenge = message.Challenge.unmarshal(msg=[4, 'ticket', {}])
+
+        assert challenge.type == message.Type.CHALLENGE
+        assert challenge.authmethod == 'ticket'
+        assert challenge.extra == {}
+
+
+class TestAuthenticate:
+    def test_marshal(self):
+        authenticate = message.Authenticate(signature='secret', extra={})
+
+        assert authenticate.marshal() == [5, 'secret', {}]
+
+    def test_unmarshal(self):
+        authenticate = message.Authenticate.unmarshal(msg=[5, 'c2lnbmF0dXJl', {}])
+
+        assert authenticate.type == message.Type.AUTHENTICATE
+        assert authenticate.signature == 'c2lnbmF0dXJl'
+
+    def test_invalid_signature(self):
+        with pytest.raises(ValueError):
+            message.Authenticate.unmarshal(msg=[5, None, {}])
+
+
 class TestGoodbye:
     def test_ctor(self):
         goodbye = message.Goodbye(details={'message': 'The host is shutting down now.'},
@@ -551,3 +586,73 @@ class TestYield:
         assert yield_.options == {}
         assert yield_.args == []
         assert yield_.kwargs == {"userid": 123, "karma": 10}
+
+
+class TestDecode:
+    def test_dispatch(self):
+        msg = [16, 239714735, {}, 'com.myapp.mytopic1', ['Hello, world!']]
+        publish = message.decode(msg)
+
+        assert isinstance(publish, message.Publish)
+        assert publish.topic == 'com.myapp.mytopic1'
+        assert publish.args == ['Hello, world!']
+
+    def test_round_trip(self):
+        msg = [8, 48, 7814135, {}, 'wamp.error.no_such_procedure']
+        error = message.decode(msg)
+
+        assert error.request_type == message.Type.CALL
+        assert error.marshal() == msg
+
+    def test_unknown_type(self):
+        with pytest.raises(ValueError):
+            message.decode([99, 1])
+
+    def test_invalid_type_code(self):
+        with pytest.raises(ValueError):
+            message.decode(['16', 1, {}, 'com.myapp.mytopic1'])
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            message.decode([])
+
+    def test_invalid_length(self):
+        with pytest.raises(ValueError):
+            message.decode([32, 713845233, {}])
+
+        with pytest.raises(ValueError):
+            message.decode([35, 85346237, 1])
+
+    @pytest.mark.parametrize('msg', [
+        [16, 1, [], 'com.x'],
+        [16, 1, {}, 7],
+        [16, 1, {}, 'com.x', {}],
+        [16, 1, {}, 'com.x', [], []],
+        [32, '1', {}, 'com.x'],
+        [32, True, {}, 'com.x'],
+        [1, 'realm1', None],
+    ])
+    def test_invalid_field(self, msg):
+        with pytest.raises(ValueError):
+            message.decode(msg)
+
+    def test_raw_payload(self):
+        payload = serializer.RawPayload(serializer.JSON, '["Hello, world!"]')
+        publish = message.decode([16, 239714735, {}, 'com.myapp.mytopic1', payload])
+
+        assert publish.args is payload
+
+    def test_unmarshal_wrong_class(self):
+        with pytest.raises(ValueError):
+            message.Subscribe.unmarshal(msg=[33, 713845233, 5512315355])
+
+
+class TestSlots:
+    @pytest.mark.parametrize('cls', [layout[0] for layout in message._layouts.values()])
+    def test_no_instance_dict(self, cls):
+        assert not hasattr(cls.__new__(cls), '__dict__')
+
+    def test_type_is_class_attribute(self):
+        event = message.Event(subscription_id=5512315355, publication_id=4429313566, details={})
+
+        assert event.type is message.Event.type is message.Type.EVENT
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import asyncio
+import json
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.router import broker
+from wouter.router import meta
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+
+
+@pytest.fixture
+def realms():
+    yield realm.realms
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+@pytest.fixture
+def events():
+    meta.events = True
+    yield
+    meta.events = False
+
+
+def run_once(loop):
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def establish(loop, transport, authrole=None):
+    session_ = session.Session(transport, serializer.JSON, loop=loop)
+    if authrole is not None:
+        session_.authrole = authrole
+    session_.receive(json.dumps([1, 'realm1', {'roles': {'caller': {}, 'callee': {}, 'subscriber': {}}}]))
+    run_once(loop)
+    return session_
+
+
+def call(loop, session_, procedure, *args):
+    session_.receive(json.dumps([48, 1, {}, procedure, list(args)]))
+    run_once(loop)
+    return json.loads(session_.transport.payloads[-1])
+
+
+class TestSession:
+    def test_count(self, loop, realms):
+        caller = establish(loop, Transport())
+        establish(loop, Transport(), authrole='device')
+
+        assert call(loop, caller, 'wamp.session.count') == [50, 1, {}, [2]]
+        assert call(loop, caller, 'wamp.session.count', ['device', 'device'])[3] == [1]
+        assert call(loop, caller, 'wamp.session.count', ['backend'])[3] == [0]
+
+    def test_list(self, loop, realms):
+        caller = establish(loop, Transport())
+        device = establish(loop, Transport(), authrole='device')
+
+        assert sorted(call(loop, caller, 'wamp.session.list')[3][0]) == sorted([caller.id, device.id])
+        assert call(loop, caller, 'wamp.session.list', ['device'])[3] == [[device.id]]
+
+    def test_left(self, loop, realms):
+        caller = establish(loop, Transport())
+        device = establish(loop, Transport(), authrole='device')
+        device.connection_lost()
+
+        assert call(loop, caller, 'wamp.session.list', ['device'])[3] == [[]]
+        assert realms['realm1'].authroles.keys() == {'anonymous'}
+
+    def test_get(self, loop, realms):
+        caller = establish(loop, Transport())
+
+        assert call(loop, caller, 'wamp.session.get', caller.id)[3] == [{
+            'session': caller.id, 'authid': None, 'authrole': 'anonymous', 'authmethod': 'anonymous'}]
+        assert call(loop, caller, 'wamp.session.get', 1234)[4] == 'wamp.error.no_such_session'
+
+    def test_invalid_filter(self, loop, realms):
+        caller = establish(loop, Transport())
+
+        assert call(loop, caller, 'wamp.session.count', 'device')[4] == 'wamp.error.invalid_argument'
+
+
+class TestSubscription:
+    def test_lookup(self, loop, realms):
+        caller = establish(loop, Transport())
+        caller.receive('[32,2,{"match":"prefix"},"com.myapp"]')
+        subscription_id, = caller.subscriptions
+
+        assert call(loop, caller, 'wamp.subscription.lookup', 'com.myapp', {'match': 'prefix'})[3] == [subscription_id]
+        assert call(loop, caller, 'wamp.subscription.lookup', 'com.myapp')[3] == [None]
+        assert call(loop, caller, 'wamp.subscription.lookup', 'com.myapp', {'match': 'x'})[4] == \
+            'wamp.error.invalid_argument'
+
+    def test_match(self, loop, realms):
+        caller = establish(loop, Transport())
+        caller.receive('[32,2,{"match":"prefix"},"com.myapp"]')
+        caller.receive('[32,3,{},"com.myapp.topic1"]')
+
+        assert sorted(call(loop, caller, 'wamp.subscription.match', 'com.myapp.topic1')[3][0]) == \
+            sorted(caller.subscriptions)
+        assert call(loop, caller, 'wamp.subscription.match', 'com.other')[3] == [None]
+
+    def test_list_subscribers(self, loop, realms):
+        caller = establish(loop, Transport())
+        other = establish(loop, Transport())
+        for session_ in (caller, other):
+            session_.receive('[32,2,{},"com.myapp.topic1"]')
+        subscription_id, = caller.subscriptions
+
+        assert sorted(call(loop, caller, 'wamp.subscription.list_subscribers', subscription_id)[3][0]) == \
+            sorted([caller.id, other.id])
+        assert call(loop, caller, 'wamp.subscription.list_subscribers', 1234)[4] == \
+            'wamp.error.no_such_subscription'
+
+
+class TestRegistration:
+    def test_lookup(self, loop, realms):
+        caller = establish(loop, Transport())
+        caller.receive('[64,2,{},"com.myapp.echo"]')
+        registration_id, = caller.registrations
+
+        assert call(loop, caller, 'wamp.registration.lookup', 'com.myapp.echo')[3] == [registration_id]
+        assert call(loop, caller, 'wamp.registration.lookup', 'com.myapp', {'match': 'prefix'})[3] == [None]
+        assert call(loop, caller, 'wamp.registration.match', 'com.myapp.echo')[3] == [registration_id]
+        assert call(loop, caller, 'wamp.registration.match', 'com.myapp.other')[3] == [None]
+
+
+class TestEvents:
+    def test_disabled(self, loop, realms):
+        establish(loop, Transport())
+
+        assert realms['realm1'].events is None
+
+    def test_unsubscribed(self, loop, realms, events):
+        establish(loop, Transport())
+        events_ = realms['realm1'].events
+        establish(loop, Transport())
+
+        assert events_._pending == []
+        assert not events_._flushing
+
+    def test_join_leave(self, loop, realms, events):
+        transport = Transport()
+        establish(loop, transport).receive('[32,2,{"match":"prefix"},"wamp.session"]')
+        other = establish(loop, Transport(), authrole='device')
+        other.connection_lost()
+        run_once(loop)
+
+        joined, left = [json.loads(payload) for payload in transport.payloads[-2:]]
+        assert joined[0] == 36 and joined[4][0]['session'] == other.id
+        assert left[0] == 36 and left[4] == [other.id, None, 'device']
+
+    def test_batched(self, loop, realms, events):
+        transport = Transport()
+        subscriber = establish(loop, transport)
+        subscriber.receive('[32,2,{"match":"prefix"},"wamp.subscription"]')
+        run_once(loop)
+        session_ = establish(loop, Transport())
+        session_.receive('[32,3,{},"com.myapp.topic1"]')
+        session_.receive('[34,4,%d]' % next(iter(session_.subscriptions)))
+        events_ = realms['realm1'].events
+
+        assert len(events_._pending) == 4
+        run_once(loop)
+        topics = [json.loads(payload)[3].get('topic') for payload in transport.payloads[-4:]]
+        assert topics == [meta.SUBSCRIPTION_ON_CREATE, meta.SUBSCRIPTION_ON_SUBSCRIBE,
+                          meta.SUBSCRIPTION_ON_UNSUBSCRIBE, meta.SUBSCRIPTION_ON_DELETE]
+
+    def test_subscribed_cache(self, realms):
+        broker_ = broker.Broker()
+        events_ = meta.Events(broker_)
+        loop = asyncio.new_event_loop()
+        try:
+            events_.publish(loop, meta.ON_JOIN, [{}])
+            broker_.subscribe(None, meta.ON_JOIN)
+            events_.publish(loop, meta.ON_JOIN, [{}])
+        finally:
+            loop.close()
+
+        assert events_._pending == [(meta.ON_JOIN, [{}])]
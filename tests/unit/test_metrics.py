@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+from wouter.monitor import metrics
+
+
+class TestHistogram:
+    def test_observe(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.cumulative() == [2, 3, 4]
+        assert histogram.count == 4
+        assert histogram.sum == 2.65
+
+    def test_empty(self):
+        histogram = metrics.Histogram()
+
+        assert histogram.cumulative() == [0] * (len(metrics.LATENCY_BUCKETS) + 1)
+
+
+def test_reset():
+    metrics.counters.bytes_sent += 1
+    metrics.sent[object] += 1
+    metrics.reset()
+
+    assert metrics.counters.bytes_sent == 0
+    assert not metrics.sent
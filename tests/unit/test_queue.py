@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest
+
+from wouter.router import queue
+
+
+class TestSendQueue:
+    def test_drain(self):
+        q = queue.SendQueue()
+        q.put('[35,1]')
+        q.put(b'\x92\x23\x02')
+
+        assert len(q) == 2
+        assert q.bytes == 9
+        assert q.drain() == ['[35,1]', b'\x92\x23\x02']
+        assert len(q) == 0
+        assert q.bytes == 0
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            queue.SendQueue(policy='block')
+
+    def test_abort(self):
+        q = queue.SendQueue(max_messages=2, policy=queue.ABORT)
+
+        assert q.put('a')
+        assert q.put('b')
+        assert not q.put('c')
+        assert q.drain() == ['a', 'b']
+
+    def test_drop_oldest(self):
+        q = queue.SendQueue(max_messages=2, policy=queue.DROP_OLDEST)
+        for payload in 'abc':
+            assert q.put(payload, payload)
+
+        assert q.dropped == 1
+        assert q.drain() == ['b', 'c']
+
+    def test_drop_newest(self):
+        q = queue.SendQueue(max_messages=2, policy=queue.DROP_NEWEST)
+        for payload in 'abc':
+            assert q.put(payload, payload)
+
+        assert q.dropped == 1
+        assert q.drain() == ['a', 'b']
+
+    def test_max_bytes(self):
+        q = queue.SendQueue(max_bytes=10, policy=queue.DROP_OLDEST)
+        q.put('aaaa', 'a')
+        q.put('bbbb', 'b')
+        q.put('cccc', 'c')
+
+        assert q.bytes == 8
+        assert q.drain() == ['bbbb', 'cccc']
+
+    def test_conflate(self):
+        q = queue.SendQueue(max_messages=3, policy=queue.CONFLATE)
+        q.put('x1', 'x')
+        q.put('y1', 'y')
+        q.put('result')
+        q.put('x2', 'x')
+        q.put('y2', 'y')
+
+        assert q.dropped == 2
+        assert q.drain() == ['x2', 'y2', 'result']
+
+    def test_conflate_only_when_full(self):
+        q = queue.SendQueue(max_messages=3, policy=queue.CONFLATE)
+        q.put('x1', 'x')
+        q.put('x2', 'x')
+
+        assert q.drain() == ['x1', 'x2']
+
+    def test_conflate_falls_back_to_drop_oldest(self):
+        q = queue.SendQueue(max_messages=2, policy=queue.CONFLATE)
+        q.put('x1', 'x')
+        q.put('y1', 'y')
+        q.put('z1', 'z')
+        q.put('x2', 'x')
+
+        assert q.drain() == ['z1', 'x2']
+
+    @pytest.mark.parametrize('policy', [queue.DROP_OLDEST, queue.DROP_NEWEST, queue.CONFLATE])
+    def test_replies_kept(self, policy):
+        q = queue.SendQueue(max_messages=2, policy=policy)
+        q.put('welcome')
+        q.put('x1', 'x')
+
+        assert q.put('result')
+        assert q.drain() == ['welcome', 'result']
+
+    @pytest.mark.parametrize('policy', [queue.DROP_OLDEST, queue.DROP_NEWEST, queue.CONFLATE])
+    def test_replies_full(self, policy):
+        q = queue.SendQueue(max_messages=2, policy=policy)
+        q.put('welcome')
+        q.put('subscribed')
+
+        assert not q.put('result')
+        assert q.put('x1', 'x')
+        assert q.dropped == 1
+        assert q.drain() == ['welcome', 'subscribed']
+
+    def test_drop_behind_reply(self):
+        q = queue.SendQueue(max_messages=3, policy=queue.DROP_OLDEST)
+        q.put('result')
+        for payload in ['x1', 'y1', 'z1', 'w1']:
+            q.put(payload, payload[0])
+
+        assert len(q) == 3
+        assert q.drain() == ['result', 'z1', 'w1']
+
+    def test_oversized(self):
+        q = queue.SendQueue(max_bytes=4, policy=queue.DROP_OLDEST)
+        q.put('aa', 'a')
+
+        assert q.put('xxxxx', 'x')
+        assert not q.put('rrrrr')
+        assert q.bytes == 2
+        assert q.drain() == ['aa']
+
+    def test_tombstones_compacted(self):
+        q = queue.SendQueue(max_messages=2, policy=queue.DROP_OLDEST)
+        q.put('result')
+        for index in range(100):
+            q.put(str(index), index)
+
+        assert len(q._entries) <= 4
+        assert q.drain() == ['result', '99']
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import struct
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.router import rawsocket
+from wouter.router import realm
+from wouter.router import router
+
+
+def frame(payload: bytes, frame_type: int = rawsocket.FRAME_MESSAGE) -> bytes:
+    return struct.pack('>I', frame_type << 24 | len(payload)) + payload
+
+
+@pytest.fixture
+def protocol(loop):
+    protocol = rawsocket.RawSocketProtocol(max_length_exponent=1)
+    protocol.connection_made(Transport())
+    yield protocol
+    router.sessions.discard(protocol.session)
+    protocol.connection_lost(None)
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+@pytest.mark.parametrize('exponent, length', [(0, 512), (1, 1024), (14, 2 ** 23), (15, 0xffffff)])
+def test_max_length(exponent, length):
+    assert rawsocket.max_length(exponent) == length
+
+
+class TestHandshake:
+    def test_accept(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)))
+
+        assert protocol.transport.data == bytes((0x7f, 0x11, 0, 0))
+        assert protocol.peer_max_length == rawsocket.MAX_LENGTH
+        assert protocol.session.serializer.id == 'json'
+
+    def test_partial(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf2)))
+        assert protocol.session is None
+
+        protocol.data_received(bytes((0, 0)))
+        assert protocol.session.serializer.id == 'msgpack'
+
+    def test_unsupported_serializer(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf9, 0, 0)))
+
+        assert protocol.transport.data == bytes((0x7f, 0x10, 0, 0))
+        assert protocol.transport.closed
+
+    def test_reserved_bits(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 1, 0)))
+
+        assert protocol.transport.data == bytes((0x7f, 0x30, 0, 0))
+        assert protocol.transport.closed
+
+    def test_invalid_magic(self, protocol):
+        protocol.data_received(b'GET / HTTP/1.1\r\n')
+
+        assert protocol.transport.closed
+
+
+class TestFraming:
+    def test_ping(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)) + frame(b'abc', rawsocket.FRAME_PING))
+
+        assert protocol.transport.data[4:] == frame(b'abc', rawsocket.FRAME_PONG)
+
+    def test_split_frames(self, protocol):
+        data = (bytes((0x7f, 0xf1, 0, 0)) +
+                frame(b'[1,"realm1",{"roles":{"subscriber":{}}}]') +
+                frame(b'[32,1,{},"com.myapp.topic1"]'))
+        for i in range(len(data)):
+            protocol.data_received(data[i:i + 1])
+
+        assert not protocol.transport.closed
+        assert protocol._buffer == b''
+        assert protocol.session.realm.broker.lookup('com.myapp.topic1') is not None
+
+    def test_max_length(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)) + frame(b'[' + b' ' * 1024 + b']'))
+
+        assert protocol.transport.closed
+
+    @pytest.mark.parametrize('payload', [b'[99]', b'[1,"\xff"]'])
+    def test_invalid_message(self, protocol, payload):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)) + frame(payload) + frame(b'[99]'))
+
+        assert b'wamp.error.protocol_violation' in protocol.transport.data
+        assert protocol.transport.closed
+
+    def test_write(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)))
+        protocol.write('[35,1]')
+
+        assert protocol.transport.data[4:] == frame(b'[35,1]')
+
+    def test_write_exceeds_frame_length(self, protocol):
+        protocol.data_received(bytes((0x7f, 0xf1, 0, 0)))
+        protocol.write(b' ' * 2 ** 24)
+
+        assert protocol.transport.data == bytes((0x7f, 0x11, 0, 0))
+        assert protocol.transport.closed
+
+    def test_write_exceeds_peer_max_length(self, protocol):
+        protocol.data_received(bytes((0x7f, 0x01, 0, 0)))
+        protocol.write('[' + ' ' * 512 + ']')
+
+        assert protocol.transport.closed
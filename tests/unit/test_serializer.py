@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest
+
+from wouter.router import serializer
+
+SERIALIZERS = [serializer.JSON, serializer.MSGPACK, serializer.CBOR]
+
+PAYLOAD_INDEX = {16: 4, 48: 4, 70: 3, 8: 5}
+
+
+@pytest.mark.parametrize('serializer_', SERIALIZERS, ids=lambda s: s.id)
+class TestSerializer:
+    def test_round_trip(self, serializer_):
+        msg = [16, 239714735, {'acknowledge': True}, 'com.myapp.mytopic1', [1.5, None, True],
+               {'color': 'orange', 'sizes': [23, 42, 7]}]
+
+        assert serializer_.unserialize(serializer_.serialize(msg)) == msg
+
+    def test_unserialize_not_list(self, serializer_):
+        with pytest.raises(ValueError):
+            serializer_.unserialize(serializer_.serialize({'a': 1}))
+
+    def test_splice(self, serializer_):
+        msg = [36, 0, 4429313566, {}, ['Hello, world!']]
+        template = serializer_.template(msg, 1)
+
+        for subscription_id in (1, 5512315355, 2 ** 53):
+            msg[1] = subscription_id
+            assert serializer_.splice(template, subscription_id) == serializer_.serialize(msg)
+
+    def test_splice_last(self, serializer_):
+        template = serializer_.template([35, 0], 1)
+
+        assert serializer_.unserialize(serializer_.splice(template, 85346237)) == [35, 85346237]
+
+
+@pytest.mark.parametrize('serializer_', SERIALIZERS, ids=lambda s: s.id)
+class TestUnserializeRouting:
+    def test_header_only(self, serializer_):
+        msg = [16, 239714735, {'acknowledge': True}, 'com.myapp.mytopic1', [1.5, None], {'color': 'orange'}]
+        decoded = serializer_.unserialize_routing(serializer_.serialize(msg), PAYLOAD_INDEX)
+
+        assert decoded[:4] == msg[:4]
+        assert len(decoded) == 5
+        raw = decoded[4]
+        assert type(raw) is serializer.RawPayload
+        assert raw.serializer is serializer_
+        assert raw.items() == [[1.5, None], {'color': 'orange'}]
+
+    def test_byte_for_byte(self, serializer_):
+        args = serializer_.unserialize_routing(serializer_.serialize([48, 1, {}, 'com.myapp.add', [2, 3]]),
+                                               PAYLOAD_INDEX)[4]
+
+        assert serializer_.serialize([50, 1, {}, args]) == serializer_.serialize([50, 1, {}, [2, 3]])
+
+    def test_template(self, serializer_):
+        raw = serializer_.unserialize_routing(serializer_.serialize([16, 1, {}, 'com.myapp.topic', ['x'], {'y': 1}]),
+                                              PAYLOAD_INDEX)[4]
+        template = serializer_.template([36, 0, 2, {}, raw], 1)
+
+        assert serializer_.unserialize(serializer_.splice(template, 3)) == [36, 3, 2, {}, ['x'], {'y': 1}]
+
+    @pytest.mark.parametrize('other', SERIALIZERS, ids=lambda s: s.id)
+    def test_other_serializer(self, serializer_, other):
+        raw = serializer_.unserialize_routing(serializer_.serialize([70, 1, {}, ['x'], {'y': 1}]), PAYLOAD_INDEX)[3]
+
+        assert other.unserialize(other.serialize([50, 1, {}, raw])) == [50, 1, {}, ['x'], {'y': 1}]
+
+    def test_no_payload(self, serializer_):
+        msg = [16, 1, {}, 'com.myapp.topic']
+
+        assert serializer_.unserialize_routing(serializer_.serialize(msg), PAYLOAD_INDEX) == msg
+
+    def test_other_type(self, serializer_):
+        msg = [36, 1, 2, {}, ['x']]
+
+        assert serializer_.unserialize_routing(serializer_.serialize(msg), PAYLOAD_INDEX) == msg
+
+    def test_not_list(self, serializer_):
+        with pytest.raises(ValueError):
+            serializer_.unserialize_routing(serializer_.serialize({'a': 1}), PAYLOAD_INDEX)
+
+
+class TestJSONUnserializeRouting:
+    def test_whitespace(self):
+        msg = serializer.JSON.unserialize_routing(' [ 16 , 1 , {} , "topic" , [ "x" ] ] ', PAYLOAD_INDEX)
+
+        assert msg[:4] == [16, 1, {}, 'topic']
+        assert serializer.JSON.serialize([36, 1, 2, {}, msg[4]]) == '[36,1,2,{}, [ "x" ] ]'
+
+    @pytest.mark.parametrize('payload', ['[16,1,{},"topic",]', '[16,1,{},"topic"', '[16 1]', '[]'])
+    def test_invalid(self, payload):
+        with pytest.raises(ValueError):
+            serializer.JSON.unserialize_routing(payload, PAYLOAD_INDEX)
+
+
+class TestDecodePayload:
+    def test_raw(self):
+        raw = serializer.JSON.unserialize_routing('[16,1,{},"topic",["x"],{"y":1}]', PAYLOAD_INDEX)[4]
+
+        assert serializer.decode_payload(raw, None) == (['x'], {'y': 1})
+
+    def test_args_only(self):
+        raw = serializer.JSON.unserialize_routing('[16,1,{},"topic",["x"]]', PAYLOAD_INDEX)[4]
+
+        assert serializer.decode_payload(raw, None) == (['x'], None)
+
+    def test_decoded(self):
+        assert serializer.decode_payload(['x'], {'y': 1}) == (['x'], {'y': 1})
+
+
+class TestGet:
+    def test_subprotocols(self):
+        assert serializer.get('wamp.2.json') is serializer.JSON
+        assert serializer.get('wamp.2.msgpack') is serializer.MSGPACK
+        assert serializer.get('wamp.2.cbor') is serializer.CBOR
+
+    def test_default(self):
+        assert serializer.get(None) is serializer.JSON
+
+    def test_unsupported(self):
+        assert serializer.get('wamp.2.ubjson') is None
+
+    def test_binary(self):
+        assert not serializer.JSON.binary
+        assert serializer.MSGPACK.binary
+        assert serializer.CBOR.binary
+
+
+@pytest.mark.parametrize('serializer_', SERIALIZERS, ids=lambda s: s.id)
+class TestBatchedSerializer:
+    def test_subprotocol(self, serializer_):
+        batched = serializer.get(serializer_.subprotocol + '.batched')
+
+        assert batched.batched
+        assert batched.binary == serializer_.binary
+
+    def test_join_split(self, serializer_):
+        batched = serializer.BatchedSerializer(serializer_)
+        msgs = [[16, 1, {}, 'com.myapp.topic1', ['\x18']], [32, 2, {}, 'com.myapp.topic2'], [35, 3]]
+        payload = batched.join([batched.serialize(msg) for msg in msgs])
+
+        assert [batched.unserialize(frame) for frame in batched.split(payload)] == msgs
+
+    def test_split_truncated(self, serializer_):
+        batched = serializer.BatchedSerializer(serializer_)
+        payload = batched.join([batched.serialize([35, 3])])
+
+        with pytest.raises(ValueError):
+            batched.split(payload[:-1])
+
+
+class TestJSONBatch:
+    def test_separator(self):
+        batched = serializer.BatchedSerializer(serializer.JSON)
+
+        assert batched.join(['[35,1]', '[35,2]']) == '[35,1]\x18[35,2]\x18'
@@ -0,0 +1,607 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+import json
+
+import pytest
+
+from tests.unit.conftest import Transport
+from wouter.router import auth
+from wouter.router import authorizer
+from wouter.router import message
+from wouter.router import queue
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+
+
+def run_once(loop):
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+class TestSend:
+    def test_coalesced(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.send(message.Unsubscribed(request_id=1))
+        session_.send(message.Unsubscribed(request_id=2))
+
+        assert transport.payloads == []
+        run_once(loop)
+        assert transport.payloads == ['[35,1]', '[35,2]']
+
+    def test_batched(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.get('wamp.2.json.batched'), loop=loop)
+        session_.send(message.Unsubscribed(request_id=1))
+        session_.send_frame('[35,2]')
+        run_once(loop)
+
+        assert transport.payloads == ['[35,1]\x18[35,2]\x18']
+
+    def test_flush_empty(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.flush()
+
+        assert transport.payloads == []
+
+    def test_paused(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.pause_writing()
+        session_.send(message.Unsubscribed(request_id=1))
+        run_once(loop)
+
+        assert transport.payloads == []
+        assert len(session_.queue) == 1
+
+        session_.resume_writing()
+        assert transport.payloads == ['[35,1]']
+
+    def test_overflow_aborts(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.queue = queue.SendQueue(max_messages=2)
+        session_.pause_writing()
+        for request_id in range(3):
+            session_.send(message.Unsubscribed(request_id=request_id))
+        session_.send(message.Unsubscribed(request_id=3))
+        run_once(loop)
+
+        assert session_.state is session.State.CLOSED
+        assert [json.loads(p) for p in transport.payloads] == [
+            [3, {'message': 'send queue overflowed'}, session.SLOW_CONSUMER]]
+        assert transport.closed
+
+
+class TestReceive:
+    @pytest.mark.parametrize('payload', ['[99]', '{', '[16,1,[],"com.x"]', '[1,"realm1",[]]', b'[1,"\xff"]',
+                                         '[1,"realm1",{"roles":5}]', '[1,"realm1",{"roles":[[1]]}]'])
+    def test_invalid(self, loop, payload):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.receive(payload)
+        run_once(loop)
+
+        abort = json.loads(transport.payloads[-1])
+        assert abort[0] == 3
+        assert abort[2] == 'wamp.error.protocol_violation'
+        assert transport.closed
+        assert session_.state is session.State.FAILED
+
+    def test_invalid_batch(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.get('wamp.2.json.batched'), loop=loop)
+        session_.receive('[35,1]\x18[99]\x18')
+        run_once(loop)
+
+        assert transport.closed
+        assert session_.state is session.State.FAILED
+
+    @pytest.mark.parametrize('payload', [
+        '[64,1,{"invoke":[]},"com.myapp.echo"]',
+        '[48,1,{"timeout":1e400},"com.myapp.echo"]',
+        '[48,1,{"timeout":-1},"com.myapp.echo"]',
+    ])
+    def test_invalid_option(self, loop, realms, payload):
+        transport = Transport()
+        establish(loop, Transport(), roles={'callee': {}}).receive('[64,1,{},"com.myapp.echo"]')
+        establish(loop, transport, roles={'caller': {}, 'callee': {}}).receive(payload)
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[4] == 'wamp.error.invalid_argument'
+        assert not transport.closed
+
+    @pytest.mark.parametrize('payload', [b'\x92\x01', b'\x93\x01\xa6realm1\xcd\x01'])
+    def test_invalid_binary(self, loop, payload):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.get('wamp.2.msgpack'), loop=loop)
+        session_.receive(payload)
+        run_once(loop)
+
+        assert transport.closed
+        assert session_.state is session.State.FAILED
+
+
+@pytest.fixture
+def realms():
+    yield realm.realms
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+def establish(loop, transport, roles=None):
+    session_ = session.Session(transport, serializer.JSON, loop=loop)
+    session_.receive(json.dumps([1, 'realm1', {'roles': roles or {'publisher': {}, 'subscriber': {}}}]))
+    run_once(loop)
+    return session_
+
+
+class TestEstablishment:
+    def test_hello(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+
+        welcome = json.loads(transport.payloads[0])
+        assert welcome[0] == message.Type.WELCOME.value
+        assert welcome[1] == session_.id
+        assert session_.state == session.State.ESTABLISHED
+        assert realms['realm1'].sessions[session_.id] is session_
+
+    def test_before_hello(self, loop):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.receive('[32,1,{},"com.myapp.topic1"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[0])[1:] == [
+            {'message': 'unexpected SUBSCRIBE message in state closed'}, 'wamp.error.protocol_violation']
+        assert transport.closed
+        assert session_.state is session.State.FAILED
+
+    def test_hello_after_established(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive(json.dumps([1, 'realm1', {'roles': {'subscriber': {}}}]))
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.protocol_violation'
+        assert transport.closed
+        assert realms['realm1'].sessions == {}
+
+    def test_ignored_after_violation(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive('[8,48,1,{},"wamp.error.canceled"]')
+        session_.receive('[32,1,{},"com.myapp.topic1"]')
+        session_.receive(json.dumps([1, 'realm1', {'roles': {'subscriber': {}}}]))
+        run_once(loop)
+
+        assert [json.loads(p)[0] for p in transport.payloads] == [message.Type.WELCOME.value, message.Type.ABORT.value]
+        assert session_.state is session.State.FAILED
+        assert session_.subscriptions == {}
+
+    def test_invalid_realm(self, loop, realms):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.receive(json.dumps([1, 'my realm', {'roles': {'subscriber': {}}}]))
+
+        assert json.loads(transport.payloads[0])[2] == 'wamp.error.invalid_uri'
+        assert transport.closed
+        assert realms == {}
+
+    def test_goodbye(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive('[6,{},"wamp.close.close_realm"]')
+
+        assert json.loads(transport.payloads[-1]) == [6, {}, 'wamp.close.goodbye_and_out']
+        assert transport.closed
+        assert realms['realm1'].sessions == {}
+
+
+class TestPubSub:
+    def test_publish(self, loop, realms):
+        subscriber, publisher = Transport(), Transport()
+        establish(loop, subscriber).receive('[32,1,{},"com.myapp.topic1"]')
+        establish(loop, publisher).receive('[16,2,{"acknowledge":true},"com.myapp.topic1",["Hello, world!"]]')
+        run_once(loop)
+
+        subscribed, event = [json.loads(payload) for payload in subscriber.payloads[1:]]
+        published = json.loads(publisher.payloads[1])
+        assert subscribed[:2] == [33, 1]
+        assert event == [36, subscribed[2], published[2], {}, ['Hello, world!']]
+        assert published[:2] == [17, 2]
+
+    def test_subscribe_invalid_match(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport).receive('[32,1,{"match":"regex"},"com.myapp.topic1"]')
+        run_once(loop)
+
+        error = json.loads(transport.payloads[-1])
+        assert error[:3] == [8, 32, 1]
+        assert error[4] == 'wamp.error.invalid_argument'
+
+    @pytest.mark.parametrize('msg', [
+        '[32,1,{},"com.myapp..topic1"]',
+        '[32,1,{"match":"prefix"},"com.my app"]',
+        '[16,1,{"acknowledge":true},"com.myapp.#"]',
+    ])
+    def test_invalid_uri(self, loop, realms, msg):
+        transport = Transport()
+        establish(loop, transport).receive(msg)
+        run_once(loop)
+
+        error = json.loads(transport.payloads[-1])
+        assert error[:3] == [8, json.loads(msg)[0], 1]
+        assert error[4] == 'wamp.error.invalid_uri'
+
+    def test_invalid_uri_unacknowledged(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport).receive('[16,1,{},"com.myapp.#"]')
+        run_once(loop)
+
+        assert len(transport.payloads) == 1
+
+    def test_subscribe_wildcard(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport).receive('[32,1,{"match":"wildcard"},"com..topic1"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[0] == 33
+
+    def test_unsubscribe(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive('[32,1,{},"com.myapp.topic1"]')
+        run_once(loop)
+        subscription_id = json.loads(transport.payloads[-1])[2]
+        session_.receive(json.dumps([34, 2, subscription_id]))
+        session_.receive(json.dumps([34, 3, subscription_id]))
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-2]) == [35, 2]
+        assert json.loads(transport.payloads[-1]) == [8, 34, 3, {}, 'wamp.error.no_such_subscription']
+
+
+class TestRPC:
+    def test_call(self, loop, realms):
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.echo"]')
+        caller_session = establish(loop, caller, roles={'caller': {}})
+        caller_session.receive('[48,2,{},"com.myapp.echo",["Hello, world!"]]')
+        run_once(loop)
+
+        registered, invocation = [json.loads(payload) for payload in callee.payloads[1:]]
+        assert registered[:2] == [65, 1]
+        assert invocation[2:] == [registered[2], {}, ['Hello, world!']]
+
+        callee_session.receive(json.dumps([70, invocation[1], {}, ['Hello, world!']]))
+        run_once(loop)
+        assert json.loads(caller.payloads[-1]) == [50, 2, {}, ['Hello, world!']]
+
+    def test_call_error(self, loop, realms):
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.echo"]')
+        establish(loop, caller, roles={'caller': {}}).receive('[48,2,{},"com.myapp.echo"]')
+        run_once(loop)
+
+        invocation = json.loads(callee.payloads[-1])
+        callee_session.receive(json.dumps([8, 68, invocation[1], {}, 'com.myapp.error.failed', [1]]))
+        run_once(loop)
+        assert json.loads(caller.payloads[-1]) == [8, 48, 2, {}, 'com.myapp.error.failed', [1]]
+
+    def test_no_such_procedure(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport, roles={'caller': {}}).receive('[48,2,{},"com.myapp.echo"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1]) == [8, 48, 2, {}, 'wamp.error.no_such_procedure']
+
+    def test_unregister(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport, roles={'callee': {}})
+        session_.receive('[64,1,{},"com.myapp.echo"]')
+        run_once(loop)
+        registration_id = json.loads(transport.payloads[-1])[2]
+        session_.receive(json.dumps([66, 2, registration_id]))
+        session_.receive(json.dumps([66, 3, registration_id]))
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-2]) == [67, 2]
+        assert json.loads(transport.payloads[-1]) == [8, 66, 3, {}, 'wamp.error.no_such_registration']
+
+
+@pytest.fixture
+def passthrough():
+    session.passthrough = True
+    yield
+    session.passthrough = False
+
+
+class TestPassthrough:
+    def test_publish(self, loop, realms, passthrough):
+        subscriber, publisher = Transport(), Transport()
+        establish(loop, subscriber).receive('[32,1,{},"com.myapp.topic1"]')
+        establish(loop, publisher).receive('[16,2,{},"com.myapp.topic1",[ "Hello, world!" ], {"n": 1.50}]')
+        run_once(loop)
+
+        assert subscriber.payloads[-1].endswith(',{},[ "Hello, world!" ], {"n": 1.50}]')
+
+    def test_call(self, loop, realms, passthrough):
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.echo"]')
+        establish(loop, caller, roles={'caller': {}}).receive('[48,2,{},"com.myapp.echo",[1.50]]')
+        run_once(loop)
+
+        invocation = callee.payloads[-1]
+        assert invocation.endswith(',{},[1.50]]')
+
+        callee_session.receive('[70,%d,{},[2.50]]' % json.loads(invocation)[1])
+        run_once(loop)
+        assert caller.payloads[-1] == '[50,2,{},[2.50]]'
+
+    def test_other_serializer(self, loop, realms, passthrough):
+        subscriber = Transport()
+        subscriber_session = session.Session(subscriber, serializer.MSGPACK, loop=loop)
+        subscriber_session.receive(serializer.MSGPACK.serialize([1, 'realm1', {'roles': {'subscriber': {}}}]))
+        subscriber_session.receive(serializer.MSGPACK.serialize([32, 1, {}, 'com.myapp.topic1']))
+        establish(loop, Transport()).receive('[16,2,{},"com.myapp.topic1",["Hello, world!"]]')
+        run_once(loop)
+
+        assert serializer.MSGPACK.unserialize(subscriber.payloads[-1])[4] == ['Hello, world!']
+
+
+class TestTeardown:
+    def test_subscriptions(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive('[32,1,{},"com.myapp.topic1"]')
+        session_.receive('[32,2,{"match":"prefix"},"com.myapp"]')
+        other = establish(loop, Transport())
+        other.receive('[32,1,{},"com.myapp.topic1"]')
+        broker_ = realms['realm1'].broker
+        session_.connection_lost()
+
+        assert session_.subscriptions == {}
+        assert [s.subscribers for s in broker_.subscriptions.values()] == [{other}]
+        assert broker_.match('com.myapp.topic2') == []
+        assert session_.id not in realm.sessions
+
+    def test_registrations(self, loop, realms):
+        session_ = establish(loop, Transport(), roles={'callee': {}})
+        session_.receive('[64,1,{},"com.myapp.echo"]')
+        session_.connection_lost()
+
+        assert session_.registrations == {}
+        assert realms['realm1'].dealer.lookup('com.myapp.echo') is None
+
+    def test_callee_in_flight(self, loop, realms):
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.echo"]')
+        establish(loop, caller, roles={'caller': {}}).receive('[48,2,{},"com.myapp.echo"]')
+        run_once(loop)
+        callee_session.connection_lost()
+        run_once(loop)
+
+        assert json.loads(caller.payloads[-1]) == [8, 48, 2, {'message': 'callee left'}, 'wamp.error.canceled']
+        assert len(realms['realm1'].dealer.invocations) == 0
+
+    def test_caller_in_flight(self, loop, realms):
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.echo"]')
+        caller_session = establish(loop, caller, roles={'caller': {}})
+        caller_session.receive('[48,2,{},"com.myapp.echo"]')
+        run_once(loop)
+        caller_session.connection_lost()
+        callee_session.receive(json.dumps([70, json.loads(callee.payloads[-1])[1], {}, ['late']]))
+        run_once(loop)
+
+        assert len(caller.payloads) == 1
+        assert len(realms['realm1'].dealer.invocations) == 0
+
+    def test_unsubscribe_other_session(self, loop, realms):
+        transport = Transport()
+        establish(loop, Transport()).receive('[32,1,{},"com.myapp.topic1"]')
+        subscription_id, = realms['realm1'].broker.subscriptions
+        establish(loop, transport).receive(json.dumps([34, 2, subscription_id]))
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1]) == [8, 34, 2, {}, 'wamp.error.no_such_subscription']
+
+    def test_leave_twice(self, loop, realms):
+        transport = Transport()
+        session_ = establish(loop, transport)
+        session_.receive('[6,{},"wamp.close.close_realm"]')
+        session_.connection_lost()
+
+        assert session_.state is session.State.CLOSED
+
+
+@pytest.fixture
+def users():
+    auth.methods.extend([auth.WAMPCRA, auth.TICKET])
+    auth.users['alice'] = auth.User('frontend', 'secret', salt='salt', iterations=100)
+    yield auth.users
+    auth.reset()
+
+
+def settle(loop):
+    """Run the loop until authentications in progress complete and their replies are written."""
+    loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+    run_once(loop)
+
+
+class TestAuthentication:
+    def hello(self, loop, transport, authmethod, authid='alice'):
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.receive(json.dumps([1, 'realm1', {'roles': {'caller': {}}, 'authmethods': [authmethod],
+                                                   'authid': authid}]))
+        run_once(loop)
+        return session_
+
+    def test_wampcra(self, loop, realms, users):
+        transport = Transport()
+        session_ = self.hello(loop, transport, 'wampcra')
+        challenge = json.loads(transport.payloads[0])
+        assert challenge[:2] == [4, 'wampcra']
+        assert session_.state is session.State.CHALLENGING
+
+        extra = challenge[2]
+        key = auth.derive_key('secret', extra['salt'], extra['iterations'], extra['keylen'])
+        session_.receive(json.dumps([5, auth.sign(key, extra['challenge']), {}]))
+        settle(loop)
+
+        welcome = json.loads(transport.payloads[-1])
+        assert welcome[0] == message.Type.WELCOME.value
+        assert welcome[2]['authid'] == 'alice'
+        assert welcome[2]['authrole'] == 'frontend'
+        assert welcome[2]['authmethod'] == 'wampcra'
+        assert realms['realm1'].sessions[session_.id] is session_
+
+    def test_ticket_failed(self, loop, realms, users):
+        transport = Transport()
+        session_ = self.hello(loop, transport, 'ticket')
+        session_.receive('[5,"guess",{}]')
+        settle(loop)
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.authentication_failed'
+        assert transport.closed
+        assert realms == {}
+
+    def test_unknown_authid(self, loop, realms, users):
+        unknown, failed = Transport(), Transport()
+        self.hello(loop, unknown, 'ticket', authid='mallory')
+        self.hello(loop, failed, 'ticket').receive('[5,"guess",{}]')
+        settle(loop)
+
+        assert json.loads(unknown.payloads[-1]) == json.loads(failed.payloads[-1])
+        assert unknown.closed
+
+    def test_verify_error(self, loop, realms, users, monkeypatch):
+        async def verify(*args):
+            raise RuntimeError('no key')
+        monkeypatch.setattr(auth.get(), 'verify', verify)
+        transport = Transport()
+        session_ = self.hello(loop, transport, 'ticket')
+        session_.receive('[5,"secret",{}]')
+        settle(loop)
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.authentication_failed'
+        assert transport.closed
+        assert session_.state is session.State.CLOSED
+
+    def test_invalid_authmethods(self, loop, realms, users):
+        transport = Transport()
+        session_ = session.Session(transport, serializer.JSON, loop=loop)
+        session_.receive('[1,"realm1",{"roles":{"caller":{}},"authmethods":5,"authid":"alice"}]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.no_auth_method'
+        assert transport.closed
+
+    def test_no_auth_method(self, loop, realms, users):
+        transport = Transport()
+        self.hello(loop, transport, 'anonymous')
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.no_auth_method'
+        assert transport.closed
+
+    def test_anonymous(self, loop, realms):
+        transport = Transport()
+        establish(loop, transport)
+
+        assert json.loads(transport.payloads[0])[2]['authrole'] == 'anonymous'
+
+    def test_lost_while_verifying(self, loop, realms, users):
+        transport = Transport()
+        session_ = self.hello(loop, transport, 'ticket')
+        session_.receive('[5,"secret",{}]')
+        session_.connection_lost()
+        settle(loop)
+
+        assert len(transport.payloads) == 1
+        assert realms == {}
+
+    def test_message_while_challenged(self, loop, realms, users):
+        transport = Transport()
+        session_ = self.hello(loop, transport, 'ticket')
+        session_.receive('[48,1,{},"com.myapp.echo"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[2] == 'wamp.error.protocol_violation'
+
+
+@pytest.fixture
+def permissions():
+    authorizer.permissions.append(authorizer.Permission('anonymous', 'com.myapp', ['subscribe', 'call'], 'prefix'))
+    yield authorizer.permissions
+    authorizer.permissions.clear()
+    authorizer.procedure = None
+
+
+class TestAuthorization:
+    def test_allowed(self, loop, realms, permissions):
+        transport = Transport()
+        establish(loop, transport).receive('[32,1,{},"com.myapp.topic1"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[0] == message.Type.SUBSCRIBED.value
+
+    def test_denied(self, loop, realms, permissions):
+        transport = Transport()
+        establish(loop, transport).receive('[16,1,{"acknowledge":true},"com.myapp.topic1"]')
+        run_once(loop)
+
+        assert json.loads(transport.payloads[-1])[:2] == [message.Type.ERROR.value, message.Type.PUBLISH.value]
+        assert json.loads(transport.payloads[-1])[4] == 'wamp.error.not_authorized'
+
+    def test_denied_unacknowledged(self, loop, realms, permissions):
+        transport = Transport()
+        establish(loop, transport).receive('[16,1,{},"com.myapp.topic1"]')
+        run_once(loop)
+
+        assert len(transport.payloads) == 1
+
+    def test_dynamic(self, loop, realms, permissions):
+        permissions.append(authorizer.Permission('anonymous', 'com.myapp.authorize', ['register']))
+        authorizer.procedure = 'com.myapp.authorize'
+        callee, caller = Transport(), Transport()
+        callee_session = establish(loop, callee, roles={'callee': {}})
+        callee_session.receive('[64,1,{},"com.myapp.authorize"]')
+        session_ = establish(loop, caller)
+        session_.receive('[16,1,{"acknowledge":true},"com.myapp.topic1"]')
+        session_.receive('[32,2,{},"com.myapp.topic1"]')
+        run_once(loop)
+
+        invocation = json.loads(callee.payloads[-1])
+        assert invocation[4][1:] == ['com.myapp.topic1', 'publish']
+        assert len(caller.payloads) == 1
+
+        callee_session.receive(json.dumps([70, invocation[1], {}, [True]]))
+        run_once(loop)
+
+        assert [json.loads(p)[0] for p in caller.payloads[1:]] == [message.Type.PUBLISHED.value,
+                                                                   message.Type.SUBSCRIBED.value]
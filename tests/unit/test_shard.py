@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from tests.unit import conftest
+from wouter.monitor import exporter
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import session
+from wouter.router import shard
+
+
+class Transport(conftest.Transport):
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def write(self, payload):
+        self.threads.add(threading.get_ident())
+        super().write(payload)
+
+
+@pytest.fixture
+def shards():
+    yield shard.shards
+    shard.stop()
+    realm.realms.clear()
+    realm.sessions.clear()
+
+
+def wait_for(loop, condition):
+    for _ in range(200):
+        loop.run_until_complete(asyncio.sleep(0.005))
+        if condition():
+            return
+    raise AssertionError('timed out')
+
+
+def establish(loop, transport, name):
+    session_ = session.Session(transport, serializer.JSON, loop=loop)
+    session_.receive(json.dumps([1, name, {'roles': {'publisher': {}, 'subscriber': {}}}]))
+    wait_for(loop, lambda: transport.payloads)
+    return session_
+
+
+class TestAssign:
+    def test_groups(self, shards):
+        first = shard.assign(['realm1', 'realm2'])
+        second = shard.assign(['realm3'])
+
+        assert shard.get('realm1') is first
+        assert shard.get('realm2') is first
+        assert shard.get('realm3') is second
+        assert first is not second
+        assert shard.get('realm4') is None
+
+    def test_duplicate(self, shards):
+        shard.assign(['realm1'])
+
+        with pytest.raises(ValueError):
+            shard.assign(['realm2', 'realm1'])
+        assert shard.get('realm2') is None
+
+
+class TestHandOff:
+    def test_hello(self, loop, shards):
+        shard_ = shard.assign(['realm1'])
+        shard.start()
+        transport = Transport()
+        session_ = establish(loop, transport, 'realm1')
+
+        assert json.loads(transport.payloads[0])[0] == 2
+        assert session_.shard is shard_
+        assert session_.loop is shard_.loop
+        assert transport.threads == {threading.get_ident()}
+        assert realm.realms['realm1'].sessions[session_.id] is session_
+
+    def test_unsharded(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.start()
+        session_ = establish(loop, Transport(), 'realm2')
+
+        assert session_.shard is None
+        assert session_.loop is loop
+
+    def test_publish(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.start()
+        subscriber, publisher = Transport(), Transport()
+        establish(loop, subscriber, 'realm1').receive('[32,1,{},"com.myapp.topic1"]')
+        establish(loop, publisher, 'realm1').receive('[16,2,{"acknowledge":true},"com.myapp.topic1",["x"]]')
+        wait_for(loop, lambda: len(subscriber.payloads) == 3 and len(publisher.payloads) == 2)
+
+        assert json.loads(subscriber.payloads[-1])[4] == ['x']
+        assert json.loads(publisher.payloads[-1])[0] == 17
+
+    def test_batch(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.start()
+        batched = serializer.get('wamp.2.json.batched')
+        transport = Transport()
+        session_ = session.Session(transport, batched, loop=loop)
+        session_.receive(batched.join(['[1,"realm1",{"roles":{"subscriber":{}}}]', '[32,1,{},"com.myapp.topic1"]']))
+        wait_for(loop, lambda: transport.payloads and '[33,1,' in ''.join(transport.payloads))
+
+        assert session_.shard is not None
+
+    def test_invalid_message(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.start()
+        transport = Transport()
+        establish(loop, transport, 'realm1').receive('[99]')
+        wait_for(loop, lambda: transport.closed)
+
+    def test_flow_control(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.start()
+        transport = Transport()
+        session_ = establish(loop, transport, 'realm1')
+        session_.pause_writing()
+        wait_for(loop, lambda: session_.paused)
+        session_.receive('[32,1,{},"com.myapp.topic1"]')
+        loop.run_until_complete(asyncio.sleep(0.02))
+        assert len(transport.payloads) == 1
+
+        session_.resume_writing()
+        wait_for(loop, lambda: len(transport.payloads) == 2)
+
+    def test_two_shards(self, loop, shards):
+        shard.assign(['realm1'])
+        shard.assign(['realm2'])
+        shard.start()
+        transports = [Transport() for _ in range(100)]
+        for index, transport in enumerate(transports):
+            session_ = session.Session(transport, serializer.JSON, loop=loop)
+            session_.receive(json.dumps([1, 'realm%d' % (index % 2 + 1), {'roles': {'subscriber': {}}}]))
+            session_.receive('[32,1,{},"com.myapp.topic%d"]' % index)
+        wait_for(loop, lambda: all(len(transport.payloads) == 2 for transport in transports))
+        exporter.render()
+
+        session_ids = [json.loads(transport.payloads[0])[1] for transport in transports]
+        subscription_ids = [json.loads(transport.payloads[1])[2] for transport in transports]
+        assert len(set(session_ids)) == len(transports)
+        assert len(set(subscription_ids)) == len(transports)
+        assert [name for name, _ in realm.items()] == ['realm1', 'realm2']
+        assert len(realm.sessions) == len(transports)
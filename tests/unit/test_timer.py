@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import asyncio
+import random
+
+from wouter.router import timer
+
+
+class TestTimerWheel:
+    def test_fires_on_expiry(self):
+        wheel = timer.TimerWheel(resolution=1, bits=2, levels=3)
+        fired = []
+        expiries = [random.randint(0, 63) for _ in range(200)]
+        for expires in expiries:
+            wheel.schedule(expires, lambda e: fired.append((e, wheel._tick - 1)), expires)
+        wheel.advance(100)
+
+        assert sorted(e for e, _ in fired) == sorted(expiries)
+        assert all(expires == tick for expires, tick in fired)
+        assert len(wheel) == 0
+
+    def test_cancel(self):
+        wheel = timer.TimerWheel(resolution=1, bits=2, levels=3)
+        fired = []
+        timers = [wheel.schedule(expires, fired.append, expires) for expires in range(0, 60, 3)]
+        for t in timers[::2]:
+            t.cancel()
+            t.cancel()
+
+        assert len(wheel) == len(timers) // 2
+        wheel.advance(100)
+        assert fired == [t.expires for t in timers[1::2]]
+        assert all(t.cancelled() for t in timers)
+
+    def test_scheduled_while_running(self):
+        wheel = timer.TimerWheel(resolution=1, bits=2, levels=3)
+        fired = []
+        expected = []
+        for now in range(100):
+            expires = now + random.randint(0, 60)
+            expected.append(expires)
+            wheel.schedule(expires, lambda e: fired.append((e, wheel._tick - 1)), expires)
+            wheel.advance(now)
+        wheel.advance(200)
+
+        assert sorted(e for e, _ in fired) == sorted(expected)
+        assert all(expires == tick for expires, tick in fired)
+
+    def test_clamped(self):
+        wheel = timer.TimerWheel(resolution=1, bits=2, levels=2)
+        fired = []
+        wheel.schedule(1000, fired.append, 1)
+        wheel.advance(15)
+
+        assert fired == [1]
+
+    def test_call_later(self):
+        loop = asyncio.new_event_loop()
+        try:
+            wheel = timer.TimerWheel(loop=loop)
+            fired = []
+            wheel.call_later(0.02, fired.append, 1)
+            wheel.call_later(0.01, fired.append, 2)
+            wheel.call_later(60, fired.append, 3).cancel()
+            loop.run_until_complete(asyncio.sleep(0.1))
+
+            assert fired == [2, 1]
+            assert wheel._handle is None
+        finally:
+            loop.close()
+
+    def test_callback_error(self):
+        wheel = timer.TimerWheel(resolution=1)
+        fired = []
+        wheel.schedule(0, lambda: 1 / 0)
+        wheel.schedule(0, fired.append, 1)
+        wheel.advance(0)
+
+        assert fired == [1]
+
+    def test_close(self):
+        wheel = timer.TimerWheel(resolution=1)
+        t = wheel.schedule(5, print)
+        wheel.close()
+
+        assert len(wheel) == 0
+        assert t.cancelled()
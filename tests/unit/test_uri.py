@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+import pytest
+
+from wouter.router import error
+from wouter.router import uri
+
+
+@pytest.mark.parametrize('value, loose, strict', [
+    ('com.myapp.topic1', True, True),
+    ('com.myapp.my_topic_1', True, True),
+    ('com.MyApp.Topic-1', True, False),
+    ('com.myapp', True, True),
+    ('com', True, True),
+    ('com..topic1', False, False),
+    ('.com', False, False),
+    ('com.', False, False),
+    ('com.my app', False, False),
+    ('com.myapp#1', False, False),
+    ('com.myapp\n', False, False),
+    ('', False, False),
+])
+def test_is_valid(value, loose, strict):
+    assert uri.is_valid(value, mode_=uri.LOOSE) is loose
+    assert uri.is_valid(value, mode_=uri.STRICT) is strict
+
+
+@pytest.mark.parametrize('value', ['com..topic1', '.myapp.topic1', 'com.myapp.', 'com.myapp.topic1'])
+def test_empty_components(value):
+    assert uri.is_valid(value, empty=True, mode_=uri.STRICT)
+
+
+def test_not_a_string():
+    assert not uri.is_valid(None)
+    assert not uri.is_valid(['com.myapp'])
+
+
+def test_check():
+    uri.check('com.myapp.topic1')
+
+    with pytest.raises(error.WampError) as e:
+        uri.check('com.my app')
+    assert e.value.error == error.INVALID_URI
+
+
+def test_mode(monkeypatch):
+    monkeypatch.setattr(uri, 'mode', uri.STRICT)
+
+    with pytest.raises(error.WampError):
+        uri.check('com.MyApp')
+
+
+def test_cached():
+    uri.is_valid('com.myapp.cached')
+    hits = uri._valid.cache_info().hits
+    uri.is_valid('com.myapp.cached')
+
+    assert uri._valid.cache_info().hits == hits + 1
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Load generator: concurrent client sessions issuing a mix of WAMP operations at target rates.
+
+Operations are started on schedule whether or not earlier ones have completed, so a slow router shows up as latency
+and errors rather than as a lower request rate.
+"""
+import asyncio
+import collections
+import time
+from typing import Any, Dict, List
+
+from wouter import client
+from wouter.monitor import metrics
+from wouter.router import serializer
+
+TOPIC = 'wouter.bench.topic'
+PROCEDURE = 'wouter.bench.echo'
+
+OPERATIONS = ('publish', 'subscribe', 'call', 'register')
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Stats:
+    """Outcomes and latencies of one kind of operation."""
+
+    def __init__(self):
+        self.issued = 0
+        self.completed = 0
+        self.errors = collections.Counter()  # type: Dict[str, int]
+        self.latencies = []  # type: List[float]
+        self.histogram = metrics.Histogram(LATENCY_BUCKETS)
+
+    def record(self, latency: float):
+        self.completed += 1
+        self.latencies.append(latency)
+        self.histogram.observe(latency)
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def at(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else None
+
+        return {
+            'issued': self.issued,
+            'completed': self.completed,
+            'errors': dict(self.errors),
+            'per_second': self.completed / duration,
+            'latency_ms': {
+                'p50': at(0.5),
+                'p90': at(0.9),
+                'p99': at(0.99),
+                'max': latencies[-1] * 1000 if latencies else None,
+            },
+            'histogram': {
+                'le_ms': [bound * 1000 for bound in self.histogram.bounds] + ['+Inf'],
+                'counts': self.histogram.counts,
+            },
+        }
+
+
+async def _connect(url: str, realm: str, serializer_: serializer.Serializer, count: int) -> List[client.Client]:
+    async def connect():
+        client_ = client.Client(serializer_)
+        await client_.connect(url, realm)
+        return client_
+
+    clients = []
+    for start in range(0, count, 100):
+        clients.extend(await asyncio.gather(*[connect() for _ in range(min(100, count - start))]))
+    return clients
+
+
+async def run(url: str,
+              realm: str = 'realm1',
+              serializer_: serializer.Serializer = serializer.JSON,
+              sessions: int = 10,
+              duration: float = 10.0,
+              rates: Dict[str, float] = None,
+              subscribers: int = None,
+              payload_size: int = 64,
+              grace: float = 5.0) -> Dict[str, Any]:
+    """
+    Generate load against a router and return what was achieved.
+
+    :param url: addresses the router, see wouter.client.
+    :param rates: is the target operations per second, summed over every session, of each of OPERATIONS.
+    :param subscribers: is the number of sessions subscribed to the topic published to, by default all of them.
+    :param grace: is how long to wait for operations still in flight once the duration has passed.
+    """
+    rates = {operation: rate for operation, rate in (rates or {}).items() if rate > 0}
+    loop = asyncio.get_event_loop()
+    clients = await _connect(url, realm, serializer_, sessions)
+    payload = 'x' * payload_size
+    events = 0
+
+    def on_event(event):
+        nonlocal events
+        events += 1
+
+    def echo(*args, **kwargs):
+        return list(args)
+
+    for client_ in clients[:sessions if subscribers is None else subscribers]:
+        await client_.subscribe(TOPIC, on_event)
+    if 'call' in rates:
+        for client_ in clients:
+            await client_.register(PROCEDURE, echo, invoke='roundrobin')
+
+    operations = {
+        'publish': lambda c, n: c.publish(TOPIC, [payload], acknowledge=True),
+        'subscribe': lambda c, n: c.subscribe('%s.%d' % (TOPIC, n), on_event),
+        'call': lambda c, n: c.call(PROCEDURE, [payload]),
+        'register': lambda c, n: c.register('%s.%d.%d' % (PROCEDURE, id(c), n), echo),
+    }
+    stats = {operation: Stats() for operation in rates}
+    pending = set()
+
+    async def measure(operation, client_, n):
+        started = time.perf_counter()
+        try:
+            await operations[operation](client_, n)
+        except client.ClientError as e:
+            stats[operation].errors[e.error] += 1
+        except asyncio.CancelledError:
+            stats[operation].errors['timeout'] += 1
+            raise
+        except Exception as e:
+            stats[operation].errors[type(e).__name__] += 1
+        else:
+            stats[operation].record(time.perf_counter() - started)
+
+    async def drive(operation, rate):
+        started = loop.time()
+        issued = 0
+        while True:
+            elapsed = loop.time() - started
+            if elapsed >= duration:
+                return
+            while issued < min(int(elapsed * rate) + 1, int(duration * rate)):
+                task = asyncio.ensure_future(measure(operation, clients[issued % len(clients)], issued))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                issued += 1
+                stats[operation].issued += 1
+            await asyncio.sleep(min(1 / rate, duration - elapsed))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[drive(operation, rate) for operation, rate in rates.items()])
+    if pending:
+        await asyncio.wait(list(pending), timeout=grace)
+    elapsed = time.perf_counter() - started
+    for task in list(pending):
+        task.cancel()
+    await asyncio.sleep(0)
+
+    await asyncio.gather(*[client_.close() for client_ in clients], return_exceptions=True)
+    return {
+        'url': url,
+        'serializer': serializer_.id,
+        'sessions': sessions,
+        'duration': elapsed,
+        'operations': {operation: stats[operation].summary(elapsed) for operation in stats},
+        'events_received': events,
+        'events_per_second': events / elapsed,
+    }
+
+
+def report(results: Dict[str, Any]) -> str:
+    """Format the results of a run as a table."""
+    title = '%d sessions on %s (%s) for %.1fs' % (
+        results['sessions'], results['url'], results['serializer'], results['duration'])
+    lines = [title,
+             '',
+             '{:<10} {:>9} {:>9} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9}'.format(
+                 'operation', 'issued', 'done', 'errors', 'per sec', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')]
+    for operation, summary in results['operations'].items():
+        latency = {k: '-' if v is None else '%.2f' % v for k, v in summary['latency_ms'].items()}
+        lines.append('{:<10} {:>9} {:>9} {:>8} {:>10.1f} {:>9} {:>9} {:>9} {:>9}'.format(
+            operation, summary['issued'], summary['completed'], sum(summary['errors'].values()),
+            summary['per_second'], latency['p50'], latency['p90'], latency['p99'], latency['max']))
+        for error, count in sorted(summary['errors'].items()):
+            lines.append('    %s: %d' % (error, count))
+    lines.append('')
+    lines.append('events received: %d (%.1f per second)' % (results['events_received'], results['events_per_second']))
+
+    for operation, summary in results['operations'].items():
+        lines.append('')
+        lines.append('%s latency histogram' % operation)
+        bounds, counts = summary['histogram']['le_ms'], summary['histogram']['counts']
+        used = [i for i, count in enumerate(counts) if count]
+        total = max(1, summary['completed'])
+        for i in range(used[0], used[-1] + 1) if used else ():
+            label = '<= %s ms' % bounds[i] if bounds[i] != '+Inf' else ' > %s ms' % bounds[-2]
+            lines.append('  {:>14} {:>9} {}'.format(label, counts[i], '#' * int(40 * counts[i] / total)))
+    return '\n'.join(lines)
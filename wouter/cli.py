@@ -17,19 +17,226 @@
 
 """Console script for wouter."""
 import asyncio
+import json
+import socket
 import sys
 
+import click
+
+from wouter import bench as bench_
+from wouter.monitor import exporter
+from wouter.router import auth
+from wouter.router import authorizer
+from wouter.router import broker
+from wouter.router import history
+from wouter.router import link
+from wouter.router import meta
+from wouter.router import queue
+from wouter.router import rawsocket
 from wouter.router import router
+from wouter.router import serializer
+from wouter.router import session
+from wouter.router import shard
+from wouter.router import uri
+from wouter.router import workers as workers_
+
+
+@click.group(invoke_without_command=True)
+@click.option('--host', default='localhost', show_default=True, help='Interface to listen on.')
+@click.option('--port', default=9001, show_default=True, help='WebSocket port.')
+@click.option('--rawsocket-port', type=int, help='Also accept RawSocket connections on this TCP port.')
+@click.option('--rawsocket-path', type=click.Path(), help='Also accept RawSocket connections on this Unix socket.')
+@click.option('--max-queue-messages', default=10000, show_default=True,
+              help='Most outbound messages queued for a slow client.')
+@click.option('--max-queue-bytes', default=16 * 1024 * 1024, show_default=True,
+              help='Most outbound bytes queued for a slow client.')
+@click.option('--slow-consumer-policy', type=click.Choice(queue.POLICIES), default=queue.ABORT, show_default=True,
+              help='What to do when the outbound queue of a client is full.')
+@click.option('--workers', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Worker processes sharing the ports and realms.')
+@click.option('--link-port', type=int, help='Accept links from the other routers of a cluster on this TCP port.')
+@click.option('--peer', 'peers', multiple=True, metavar='HOST:PORT',
+              help='Link to another router of the cluster; repeat for every other router.')
+@click.option('--link-secret', envvar='WOUTER_LINK_SECRET',
+              help='Secret shared by the routers of a cluster, authenticating their links; required with --link-port '
+                   'or --peer. Also read from WOUTER_LINK_SECRET.')
+@click.option('--link-max-length', default=link.MAX_LENGTH, show_default=True, type=click.IntRange(min=1),
+              help='Longest message accepted over a cluster link, in octets.')
+@click.option('--strict-uris', is_flag=True, help='Only accept URIs of lowercase letters, digits and underscores.')
+@click.option('--passthrough', is_flag=True,
+              help='Route publications and calls without decoding their application payload.')
+@click.option('--history', 'history_topics', multiple=True, metavar='[MATCH:]TOPIC',
+              help='Retain the events of a topic, or of a prefix or wildcard pattern, for late subscribers.')
+@click.option('--history-limit', default=100, show_default=True, type=click.IntRange(min=1),
+              help='Events retained per topic.')
+@click.option('--history-age', type=float, help='Seconds events are retained for; by default until replaced.')
+@click.option('--history-max-topics', default=1000, show_default=True, type=click.IntRange(min=1),
+              help='Topics retained per realm, evicting the least recently published.')
+@click.option('--shard', 'shards', multiple=True, metavar='REALM[,REALM...]',
+              help='Serve a group of realms on an event loop of its own thread.')
+@click.option('--auth-method', 'auth_methods', multiple=True, type=click.Choice(auth.METHODS),
+              help='Accept an authentication method, in order of preference; repeat for each. By default every '
+                   'session is anonymous.')
+@click.option('--users', 'users_path', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file of the credentials of each authid: {"AUTHID": {"role": ..., "secret": ..., "salt": ..., '
+                   '"iterations": ..., "keylen": ...}}, salt and after optional.')
+@click.option('--auth-threads', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Threads deriving keys of salted credentials.')
+@click.option('--auth-cache-size', default=10000, show_default=True, type=click.IntRange(min=0),
+              help='Keys of recently verified credentials cached.')
+@click.option('--permission', 'permissions', multiple=True, metavar='ROLE:[MATCH:]URI:ACTION[,ACTION...]',
+              help='Allow a role to subscribe, publish, register or call on a URI, or on a prefix or wildcard pattern. '
+                   'With permissions or an authorizer, actions not allowed are denied.')
+@click.option('--authorizer', 'authorizer_procedure', metavar='PROCEDURE',
+              help='Procedure deciding on actions no permission allows, called with the session details, the URI and '
+                   'the action.')
+@click.option('--authorizer-cache-size', default=10000, show_default=True, type=click.IntRange(min=1),
+              help='Authorization decisions cached per realm.')
+@click.option('--authorizer-ttl', default=60.0, show_default=True, type=click.FloatRange(min=0),
+              help='Seconds authorization decisions are cached for.')
+@click.option('--meta-events', is_flag=True,
+              help='Publish the WAMP meta events of sessions, subscriptions and registrations to their subscribers.')
+@click.option('--monitor-port', type=int,
+              help='Serve Prometheus metrics over HTTP on this port; worker N serves them on the port plus N.')
+@click.pass_context
+def main(ctx, host, port, rawsocket_port, rawsocket_path, max_queue_messages, max_queue_bytes, slow_consumer_policy,
+         workers, link_port, peers, link_secret, link_max_length, strict_uris, passthrough, history_topics,
+         history_limit, history_age, history_max_topics, shards, auth_methods, users_path, auth_threads,
+         auth_cache_size, permissions, authorizer_procedure, authorizer_cache_size, authorizer_ttl, meta_events,
+         monitor_port):
+    """Console script for wouter: runs the router unless a command is given."""
+    if ctx.invoked_subcommand is not None:
+        return 0
+
+    if workers > 1 and (link_port is not None or peers):
+        raise click.UsageError('--workers cannot be combined with cluster links')
+    if shards and (workers > 1 or link_port is not None or peers):
+        raise click.UsageError('--shard cannot be combined with --workers or cluster links')
+    addresses = []
+    for peer in peers:
+        peer_host, _, peer_port = peer.rpartition(':')
+        if not peer_host or not peer_port.isdigit():
+            raise click.BadParameter('expected HOST:PORT, got %r' % peer, param_hint='--peer')
+        addresses.append((peer_host, int(peer_port)))
+    if (link_port is not None or peers) and not link_secret:
+        raise click.UsageError('--link-port and --peer require --link-secret')
+
+    if strict_uris:
+        uri.mode = uri.STRICT
+    for topic in history_topics:
+        match, sep, pattern = topic.partition(':')
+        if not sep or match not in (broker.MATCH_EXACT, broker.MATCH_PREFIX, broker.MATCH_WILDCARD):
+            match, pattern = broker.MATCH_EXACT, topic
+        if not uri.is_valid(pattern, empty=match == broker.MATCH_WILDCARD):
+            raise click.BadParameter('invalid topic %r' % pattern, param_hint='--history')
+        history.topics.append((pattern, match))
+    history.options.update(limit=history_limit, max_age=history_age, max_topics=history_max_topics)
+    for group in shards:
+        realms = [name.strip() for name in group.split(',')]
+        invalid = [name for name in realms if not uri.is_valid(name)]
+        if invalid:
+            raise click.BadParameter('invalid realm %r' % invalid[0], param_hint='--shard')
+        try:
+            shard.assign(realms)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--shard')
+    if users_path is not None:
+        try:
+            with open(users_path) as f:
+                auth.users.update((authid, auth.User(**credentials)) for authid, credentials in json.load(f).items())
+        except (ValueError, TypeError, AttributeError) as e:
+            raise click.BadParameter('invalid users file: %s' % e, param_hint='--users')
+    if any(method != auth.ANONYMOUS for method in auth_methods) and not auth.users:
+        raise click.UsageError('--auth-method %s and %s require --users' % (auth.WAMPCRA, auth.TICKET))
+    auth.methods.extend(auth_methods)
+    auth.options.update(threads=auth_threads, cache_size=auth_cache_size)
+    for permission in permissions:
+        role, _, rest = permission.partition(':')
+        pattern, _, actions = rest.rpartition(':')
+        match, sep, uri_ = pattern.partition(':')
+        if not sep or match not in (broker.MATCH_EXACT, broker.MATCH_PREFIX, broker.MATCH_WILDCARD):
+            match, uri_ = broker.MATCH_EXACT, pattern
+        actions = actions.split(',')
+        if not role or not uri.is_valid(uri_, empty=match == broker.MATCH_WILDCARD):
+            raise click.BadParameter('invalid permission %r' % permission, param_hint='--permission')
+        if not set(actions).issubset(authorizer.ACTIONS):
+            raise click.BadParameter('invalid actions in %r, expected %s' % (permission, ', '.join(authorizer.ACTIONS)),
+                                     param_hint='--permission')
+        authorizer.permissions.append(authorizer.Permission(role, uri_, actions, match))
+    if authorizer_procedure is not None and not uri.is_valid(authorizer_procedure):
+        raise click.BadParameter('invalid procedure %r' % authorizer_procedure, param_hint='--authorizer')
+    authorizer.procedure = authorizer_procedure
+    authorizer.options.update(cache_size=authorizer_cache_size, ttl=authorizer_ttl)
+    meta.events = meta_events
+    session.passthrough = passthrough
+    session.queue_options.update(max_messages=max_queue_messages,
+                                 max_bytes=max_queue_bytes,
+                                 policy=slow_consumer_policy)
 
+    reuse_port = workers > 1
+    unix_socket = None
+    if rawsocket_path is not None and reuse_port:
+        # Unix sockets cannot share a path, so the workers share one listening socket instead.
+        unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix_socket.bind(rawsocket_path)
 
-def main(args=None):
-    """Console script for wouter."""
+    async def serve(index=0):
+        await router.start_router(host, port, reuse_port=reuse_port)
+        if rawsocket_port is not None:
+            await rawsocket.start_rawsocket(host, rawsocket_port, reuse_port=reuse_port)
+        if rawsocket_path is not None:
+            await rawsocket.start_rawsocket_unix(None if unix_socket else rawsocket_path, sock=unix_socket)
+        if link_port is not None:
+            await link.start_link(host, link_port, link_secret.encode('utf-8'), link_max_length)
+        for peer_host, peer_port in addresses:
+            asyncio.ensure_future(link.keep_link(peer_host, peer_port, secret=link_secret.encode('utf-8'),
+                                                 max_length=link_max_length))
+        if monitor_port is not None:
+            await exporter.start_monitor(host, monitor_port + index)
+
+    if reuse_port:
+        return workers_.spawn(workers, serve)
+
+    loop = asyncio.get_event_loop()
+    shard.start()
+    loop.run_until_complete(serve())
+    loop.run_forever()
+
+    return 0
 
-    # TODO(lam) if enabled, start monitor too.
 
-    asyncio.get_event_loop().run_until_complete(router.start_router)
-    asyncio.get_event_loop().run_forever()
+@main.command()
+@click.option('--url', default='ws://localhost:9001', show_default=True,
+              help='Router to load: ws://HOST:PORT, rs://HOST:PORT for RawSocket or unix:///PATH.')
+@click.option('--realm', default='realm1', show_default=True)
+@click.option('--serializer', 'serializer_id', type=click.Choice(['json', 'msgpack', 'cbor']), default='json',
+              show_default=True)
+@click.option('--sessions', default=10, show_default=True, type=click.IntRange(min=1),
+              help='Concurrent client sessions.')
+@click.option('--duration', default=10.0, show_default=True, help='Seconds to generate load for.')
+@click.option('--publish-rate', default=100.0, show_default=True, help='Acknowledged publications per second.')
+@click.option('--call-rate', default=100.0, show_default=True, help='Calls per second.')
+@click.option('--subscribe-rate', default=0.0, show_default=True, help='Subscriptions to new topics per second.')
+@click.option('--register-rate', default=0.0, show_default=True, help='Registrations of new procedures per second.')
+@click.option('--subscribers', type=int, help='Sessions subscribed to the published topic; all by default.')
+@click.option('--payload-size', default=64, show_default=True, help='Characters of each event and call argument.')
+@click.option('--json', 'json_path', type=click.Path(), help='Also write the results to this file as JSON.')
+def bench(url, realm, serializer_id, sessions, duration, publish_rate, call_rate, subscribe_rate, register_rate,
+          subscribers, payload_size, json_path):
+    """Generate load against a running router."""
+    results = asyncio.get_event_loop().run_until_complete(bench_.run(
+        url, realm,
+        serializer_=serializer.get('wamp.2.' + serializer_id),
+        sessions=sessions,
+        duration=duration,
+        rates={'publish': publish_rate, 'call': call_rate, 'subscribe': subscribe_rate, 'register': register_rate},
+        subscribers=subscribers,
+        payload_size=payload_size))
 
+    click.echo(bench_.report(results))
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
     return 0
 
 
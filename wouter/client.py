@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Minimal asyncio WAMP client, for benchmarks and load generation.
+
+It speaks the basic profile over WebSocket or RawSocket: subscribe, publish, register and call, with handlers for
+events and invocations run on the client's event loop. Routers are addressed by URL:
+    ws://host:port              WebSocket
+    rs://host:port              RawSocket over TCP
+    unix:///path/to/socket      RawSocket over a Unix domain socket
+"""
+import asyncio
+import itertools
+import struct
+import urllib.parse
+from typing import Any, Callable, Dict, Optional, Tuple  # noqa: F401
+
+import websockets
+
+from wouter.router import message
+from wouter.router import rawsocket
+from wouter.router import serializer
+
+ROLES = {'publisher': {}, 'subscriber': {}, 'caller': {}, 'callee': {}}
+
+
+class ClientError(Exception):
+    """An ERROR answer to a request of the client."""
+
+    def __init__(self, error: str, args: list = None, kwargs: dict = None):
+        super().__init__(error, args, kwargs)
+        self.error = error
+        self.args_ = args
+        self.kwargs = kwargs
+
+
+class RawSocketConnection:
+    """Client end of a RawSocket connection, with the send, recv and close coroutines of a websocket."""
+    _header = struct.Struct('>I')
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 serializer_: serializer.Serializer):
+        self.reader = reader
+        self.writer = writer
+        self.serializer = serializer_
+
+    @classmethod
+    async def open(cls, serializer_: serializer.Serializer, host: str = None, port: int = None, path: str = None,
+                   max_length_exponent: int = 15) -> 'RawSocketConnection':
+        """
+        Connect to a RawSocket listener on a TCP port, or a Unix domain socket if path is given, and handshake.
+
+        :raises ConnectionError: if the router refuses the handshake.
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+
+        code = next(c for c, s in rawsocket.serializers.items() if s is serializer_)
+        writer.write(bytes((rawsocket.MAGIC, max_length_exponent << 4 | code, 0, 0)))
+        reply = await reader.readexactly(4)
+        if reply[0] != rawsocket.MAGIC or reply[1] & 0x0f != code:
+            writer.close()
+            raise ConnectionError('rawsocket handshake refused with error %d' % (reply[1] >> 4))
+        return cls(reader, writer, serializer_)
+
+    async def send(self, payload: serializer.Payload):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.writer.write(self._header.pack(rawsocket.FRAME_MESSAGE << 24 | len(payload)) + payload)
+        await self.writer.drain()
+
+    async def recv(self) -> serializer.Payload:
+        """
+        Return the next message, answering pings on the way.
+
+        :raises ConnectionError: once the connection is closed.
+        """
+        while True:
+            try:
+                header, = self._header.unpack(await self.reader.readexactly(4))
+                payload = await self.reader.readexactly(header & 0xffffff)
+            except asyncio.IncompleteReadError:
+                raise ConnectionError('connection closed')
+
+            frame_type = header >> 24
+            if frame_type == rawsocket.FRAME_MESSAGE:
+                return payload if self.serializer.binary else payload.decode('utf-8')
+            if frame_type == rawsocket.FRAME_PING:
+                self.writer.write(self._header.pack(rawsocket.FRAME_PONG << 24 | len(payload)) + payload)
+
+    async def close(self):
+        self.writer.close()
+
+
+async def open_connection(url: str, serializer_: serializer.Serializer):
+    """Open a WebSocket or RawSocket connection to the router at a URL."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme in ('ws', 'wss'):
+        return await websockets.connect(url, subprotocols=[serializer_.subprotocol], max_size=None)
+    if parts.scheme == 'rs':
+        return await RawSocketConnection.open(serializer_, parts.hostname, parts.port)
+    if parts.scheme == 'unix':
+        return await RawSocketConnection.open(serializer_, path=parts.path)
+    raise ValueError('Unsupported router URL %r' % url)
+
+
+class Client:
+    def __init__(self, serializer_: serializer.Serializer = serializer.JSON):
+        self.serializer = serializer_
+        self.connection = None
+        self.session_id = None  # type: Optional[int]
+        self._request_ids = itertools.count(1)
+        self._requests = {}  # type: Dict[int, asyncio.Future]
+        self._subscriptions = {}  # type: Dict[int, Callable[[message.Event], Any]]
+        self._registrations = {}  # type: Dict[int, Callable[..., Any]]
+        self._welcome = None  # type: Optional[asyncio.Future]
+        self._reader = None  # type: Optional[asyncio.Task]
+
+    async def connect(self, url: str, realm: str):
+        """Connect to the router at a URL and join a realm."""
+        self.connection = await open_connection(url, self.serializer)
+        self._welcome = asyncio.get_event_loop().create_future()
+        self._reader = asyncio.ensure_future(self._read())
+        await self.send(message.Hello(realm=realm, details={'roles': ROLES}))
+        self.session_id = await self._welcome
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.connection.close()
+
+    async def send(self, msg: message.Message):
+        await self.connection.send(self.serializer.serialize(msg.marshal()))
+
+    def _request(self) -> Tuple[int, asyncio.Future]:
+        request_id = next(self._request_ids)
+        future = self._requests[request_id] = asyncio.get_event_loop().create_future()
+        return request_id, future
+
+    async def subscribe(self, topic: str, handler: Callable[[message.Event], Any], match: str = None) -> int:
+        """Subscribe to a topic; handler receives each Event. Return the subscription id."""
+        request_id, future = self._request()
+        options = {'match': match} if match else {}
+        await self.send(message.Subscribe(request_id=request_id, options=options, topic=topic))
+        subscription_id = (await future).subscription_id
+        self._subscriptions[subscription_id] = handler
+        return subscription_id
+
+    async def publish(self, topic: str, args: list = None, kwargs: dict = None, acknowledge: bool = False,
+                      exclude_me: bool = True):
+        """Publish an event, waiting for the router to acknowledge it if requested."""
+        options = {}
+        if acknowledge:
+            options['acknowledge'] = True
+        if not exclude_me:
+            options['exclude_me'] = False
+        if acknowledge:
+            request_id, future = self._request()
+        else:
+            request_id, future = next(self._request_ids), None
+        await self.send(message.Publish(request_id=request_id, options=options, topic=topic, args=args, kwargs=kwargs))
+        if future is not None:
+            await future
+
+    async def register(self, procedure: str, handler: Callable[..., Any], invoke: str = None) -> int:
+        """
+        Register a procedure. Return the registration id.
+
+        :param handler: is called with the positional and keyword arguments of each call and returns the positional
+            result list, or a coroutine resolving to it.
+        """
+        request_id, future = self._request()
+        options = {'invoke': invoke} if invoke else {}
+        await self.send(message.Register(request_id=request_id, options=options, procedure=procedure))
+        registration_id = (await future).registration_id
+        self._registrations[registration_id] = handler
+        return registration_id
+
+    async def call(self, procedure: str, args: list = None, kwargs: dict = None, timeout: int = None) -> message.Result:
+        """
+        Call a procedure and return its Result.
+
+        :param timeout: asks the router to cancel the call after this many milliseconds.
+        :raises ClientError: if the call fails.
+        """
+        request_id, future = self._request()
+        options = {'timeout': timeout} if timeout else {}
+        await self.send(message.Call(request_id=request_id, options=options, procedure=procedure, args=args,
+                                     kwargs=kwargs))
+        return await future
+
+    async def _read(self):
+        try:
+            while True:
+                payload = await self.connection.recv()
+                self._receive(message.decode(self.serializer.unserialize(payload)))
+        except (websockets.ConnectionClosed, ConnectionError):
+            pass
+        finally:
+            for future in self._requests.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('connection closed'))
+            if not self._welcome.done():
+                self._welcome.set_exception(ConnectionError('connection closed'))
+
+    def _receive(self, msg: message.Message):
+        if msg.type is message.Type.EVENT:
+            handler = self._subscriptions.get(msg.subscription_id)
+            if handler is not None:
+                handler(msg)
+        elif msg.type is message.Type.INVOCATION:
+            asyncio.ensure_future(self._invoke(msg))
+        elif msg.type is message.Type.WELCOME:
+            self._welcome.set_result(msg.session)
+        elif msg.type is message.Type.ABORT:
+            if not self._welcome.done():
+                self._welcome.set_exception(ClientError(msg.reason))
+            else:
+                # The router ended the session; closing the connection fails the requests in flight.
+                asyncio.ensure_future(self.connection.close())
+        elif msg.type is message.Type.ERROR:
+            future = self._requests.pop(msg.request_id, None)
+            if future is not None:
+                future.set_exception(ClientError(msg.error, msg.args, msg.kwargs))
+        else:
+            future = self._requests.pop(msg.request_id, None)
+            if future is not None:
+                future.set_result(msg)
+
+    async def _invoke(self, invocation: message.Invocation):
+        handler = self._registrations[invocation.registration_id]
+        try:
+            result = handler(*(invocation.args or ()), **(invocation.kwargs or {}))
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            await self.send(message.Error(request_type=message.Type.INVOCATION,
+                                          request_id=invocation.request_id,
+                                          details={},
+                                          error='wamp.error.runtime_error',
+                                          args=[str(e)]))
+        else:
+            await self.send(message.Yield(request_id=invocation.request_id, options={}, args=result))
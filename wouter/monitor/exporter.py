@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Metrics endpoint in the Prometheus text exposition format.
+"""
+import asyncio
+from typing import List
+
+from wouter.monitor import metrics
+from wouter.router import realm
+from wouter.router import router
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _metric(lines: List[str], name: str, kind: str, help_: str):
+    lines.append('# HELP %s %s' % (name, help_))
+    lines.append('# TYPE %s %s' % (name, kind))
+
+
+def _label(value: str) -> str:
+    """Escape a label value as the exposition format requires."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _bound(value: float) -> str:
+    return repr(float(value))
+
+
+def render() -> str:
+    """Return the current value of every metric."""
+    lines = []  # type: List[str]
+
+    _metric(lines, 'wouter_messages_received_total', 'counter', 'WAMP messages received, by type.')
+    for cls, histogram in sorted(metrics.routing.snapshot(), key=lambda item: item[0].type.value):
+        lines.append('wouter_messages_received_total{type="%s"} %d' % (cls.type.name, histogram.count))
+
+    _metric(lines, 'wouter_messages_sent_total', 'counter', 'WAMP messages sent, by type.')
+    for cls, count in sorted(metrics.sent.snapshot(), key=lambda item: item[0].type.value):
+        lines.append('wouter_messages_sent_total{type="%s"} %d' % (cls.type.name, count))
+
+    _metric(lines, 'wouter_bytes_received_total', 'counter', 'Payload octets received.')
+    lines.append('wouter_bytes_received_total %d' % metrics.counters.bytes_received)
+    _metric(lines, 'wouter_bytes_sent_total', 'counter', 'Payload octets sent.')
+    lines.append('wouter_bytes_sent_total %d' % metrics.counters.bytes_sent)
+
+    _metric(lines, 'wouter_sessions', 'gauge', 'Sessions of open connections.')
+    lines.append('wouter_sessions %d' % len(router.sessions))
+    _metric(lines, 'wouter_connections', 'gauge', 'Open WebSocket and RawSocket connections.')
+    lines.append('wouter_connections %d' % len(router.connections))
+
+    _metric(lines, 'wouter_subscriptions', 'gauge', 'Subscriptions, by realm.')
+    realms = realm.items()
+    for name, realm_ in realms:
+        lines.append('wouter_subscriptions{realm="%s"} %d' % (_label(name), len(realm_.broker.subscriptions)))
+    _metric(lines, 'wouter_registrations', 'gauge', 'Registrations, by realm.')
+    for name, realm_ in realms:
+        lines.append('wouter_registrations{realm="%s"} %d' % (_label(name), len(realm_.dealer.registrations)))
+
+    _metric(lines, 'wouter_routing_seconds', 'histogram', 'Time taken to route a received message, by type.')
+    for cls, histogram in sorted(metrics.routing.snapshot(), key=lambda item: item[0].type.value):
+        name = cls.type.name
+        counts = histogram.cumulative()
+        for bound, count in zip(histogram.bounds, counts):
+            lines.append('wouter_routing_seconds_bucket{type="%s",le="%s"} %d' % (name, _bound(bound), count))
+        lines.append('wouter_routing_seconds_bucket{type="%s",le="+Inf"} %d' % (name, counts[-1]))
+        lines.append('wouter_routing_seconds_sum{type="%s"} %r' % (name, histogram.sum))
+        lines.append('wouter_routing_seconds_count{type="%s"} %d' % (name, counts[-1]))
+
+    return '\n'.join(lines) + '\n'
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+
+        parts = request.split()
+        if len(parts) >= 2 and parts[0] == b'GET' and parts[1] in (b'/', b'/metrics'):
+            status, body = '200 OK', render().encode('utf-8')
+        else:
+            status, body = '404 Not Found', b''
+        writer.write(('HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n' %
+                      (status, CONTENT_TYPE, len(body))).encode('ascii') + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def start_monitor(host: str = 'localhost', port: int = 9100):
+    """Return a coroutine that starts serving the metrics endpoint over HTTP."""
+    return asyncio.start_server(_handle, host, port)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Router metrics.
+
+The router updates these on its hot path with plain increments on module-level objects: counts are keyed by message
+class rather than message type, and histogram buckets are cumulated, only when the exporter renders a scrape.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence  # noqa: F401
+
+# Upper bounds, in seconds, of the routing latency buckets.
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+
+class Histogram:
+    """Observations counted in fixed buckets; the last bucket counts those above every bound."""
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # type: List[int]
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative(self) -> List[int]:
+        """Return the count of observations up to each bound, and of all of them last."""
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class Counters:
+    """
+    Octets received and sent by sessions. Payloads of text serializers are counted in characters.
+    """
+    __slots__ = ('bytes_received', 'bytes_sent')
+
+    def __init__(self):
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+
+class Registry(dict):
+    """
+    A dict that creates missing values, like a defaultdict, under the metrics lock.
+
+    The threads of every shard add keys, so the exporter copies the items under the same lock to iterate over them.
+    Updates of existing values are plain increments.
+    """
+
+    def __init__(self, factory: Callable):
+        super().__init__()
+        self.factory = factory
+
+    def __missing__(self, key):
+        with lock:
+            return self.setdefault(key, self.factory())
+
+    def snapshot(self) -> list:
+        """Return the items."""
+        with lock:
+            return list(self.items())
+
+
+lock = threading.Lock()
+
+counters = Counters()
+
+# Time taken to route each message received, by message class. The count of each histogram is the number of messages
+# of that class received.
+routing = Registry(Histogram)  # type: Dict[type, Histogram]
+
+# Messages sent, by message class.
+sent = Registry(int)  # type: Dict[type, int]
+
+
+def reset():
+    """Forget every observation."""
+    counters.__init__()
+    with lock:
+        routing.clear()
+        sent.clear()
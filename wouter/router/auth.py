@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Session authentication with WAMP-CRA and tickets (WAMP advanced profile, section 14.5).
+
+When authentication methods are enabled, a HELLO announcing one of them is answered with a CHALLENGE, and the session
+is only established once the AUTHENTICATE reply of the client verifies against the credentials of its authid.
+
+With a salt, credentials go through PBKDF2 key derivation, which is slow by design. Derivation runs on a thread pool,
+so a storm of reconnecting clients queues there rather than stalling the event loop, and the keys of credentials that
+verified recently are cached: a client reconnecting with the same credentials costs one HMAC or comparison.
+"""
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple  # noqa: F401
+
+from wouter.router import error
+
+ANONYMOUS = 'anonymous'
+TICKET = 'ticket'
+WAMPCRA = 'wampcra'
+METHODS = (WAMPCRA, TICKET, ANONYMOUS)
+
+# The message of every failed authentication, whatever the cause.
+FAILED = 'authentication failed'
+
+# Authentication methods accepted, in order of preference, the credentials of each authid and the keyword arguments of
+# the Authenticator. Set from the command line; without methods every session is anonymous.
+methods = []  # type: List[str]
+users = {}  # type: Dict[str, User]
+options = {}  # type: Dict[str, Any]
+
+_authenticator = None  # type: Optional[Authenticator]
+
+
+class User:
+    """The credentials of an authid."""
+    __slots__ = ('role', 'secret', 'salt', 'iterations', 'keylen')
+
+    def __init__(self, role: str, secret: str, salt: str = None, iterations: int = 1000, keylen: int = 32):
+        """
+        :param role: is the authrole of the sessions authenticated as the user.
+        :param secret: is the secret WAMP-CRA challenges are signed with, or the ticket. With a salt, a WAMP-CRA client
+            signs with the key derived from the secret, and a ticket is stored as the key derived from it, so the
+            router does not hold it in the clear.
+        :param salt: selects PBKDF2 key derivation with this salt.
+        :param iterations: is the number of PBKDF2 iterations.
+        :param keylen: is the length of the derived key in bytes.
+        """
+        self.role = role
+        self.secret = secret
+        self.salt = salt
+        self.iterations = iterations
+        self.keylen = keylen
+
+
+class Attempt:
+    """An authentication in progress: the challenge sent to a session and the user it must prove to be."""
+    __slots__ = ('realm', 'authid', 'authmethod', 'user', 'challenge')
+
+    def __init__(self, realm: str, authid: str, authmethod: str, user: User, challenge: str = None):
+        self.realm = realm
+        self.authid = authid
+        self.authmethod = authmethod
+        self.user = user
+        self.challenge = challenge
+
+    def extra(self) -> dict:
+        """Return the extra details of the CHALLENGE message."""
+        if self.authmethod != WAMPCRA:
+            return {}
+        extra = {'challenge': self.challenge}  # type: Dict[str, Any]
+        if self.user.salt is not None:
+            extra.update(salt=self.user.salt, iterations=self.user.iterations, keylen=self.user.keylen)
+        return extra
+
+
+def derive_key(secret: str, salt: str, iterations: int = 1000, keylen: int = 32) -> bytes:
+    """Derive a key from a secret with PBKDF2-HMAC-SHA256, base64 encoded as WAMP-CRA clients do."""
+    return base64.b64encode(hashlib.pbkdf2_hmac('sha256', secret.encode(), salt.encode(), iterations, keylen))
+
+
+def sign(key: bytes, challenge: str) -> str:
+    """Sign a WAMP-CRA challenge with HMAC-SHA256, base64 encoded."""
+    return base64.b64encode(hmac.new(key, challenge.encode(), hashlib.sha256).digest()).decode('ascii')
+
+
+def challenge(session_id: int, realm: str, details: dict) -> Optional[Attempt]:
+    """
+    Start authenticating a session from the details of its HELLO.
+
+    :return: the attempt to challenge the session with, or None if the session is anonymous.
+    :raises error.WampError: if the session announces no accepted method or invalid methods, or an unknown authid.
+    """
+    announced = details.get('authmethods') or [ANONYMOUS]
+    if type(announced) is not list or not all(type(method) is str for method in announced):
+        raise error.WampError(error.NO_AUTH_METHOD, 'invalid authentication methods %r' % (announced,))
+    authmethod = next((method for method in methods if method in announced), None)
+    if authmethod is None:
+        raise error.WampError(error.NO_AUTH_METHOD, 'no accepted authentication method in %r' % (announced,))
+    if authmethod == ANONYMOUS:
+        return None
+
+    authid = details.get('authid')
+    user = users.get(authid) if type(authid) is str else None
+    if user is None:
+        # Answered like a wrong secret, so the reply does not tell which authids exist.
+        raise error.WampError(error.AUTHENTICATION_FAILED, FAILED)
+
+    attempt = Attempt(realm, authid, authmethod, user)
+    if authmethod == WAMPCRA:
+        attempt.challenge = json.dumps({
+            'authid': authid,
+            'authrole': user.role,
+            'authmethod': WAMPCRA,
+            'authprovider': 'static',
+            'nonce': base64.b64encode(os.urandom(16)).decode('ascii'),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'session': session_id,
+        })
+    return attempt
+
+
+class Authenticator:
+    """
+    Verifies AUTHENTICATE replies, deriving keys on a thread pool.
+
+    Derived keys of credentials that verified are kept in an LRU cache of cache_size entries, keyed by a digest of the
+    credential rather than the credential itself. Failed attempts never enter the cache, so guessing cannot evict the
+    keys of legitimate clients. The cache is shared by the loops of every shard.
+    """
+
+    def __init__(self, threads: int = 4, cache_size: int = 10000):
+        """
+        :param threads: is the number of threads deriving keys.
+        :param cache_size: is the number of derived keys cached.
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+        self.cache_size = cache_size
+        self._keys = collections.OrderedDict()  # type: Dict[Tuple[str, int, int, bytes], bytes]
+        self._lock = threading.Lock()
+
+    async def verify(self, loop: asyncio.AbstractEventLoop, attempt: Attempt, signature: str) -> bool:
+        """Return whether the signature of an AUTHENTICATE message answers the challenge of an attempt."""
+        user = attempt.user
+        # WAMP-CRA signs with the key of the secret of the user, ticket authentication presents the ticket itself.
+        secret = user.secret if attempt.authmethod == WAMPCRA else signature
+
+        derived = None
+        if user.salt is None:
+            key = secret.encode()
+        else:
+            derived = (user.salt, user.iterations, user.keylen, hashlib.sha256(secret.encode()).digest())
+            with self._lock:
+                key = self._keys.get(derived)
+                if key is not None:
+                    self._keys.move_to_end(derived)
+                    derived = None
+            if key is None:
+                key = await loop.run_in_executor(
+                    self.executor, derive_key, secret, user.salt, user.iterations, user.keylen)
+
+        if attempt.authmethod == WAMPCRA:
+            verified = hmac.compare_digest(sign(key, attempt.challenge).encode(), signature.encode())
+        else:
+            verified = hmac.compare_digest(key, user.secret.encode())
+
+        if verified and derived is not None:
+            with self._lock:
+                self._keys[derived] = key
+                if len(self._keys) > self.cache_size:
+                    self._keys.popitem(last=False)
+        return verified
+
+    def __len__(self):
+        return len(self._keys)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def get() -> Authenticator:
+    """Return the authenticator of the router, created on first use."""
+    global _authenticator
+    if _authenticator is None:
+        _authenticator = Authenticator(**options)
+    return _authenticator
+
+
+def reset():
+    """Shut the authenticator down and forget the configured methods and users."""
+    global _authenticator
+    if _authenticator is not None:
+        _authenticator.shutdown()
+        _authenticator = None
+    methods.clear()
+    users.clear()
+    options.clear()
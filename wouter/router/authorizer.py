@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Authorization of the actions of sessions on the URIs of a realm, by authrole.
+
+Static permissions grant a role actions on a topic or procedure, or on a prefix or wildcard pattern of them, and are
+matched with the tries the broker matches subscriptions with. An action no permission grants is referred to the
+dynamic authorizer procedure if one is configured, and denied otherwise. The dynamic authorizer is called like any
+procedure of the realm, with the details of the session, the URI and the action, and answers true to allow.
+
+Decisions are cached by (authrole, URI, action) in an LRU cache whose entries expire after a time to live, so
+authorizing the publications of a busy topic costs one dict lookup. Changing the permissions clears the cache. A
+dynamic authorization that fails or times out is denied without being cached, so the next request asks again.
+"""
+import asyncio
+import collections
+import itertools
+import logging
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union  # noqa: F401
+
+from wouter.router import broker
+from wouter.router import error
+from wouter.router import message
+from wouter.router import serializer
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBE = 'subscribe'
+PUBLISH = 'publish'
+REGISTER = 'register'
+CALL = 'call'
+ACTIONS = (SUBSCRIBE, PUBLISH, REGISTER, CALL)
+
+# Static permissions, the URI of the dynamic authorizer procedure and the keyword arguments of the Authorizer of each
+# realm. Set from the command line; without permissions or procedure every action is allowed.
+permissions = []  # type: List[Permission]
+procedure = None  # type: Optional[str]
+options = {}  # type: Dict[str, Any]
+
+
+class Permission:
+    """Actions granted to a role on a URI or URI pattern."""
+    __slots__ = ('role', 'uri', 'match', 'actions')
+
+    def __init__(self, role: str, uri: str, actions: Iterable[str], match: str = broker.MATCH_EXACT):
+        self.role = role
+        self.uri = uri
+        self.match = match
+        self.actions = frozenset(actions)
+
+
+class _Decision:
+    """
+    The caller of a dynamic authorizer call, which the dealer answers with a RESULT or an ERROR.
+
+    Requests for the same decision made while the call is in flight share its future, which is set to the decision, or
+    to None if the call failed or timed out. Both deny, but only a decision is cached.
+    """
+    peer = False
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+    def send(self, msg: message.Message):
+        if self.future.done():
+            return
+        if type(msg) is message.Result:
+            args, _ = serializer.decode_payload(msg.args, None)
+            self.future.set_result(bool(args) and args[0] is True)
+        else:
+            logger.warning('authorizer failed: %s', getattr(msg, 'error', msg))
+            self.future.set_result(None)
+
+
+class Authorizer:
+    """
+    The permissions of the roles of a realm, and the decisions made with them.
+
+    A role with several permissions matching a URI is granted the actions of all of them.
+    """
+
+    def __init__(self,
+                 dealer_,
+                 permissions_: Iterable[Permission] = (),
+                 procedure_: str = None,
+                 cache_size: int = 10000,
+                 ttl: float = 60.0,
+                 timeout: float = 5.0):
+        """
+        :param dealer_: is the dealer of the realm, which routes calls to the dynamic authorizer.
+        :param permissions_: are the static permissions.
+        :param procedure_: is the URI of the dynamic authorizer procedure, if any.
+        :param cache_size: is the number of decisions cached.
+        :param ttl: is the number of seconds a decision is cached for.
+        :param timeout: is the number of seconds after which an unanswered dynamic authorization is denied.
+        """
+        self.dealer = dealer_
+        self.procedure = procedure_
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.timeout = timeout
+        # Per role, a broker matching the URIs of its permissions and the actions granted by each of its subscriptions.
+        self._rules = {}  # type: Dict[str, Tuple[broker.Broker, Dict[int, FrozenSet[str]]]]
+        self._cache = collections.OrderedDict()  # type: Dict[Tuple[str, str, str], Tuple[bool, float]]
+        self._pending = {}  # type: Dict[Tuple[str, str, str], asyncio.Future]
+        self._request_ids = itertools.count(1)
+        for permission in permissions_:
+            self.add(permission)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def add(self, permission: Permission):
+        """Grant a permission, clearing the cached decisions."""
+        rules = self._rules.get(permission.role)
+        if rules is None:
+            rules = self._rules[permission.role] = (broker.Broker(), {})
+        subscription = rules[0].subscribe(None, permission.uri, permission.match)
+        rules[1][subscription.id] = rules[1].get(subscription.id, frozenset()) | permission.actions
+        self._cache.clear()
+
+    def remove(self, role: str, uri: str, match: str = broker.MATCH_EXACT):
+        """Revoke the permissions of a role on a URI or pattern, clearing the cached decisions."""
+        rules = self._rules.get(role)
+        subscription = rules[0].lookup(uri, match) if rules is not None else None
+        if subscription is not None:
+            rules[0].unsubscribe(None, subscription.id)
+            del rules[1][subscription.id]
+        self._cache.clear()
+
+    def authorize(self, session, uri: str, action: str) -> Union[bool, asyncio.Future]:
+        """
+        Decide whether a session may take an action on a URI.
+
+        :return: the decision, or a future of it while the dynamic authorizer is consulted. The future is set to None
+            if the dynamic authorizer failed or timed out, which denies the action.
+        """
+        key = (session.authrole, uri, action)
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                self._cache.move_to_end(key)
+                return cached[0]
+            del self._cache[key]
+
+        allowed = self.permitted(session.authrole, uri, action)
+        if allowed or self.procedure is None:
+            self._remember(key, allowed)
+            return allowed
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._consult(session, key)
+        return future
+
+    def permitted(self, role: str, uri: str, action: str) -> bool:
+        """Return whether the static permissions of a role grant an action on a URI."""
+        rules = self._rules.get(role)
+        if rules is None:
+            return False
+        granted = rules[1]
+        return any(action in granted[subscription.id] for subscription in rules[0].match(uri))
+
+    def _consult(self, session, key: Tuple[str, str, str]) -> Union[bool, asyncio.Future]:
+        role, uri, action = key
+        future = session.loop.create_future()
+        details = {'session': session.id, 'authid': session.authid, 'authrole': role,
+                   'authmethod': session.authmethod}
+        try:
+            self.dealer.call(_Decision(future), message.Call(request_id=next(self._request_ids),
+                                                             options={'timeout': self.timeout * 1000},
+                                                             procedure=self.procedure,
+                                                             args=[details, uri, action]))
+        except error.WampError as e:
+            # The authorizer is not registered; the decision is not cached, so it applies once it is.
+            logger.warning('authorizer %s unavailable: %s', self.procedure, e.error)
+            return False
+
+        self._pending[key] = future
+
+        def decided(future_: asyncio.Future):
+            del self._pending[key]
+            if future_.result() is not None:
+                self._remember(key, future_.result())
+        future.add_done_callback(decided)
+        return future
+
+    def _remember(self, key: Tuple[str, str, str], allowed: bool):
+        self._cache[key] = (allowed, time.monotonic() + self.ttl)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
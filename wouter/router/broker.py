@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Broker role: routes events from publishers to the subscribers of a topic.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple  # noqa: F401
+
+from wouter.monitor import metrics
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import message
+from wouter.router import serializer
+
+MATCH_EXACT = 'exact'
+MATCH_PREFIX = 'prefix'
+MATCH_WILDCARD = 'wildcard'
+
+
+class EventFanout:
+    """
+    An EVENT encoded once for delivery to every subscription of a publication.
+
+    Only the subscription id differs between the EVENT frames of a publication, so the publication id, details, args
+    and kwargs are encoded once per serializer into a template and each frame is built by splicing its subscription id
+    in. Delivering to N subscriptions costs O(payload + N) rather than O(N x payload).
+    """
+    __slots__ = ('_msg', '_templates')
+
+    def __init__(self, publication_id: int, details: dict, args: list = None, kwargs: dict = None):
+        """
+        :param publication_id: is the ID of the publication of the published event.
+        :param details: is the dictionary of event details shared by every receiver.
+        :param args: is the application-level event payload that was provided with the original publication request.
+        :param kwargs: is the application-level event payload that was provided with the original publication request.
+        """
+        # Marshal with a placeholder subscription id so the element layout matches Event.marshal() exactly.
+        self._msg = message.Event(0, publication_id, details, args, kwargs).marshal()
+        self._templates = {}  # type: Dict[serializer.Serializer, tuple]
+
+    def frame(self, subscription_id: int, serializer_: serializer.Serializer = serializer.JSON) -> serializer.Payload:
+        """Return the encoded EVENT frame for a subscription."""
+        template = self._templates.get(serializer_)
+        if template is None:
+            template = self._templates[serializer_] = serializer_.template(self._msg, 1)
+        return serializer_.splice(template, subscription_id)
+
+
+def fan_out(publication_id: int,
+            details: dict,
+            args: list,
+            kwargs: dict,
+            subscriptions: Mapping[int, Iterable[Any]],
+            fanout: EventFanout = None) -> Iterator[Tuple[Any, serializer.Payload, int]]:
+    """
+    Encode the EVENT frames of a publication.
+
+    Yields each receiver with its frame and subscription id. A frame is encoded once per subscription and serializer,
+    so receivers sharing a subscription share its frame.
+
+    :param publication_id: is the ID of the publication of the published event.
+    :param details: is the dictionary of event details shared by every receiver.
+    :param args: is the application-level event payload of the publication.
+    :param kwargs: is the application-level event payload of the publication.
+    :param subscriptions: maps each matching subscription id to its receivers, which must have a serializer attribute.
+    :param fanout: is the EventFanout of the publication to share the templates of, by default a new one.
+    """
+    if not subscriptions:
+        return
+
+    if fanout is None:
+        fanout = EventFanout(publication_id, details, args, kwargs)
+    for subscription_id, receivers in subscriptions.items():
+        frames = {}  # type: Dict[serializer.Serializer, serializer.Payload]
+        for receiver in receivers:
+            serializer_ = receiver.serializer
+            frame = frames.get(serializer_)
+            if frame is None:
+                frame = frames[serializer_] = fanout.frame(subscription_id, serializer_)
+            yield receiver, frame, subscription_id
+
+
+class Subscription:
+    """A topic or topic pattern and the sessions subscribed to it, which all share the subscription id."""
+    __slots__ = ('id', 'uri', 'match', 'subscribers')
+
+    def __init__(self, id_: int, uri: str, match: str):
+        self.id = id_
+        self.uri = uri
+        self.match = match
+        self.subscribers = set()
+
+
+class _Node:
+    """
+    A node of a URI-component trie.
+
+    In the prefix trie, prefixes maps the last (possibly partial) component of a prefix to its subscription, since
+    prefix matching is by string rather than by component. In the wildcard trie, the empty component is the wildcard
+    edge and subscription is set on the node a pattern ends at.
+    """
+    __slots__ = ('children', 'prefixes', 'subscription')
+
+    def __init__(self):
+        self.children = {}  # type: Dict[str, _Node]
+        self.prefixes = {}  # type: Dict[str, Subscription]
+        self.subscription = None  # type: Optional[Subscription]
+
+    def __bool__(self):
+        return bool(self.children or self.prefixes or self.subscription)
+
+
+class Broker:
+    """
+    Subscription store and event router of a realm.
+
+    Exact subscriptions are indexed by URI in a dict. Prefix and wildcard subscriptions are indexed in tries keyed by
+    URI component, so finding the subscriptions matching a topic costs time proportional to the depth of the topic
+    rather than to the number of subscriptions.
+    """
+
+    def __init__(self, history_=None):
+        """
+        :param history_: is the wouter.router.history.History retaining the events of the realm, if any.
+        """
+        self.history = history_
+        self.subscriptions = {}  # type: Dict[int, Subscription]
+        # Counts subscriptions created and deleted, so what topics match can be cached until it changes.
+        self.version = 0
+        self._exact = {}  # type: Dict[str, Subscription]
+        self._prefix = _Node()
+        self._wildcard = _Node()
+
+    def subscribe(self, session, uri: str, match: str = MATCH_EXACT) -> Subscription:
+        """
+        Add a session to the subscription for a topic or pattern, creating it if needed.
+
+        :raises error.WampError: if match is not a supported matching policy.
+        """
+        subscription = self.lookup(uri, match)
+        if subscription is None:
+            subscription = Subscription(ids.router_ids.generate(self.subscriptions), uri, match)
+            self._index(subscription)
+            self.subscriptions[subscription.id] = subscription
+
+        subscription.subscribers.add(session)
+        return subscription
+
+    def unsubscribe(self, session, subscription_id: int) -> bool:
+        """
+        Remove a session from a subscription, dropping the subscription once it has no subscribers.
+
+        :return: whether the session was subscribed.
+        """
+        subscription = self.subscriptions.get(subscription_id)
+        if subscription is None or session not in subscription.subscribers:
+            return False
+
+        subscription.subscribers.discard(session)
+        if not subscription.subscribers:
+            del self.subscriptions[subscription_id]
+            self._unindex(subscription)
+        return True
+
+    def lookup(self, uri: str, match: str = MATCH_EXACT) -> Optional[Subscription]:
+        """Return the subscription for a topic or pattern and matching policy, if any."""
+        if match == MATCH_EXACT:
+            return self._exact.get(uri)
+
+        if match == MATCH_PREFIX:
+            *path, last = uri.split('.')
+            node = self._find(self._prefix, path)
+            return node.prefixes.get(last) if node is not None else None
+
+        if match == MATCH_WILDCARD:
+            node = self._find(self._wildcard, uri.split('.'))
+            return node.subscription if node is not None else None
+
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid match policy %r' % match)
+
+    def match(self, topic: str) -> List[Subscription]:
+        """Return every subscription matching a topic."""
+        subscriptions = []
+        exact = self._exact.get(topic)
+        if exact is not None:
+            subscriptions.append(exact)
+
+        components = topic.split('.')
+
+        if self._prefix:
+            node = self._prefix
+            for component in components:
+                prefixes = node.prefixes
+                if prefixes:
+                    for end in range(len(component) + 1):
+                        subscription = prefixes.get(component[:end])
+                        if subscription is not None:
+                            subscriptions.append(subscription)
+                node = node.children.get(component)
+                if node is None:
+                    break
+
+        if self._wildcard:
+            nodes = [self._wildcard]
+            for component in components:
+                matched = []
+                for node in nodes:
+                    child = node.children.get(component)
+                    if child is not None:
+                        matched.append(child)
+                    child = node.children.get('')
+                    if child is not None:
+                        matched.append(child)
+                nodes = matched
+                if not nodes:
+                    break
+            subscriptions.extend(node.subscription for node in nodes if node.subscription is not None)
+
+        return subscriptions
+
+    def publish(self, session, publish: message.Publish) -> int:
+        """
+        Dispatch a publication to the subscribers of its topic and acknowledge it if requested.
+
+        Unless the publisher sets the exclude_me option to false, it does not receive its own event.
+
+        :return: the publication id.
+        """
+        publication_id = ids.global_ids.generate()
+        exclude = session if publish.options.get('exclude_me', True) else None
+        self.dispatch(publication_id, publish.topic, publish.args, publish.kwargs, exclude)
+
+        if publish.options.get('acknowledge'):
+            session.send(message.Published(request_id=publish.request_id, publication_id=publication_id))
+
+        return publication_id
+
+    def dispatch(self, publication_id: int, topic: str, args: list, kwargs: dict, exclude=None):
+        """
+        Send the events of a publication to the subscribers of its topic.
+
+        Events to pattern subscriptions carry the topic in their details.
+
+        :param exclude: is a session that does not receive the events, if any.
+        """
+        exact = {}  # type: Dict[int, Iterable[Any]]
+        pattern = {}  # type: Dict[int, Iterable[Any]]
+        for subscription in self.match(topic):
+            receivers = subscription.subscribers
+            if exclude in receivers:
+                receivers = [s for s in receivers if s is not exclude]
+            (exact if subscription.match == MATCH_EXACT else pattern)[subscription.id] = receivers
+
+        retained = self.history.record(publication_id, topic, args, kwargs) if self.history is not None else None
+        exact_fanout, pattern_fanout = retained.fanouts if retained is not None else (None, None)
+
+        # Events of a subscription and topic supersede each other in the send queue of a slow subscriber.
+        events = 0
+        for receiver, frame, subscription_id in fan_out(publication_id, {}, args, kwargs, exact, exact_fanout):
+            receiver.send_frame(frame, (subscription_id, topic))
+            events += 1
+        for receiver, frame, subscription_id in fan_out(publication_id, {'topic': topic}, args, kwargs, pattern,
+                                                        pattern_fanout):
+            receiver.send_frame(frame, (subscription_id, topic))
+            events += 1
+        metrics.sent[message.Event] += events
+
+    @staticmethod
+    def _find(root: _Node, path: List[str]) -> Optional[_Node]:
+        node = root
+        for component in path:
+            node = node.children.get(component)
+            if node is None:
+                return None
+        return node
+
+    def _index(self, subscription: Subscription):
+        self.version += 1
+        if subscription.match == MATCH_EXACT:
+            self._exact[subscription.uri] = subscription
+        elif subscription.match == MATCH_PREFIX:
+            *path, last = subscription.uri.split('.')
+            self._make(self._prefix, path).prefixes[last] = subscription
+        else:
+            self._make(self._wildcard, subscription.uri.split('.')).subscription = subscription
+
+    def _unindex(self, subscription: Subscription):
+        self.version += 1
+        if subscription.match == MATCH_EXACT:
+            del self._exact[subscription.uri]
+            return
+
+        if subscription.match == MATCH_PREFIX:
+            *path, last = subscription.uri.split('.')
+            nodes = self._path(self._prefix, path)
+            del nodes[-1].prefixes[last]
+        else:
+            path = subscription.uri.split('.')
+            nodes = self._path(self._wildcard, path)
+            nodes[-1].subscription = None
+
+        # Prune the nodes left empty, deepest first.
+        for depth in range(len(path), 0, -1):
+            if nodes[depth]:
+                break
+            del nodes[depth - 1].children[path[depth - 1]]
+
+    @staticmethod
+    def _make(root: _Node, path: List[str]) -> _Node:
+        node = root
+        for component in path:
+            child = node.children.get(component)
+            if child is None:
+                child = node.children[component] = _Node()
+            node = child
+        return node
+
+    @staticmethod
+    def _path(root: _Node, path: List[str]) -> List[_Node]:
+        nodes = [root]
+        for component in path:
+            nodes.append(nodes[-1].children[component])
+        return nodes
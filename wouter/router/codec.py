@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Pure-Python MessagePack and CBOR codecs.
+
+These cover the data model WAMP messages use (None, bool, int, float, str, bytes, list and dict) and are the fallback
+when the msgpack or cbor2 packages are not installed. Their item-at-a-time decoders are also used to read only the
+leading elements of a message, which the compiled packages do not offer.
+"""
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple  # noqa: F401
+
+_pack_float = struct.Struct('>d').pack
+_unpack_uint = {1: struct.Struct('>B').unpack_from,
+                2: struct.Struct('>H').unpack_from,
+                4: struct.Struct('>I').unpack_from,
+                8: struct.Struct('>Q').unpack_from}
+_unpack_int = {1: struct.Struct('>b').unpack_from,
+               2: struct.Struct('>h').unpack_from,
+               4: struct.Struct('>i').unpack_from,
+               8: struct.Struct('>q').unpack_from}
+_unpack_half = struct.Struct('>e').unpack_from
+_unpack_float = struct.Struct('>f').unpack_from
+_unpack_double = struct.Struct('>d').unpack_from
+
+# What the decoders raise on truncated or malformed input, besides ValueError; the public decoders raise ValueError.
+_DECODE_ERRORS = (IndexError, KeyError, TypeError, RecursionError, struct.error)
+
+
+def _sized(value: int, small: int, tags: Tuple[int, int, int]) -> bytes:
+    """Encode a length or unsigned value with the 8/16/32-bit tag that fits."""
+    if value < 0x100 and small:
+        return bytes((tags[0], value))
+    if value < 0x10000:
+        return bytes((tags[1],)) + value.to_bytes(2, 'big')
+    if value < 0x100000000:
+        return bytes((tags[2],)) + value.to_bytes(4, 'big')
+    raise ValueError('Length out of range')
+
+
+# MessagePack
+
+
+def msgpack_array_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x90 | length,))
+    return _sized(length, 0, (0, 0xdc, 0xdd))
+
+
+def _msgpack_map_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x80 | length,))
+    return _sized(length, 0, (0, 0xde, 0xdf))
+
+
+def _msgpack_int(value: int) -> bytes:
+    if 0 <= value < 0x80:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return bytes((value & 0xff,))
+    if value >= 0:
+        if value < 0x100:
+            return b'\xcc' + value.to_bytes(1, 'big')
+        if value < 0x10000:
+            return b'\xcd' + value.to_bytes(2, 'big')
+        if value < 0x100000000:
+            return b'\xce' + value.to_bytes(4, 'big')
+        if value < 0x10000000000000000:
+            return b'\xcf' + value.to_bytes(8, 'big')
+    else:
+        if value >= -0x80:
+            return b'\xd0' + value.to_bytes(1, 'big', signed=True)
+        if value >= -0x8000:
+            return b'\xd1' + value.to_bytes(2, 'big', signed=True)
+        if value >= -0x80000000:
+            return b'\xd2' + value.to_bytes(4, 'big', signed=True)
+        if value >= -0x8000000000000000:
+            return b'\xd3' + value.to_bytes(8, 'big', signed=True)
+    raise ValueError('Integer out of range')
+
+
+def msgpack_packb(obj: Any) -> bytes:
+    """Serialize obj to MessagePack."""
+    chunks = []
+    _msgpack_pack(obj, chunks.append)
+    return b''.join(chunks)
+
+
+def _msgpack_pack(obj: Any, write: Callable[[bytes], Any]):
+    if obj is None:
+        write(b'\xc0')
+    elif obj is True:
+        write(b'\xc3')
+    elif obj is False:
+        write(b'\xc2')
+    elif isinstance(obj, int):
+        write(_msgpack_int(obj))
+    elif isinstance(obj, float):
+        write(b'\xcb' + _pack_float(obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        length = len(data)
+        write(bytes((0xa0 | length,)) if length < 32 else _sized(length, 1, (0xd9, 0xda, 0xdb)))
+        write(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        write(_sized(len(data), 1, (0xc4, 0xc5, 0xc6)))
+        write(data)
+    elif isinstance(obj, (list, tuple)):
+        write(msgpack_array_header(len(obj)))
+        for item in obj:
+            _msgpack_pack(item, write)
+    elif isinstance(obj, dict):
+        write(_msgpack_map_header(len(obj)))
+        for key, value in obj.items():
+            _msgpack_pack(key, write)
+            _msgpack_pack(value, write)
+    else:
+        raise TypeError('Cannot serialize %r to MessagePack' % type(obj))
+
+
+def msgpack_unpackb(data: bytes) -> Any:
+    """Deserialize a single MessagePack object from data."""
+    data = bytes(data)
+    try:
+        obj, offset = _msgpack_unpack(data, 0)
+    except _DECODE_ERRORS as e:
+        raise ValueError('Invalid MessagePack data: %r' % e)
+    if offset != len(data):
+        raise ValueError('Trailing data')
+    return obj
+
+
+def msgpack_array_start(data: bytes) -> Tuple[int, int]:
+    """
+    Read the header of a MessagePack array, for decoding its items one at a time with msgpack_unpack_from().
+
+    :return: the number of items and the offset of the first.
+    :raises ValueError: if data is not an array.
+    """
+    try:
+        tag = data[0]
+        if 0x90 <= tag < 0xa0:
+            return tag & 0x0f, 1
+        if tag == 0xdc:
+            return _unpack_uint[2](data, 1)[0], 3
+        if tag == 0xdd:
+            return _unpack_uint[4](data, 1)[0], 5
+    except _DECODE_ERRORS as e:
+        raise ValueError('Invalid MessagePack data: %r' % e)
+    raise ValueError('Not a MessagePack array')
+
+
+def msgpack_unpack_from(data: bytes, offset: int) -> Tuple[Any, int]:
+    """Deserialize the MessagePack object at offset, returning it with the offset following it."""
+    try:
+        return _msgpack_unpack(data, offset)
+    except _DECODE_ERRORS as e:
+        raise ValueError('Invalid MessagePack data: %r' % e)
+
+
+def _msgpack_unpack(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+
+    if tag < 0x80:
+        return tag, offset
+    if tag >= 0xe0:
+        return tag - 0x100, offset
+    if tag < 0x90:
+        return _msgpack_unpack_map(data, offset, tag & 0x0f)
+    if tag < 0xa0:
+        return _msgpack_unpack_array(data, offset, tag & 0x0f)
+    if tag < 0xc0:
+        end = offset + (tag & 0x1f)
+        return data[offset:end].decode('utf-8'), end
+
+    if tag == 0xc0:
+        return None, offset
+    if tag == 0xc2:
+        return False, offset
+    if tag == 0xc3:
+        return True, offset
+    if 0xcc <= tag <= 0xcf:
+        size = 1 << (tag - 0xcc)
+        return _unpack_uint[size](data, offset)[0], offset + size
+    if 0xd0 <= tag <= 0xd3:
+        size = 1 << (tag - 0xd0)
+        return _unpack_int[size](data, offset)[0], offset + size
+    if tag == 0xca:
+        return _unpack_float(data, offset)[0], offset + 4
+    if tag == 0xcb:
+        return _unpack_double(data, offset)[0], offset + 8
+    if 0xd9 <= tag <= 0xdb:
+        size = 1 << (tag - 0xd9)
+        length = _unpack_uint[size](data, offset)[0]
+        offset += size
+        return data[offset:offset + length].decode('utf-8'), offset + length
+    if 0xc4 <= tag <= 0xc6:
+        size = 1 << (tag - 0xc4)
+        length = _unpack_uint[size](data, offset)[0]
+        offset += size
+        return data[offset:offset + length], offset + length
+    if tag in (0xdc, 0xdd):
+        size = 2 if tag == 0xdc else 4
+        return _msgpack_unpack_array(data, offset + size, _unpack_uint[size](data, offset)[0])
+    if tag in (0xde, 0xdf):
+        size = 2 if tag == 0xde else 4
+        return _msgpack_unpack_map(data, offset + size, _unpack_uint[size](data, offset)[0])
+
+    raise ValueError('Unsupported MessagePack type 0x%02x' % tag)
+
+
+def _msgpack_unpack_array(data: bytes, offset: int, length: int) -> Tuple[list, int]:
+    items = []
+    for _ in range(length):
+        item, offset = _msgpack_unpack(data, offset)
+        items.append(item)
+    return items, offset
+
+
+def _msgpack_unpack_map(data: bytes, offset: int, length: int) -> Tuple[dict, int]:
+    items = {}  # type: Dict[Any, Any]
+    for _ in range(length):
+        key, offset = _msgpack_unpack(data, offset)
+        items[key], offset = _msgpack_unpack(data, offset)
+    return items, offset
+
+
+# CBOR
+
+
+def _cbor_head(major: int, value: int) -> bytes:
+    major <<= 5
+    if value < 24:
+        return bytes((major | value,))
+    if value < 0x100:
+        return bytes((major | 24, value))
+    if value < 0x10000:
+        return bytes((major | 25,)) + value.to_bytes(2, 'big')
+    if value < 0x100000000:
+        return bytes((major | 26,)) + value.to_bytes(4, 'big')
+    if value < 0x10000000000000000:
+        return bytes((major | 27,)) + value.to_bytes(8, 'big')
+    raise ValueError('Integer out of range')
+
+
+def cbor_array_header(length: int) -> bytes:
+    return _cbor_head(4, length)
+
+
+def cbor_dumps(obj: Any) -> bytes:
+    """Serialize obj to CBOR."""
+    chunks = []
+    _cbor_encode(obj, chunks.append)
+    return b''.join(chunks)
+
+
+def _cbor_encode(obj: Any, write: Callable[[bytes], Any]):
+    if obj is None:
+        write(b'\xf6')
+    elif obj is True:
+        write(b'\xf5')
+    elif obj is False:
+        write(b'\xf4')
+    elif isinstance(obj, int):
+        write(_cbor_head(0, obj) if obj >= 0 else _cbor_head(1, -1 - obj))
+    elif isinstance(obj, float):
+        write(b'\xfb' + _pack_float(obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        write(_cbor_head(3, len(data)))
+        write(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        write(_cbor_head(2, len(data)))
+        write(data)
+    elif isinstance(obj, (list, tuple)):
+        write(_cbor_head(4, len(obj)))
+        for item in obj:
+            _cbor_encode(item, write)
+    elif isinstance(obj, dict):
+        write(_cbor_head(5, len(obj)))
+        for key, value in obj.items():
+            _cbor_encode(key, write)
+            _cbor_encode(value, write)
+    else:
+        raise TypeError('Cannot serialize %r to CBOR' % type(obj))
+
+
+_BREAK = object()
+
+
+def cbor_loads(data: bytes) -> Any:
+    """Deserialize a single CBOR data item from data."""
+    data = bytes(data)
+    try:
+        obj, offset = _cbor_decode(data, 0)
+    except _DECODE_ERRORS as e:
+        raise ValueError('Invalid CBOR data: %r' % e)
+    if obj is _BREAK or offset != len(data):
+        raise ValueError('Invalid CBOR data')
+    return obj
+
+
+def cbor_array_start(data: bytes) -> Tuple[Optional[int], int]:
+    """
+    Read the head of a CBOR array, for decoding its items one at a time with cbor_decode_from().
+
+    :return: the number of items, None for an indefinite-length array, and the offset of the first.
+    :raises ValueError: if data is not an array.
+    """
+    if not data or data[0] >> 5 != 4:
+        raise ValueError('Not a CBOR array')
+    info = data[0] & 0x1f
+    if info < 24:
+        return info, 1
+    if info <= 27:
+        size = 1 << (info - 24)
+        try:
+            return _unpack_uint[size](data, 1)[0], 1 + size
+        except struct.error as e:
+            raise ValueError('Invalid CBOR data: %r' % e)
+    if info == 31:
+        return None, 1
+    raise ValueError('Invalid CBOR length')
+
+
+def cbor_decode_from(data: bytes, offset: int) -> Tuple[Any, int]:
+    """Deserialize the CBOR data item at offset, returning it with the offset following it."""
+    try:
+        obj, offset = _cbor_decode(data, offset)
+    except _DECODE_ERRORS as e:
+        raise ValueError('Invalid CBOR data: %r' % e)
+    if obj is _BREAK:
+        raise ValueError('Invalid CBOR data')
+    return obj, offset
+
+
+def _cbor_decode(data: bytes, offset: int) -> Tuple[Any, int]:
+    initial = data[offset]
+    offset += 1
+    major, info = initial >> 5, initial & 0x1f
+
+    if major == 7:
+        if info == 20:
+            return False, offset
+        if info == 21:
+            return True, offset
+        if info in (22, 23):
+            return None, offset
+        if info == 25:
+            return _unpack_half(data, offset)[0], offset + 2
+        if info == 26:
+            return _unpack_float(data, offset)[0], offset + 4
+        if info == 27:
+            return _unpack_double(data, offset)[0], offset + 8
+        if info == 31:
+            return _BREAK, offset
+        raise ValueError('Unsupported CBOR simple value %d' % info)
+
+    if info < 24:
+        value = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        value = _unpack_uint[size](data, offset)[0]
+        offset += size
+    elif info == 31 and major in (2, 3, 4, 5):
+        return _cbor_decode_indefinite(data, offset, major)
+    else:
+        raise ValueError('Invalid CBOR length')
+
+    if major == 0:
+        return value, offset
+    if major == 1:
+        return -1 - value, offset
+    if major == 2:
+        return data[offset:offset + value], offset + value
+    if major == 3:
+        return data[offset:offset + value].decode('utf-8'), offset + value
+    if major == 4:
+        items = []
+        for _ in range(value):
+            item, offset = _cbor_decode(data, offset)
+            items.append(item)
+        return items, offset
+    if major == 5:
+        mapping = {}  # type: Dict[Any, Any]
+        for _ in range(value):
+            key, offset = _cbor_decode(data, offset)
+            mapping[key], offset = _cbor_decode(data, offset)
+        return mapping, offset
+
+    # Major type 6: ignore the tag and return the tagged item.
+    return _cbor_decode(data, offset)
+
+
+def _cbor_decode_indefinite(data: bytes, offset: int, major: int) -> Tuple[Any, int]:
+    items = []
+    while True:
+        item, offset = _cbor_decode(data, offset)
+        if item is _BREAK:
+            break
+        items.append(item)
+
+    if major == 2:
+        return b''.join(items), offset
+    if major == 3:
+        return ''.join(items), offset
+    if major == 4:
+        return items, offset
+    return dict(zip(items[::2], items[1::2])), offset
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Dealer role: routes calls from callers to the callees registered for a procedure.
+"""
+import asyncio
+import collections
+import heapq
+import itertools
+import random
+from typing import Any, Dict, Iterator, List, Optional, Set  # noqa: F401
+
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import message
+from wouter.router import timer
+
+INVOKE_SINGLE = 'single'
+INVOKE_ROUNDROBIN = 'roundrobin'
+INVOKE_RANDOM = 'random'
+INVOKE_FIRST = 'first'
+INVOKE_LAST = 'last'
+INVOKE_LEAST_OUTSTANDING = 'leastoutstanding'
+
+# The largest call timeout option, in milliseconds. Larger, infinite and NaN timeouts are rejected.
+MAX_TIMEOUT = 2 ** 53
+
+
+class _Callees:
+    """
+    The callees of a registration, ordered by registration time.
+
+    Selection is O(1) for every policy but least outstanding calls, which _LeastOutstanding implements in O(log n).
+    """
+
+    def __init__(self, invoke: str):
+        self.invoke = invoke
+        self._sessions = collections.OrderedDict()  # type: Dict[Any, None]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._sessions)
+
+    def __contains__(self, session) -> bool:
+        return session in self._sessions
+
+    def add(self, session):
+        self._sessions[session] = None
+
+    def remove(self, session):
+        del self._sessions[session]
+
+    def select(self):
+        if self.invoke == INVOKE_LAST:
+            return next(reversed(self._sessions))
+
+        session = next(iter(self._sessions))
+        if self.invoke == INVOKE_ROUNDROBIN:
+            self._sessions.move_to_end(session)
+        return session
+
+    def begin(self, session):
+        """Count an invocation sent to a callee."""
+
+    def end(self, session):
+        """Count an invocation answered by, or abandoned for, a callee."""
+
+
+class _Random(_Callees):
+    """Callees kept in an array for uniform selection, removed by swapping with the last element."""
+
+    def __init__(self, invoke: str):
+        _Callees.__init__(self, invoke)
+        self._array = []  # type: List[Any]
+
+    def add(self, session):
+        self._sessions[session] = len(self._array)
+        self._array.append(session)
+
+    def remove(self, session):
+        index = self._sessions.pop(session)
+        last = self._array.pop()
+        if last is not session:
+            self._array[index] = last
+            self._sessions[last] = index
+
+    def select(self):
+        return self._array[random.randrange(len(self._array))]
+
+
+class _LeastOutstanding(_Callees):
+    """
+    Callees in a heap keyed on their number of outstanding invocations.
+
+    Counts change on every invocation, so rather than reordering the heap in place a new entry is pushed and stale
+    entries are discarded when they reach the top. The heap is rebuilt when stale entries outnumber live ones.
+    """
+
+    def __init__(self, invoke: str):
+        _Callees.__init__(self, invoke)
+        self._heap = []  # type: List[tuple]
+        self._counter = itertools.count()
+
+    def add(self, session):
+        self._sessions[session] = 0
+        heapq.heappush(self._heap, (0, next(self._counter), session))
+
+    def remove(self, session):
+        del self._sessions[session]
+
+    def select(self):
+        heap = self._heap
+        while True:
+            outstanding, _, session = heap[0]
+            if self._sessions.get(session) == outstanding:
+                return session
+            heapq.heappop(heap)
+
+    def begin(self, session):
+        self._update(session, 1)
+
+    def end(self, session):
+        self._update(session, -1)
+
+    def _update(self, session, delta: int):
+        outstanding = self._sessions.get(session)
+        if outstanding is None:
+            return
+        outstanding = self._sessions[session] = max(outstanding + delta, 0)
+        heapq.heappush(self._heap, (outstanding, next(self._counter), session))
+
+        if len(self._heap) > 2 * len(self._sessions) + 16:
+            self._heap = [(count, next(self._counter), s) for s, count in self._sessions.items()]
+            heapq.heapify(self._heap)
+
+
+_policies = {
+    INVOKE_SINGLE: _Callees,
+    INVOKE_ROUNDROBIN: _Callees,
+    INVOKE_RANDOM: _Random,
+    INVOKE_FIRST: _Callees,
+    INVOKE_LAST: _Callees,
+    INVOKE_LEAST_OUTSTANDING: _LeastOutstanding,
+}
+
+
+class Registration:
+    """A procedure and the callees implementing it, which all share the registration id and invocation policy."""
+    __slots__ = ('id', 'procedure', 'invoke', 'callees')
+
+    def __init__(self, id_: int, procedure: str, invoke: str):
+        self.id = id_
+        self.procedure = procedure
+        self.invoke = invoke
+        self.callees = _policies[invoke](invoke)
+
+
+class PendingCall:
+    """A call forwarded to a callee as an invocation, awaiting its yield or error."""
+    __slots__ = ('caller', 'request_id', 'callee', 'invocation_id', 'registration', 'timer')
+
+    def __init__(self, caller, request_id: int, callee, invocation_id: int, registration: Registration):
+        self.caller = caller
+        self.request_id = request_id
+        self.callee = callee
+        self.invocation_id = invocation_id
+        self.registration = registration
+        self.timer = None  # type: Optional[timer.Timer]
+
+
+class CallTable:
+    """
+    In-flight calls, indexed by callee and invocation request id, and by caller.
+
+    Calls with a timeout are expired by a shared timer wheel rather than a loop handle each, so tracking and
+    cancelling a timeout costs a set insertion and removal.
+    """
+
+    def __init__(self, wheel: timer.TimerWheel):
+        self.wheel = wheel
+        self._calls = {}  # type: Dict[Any, Dict[int, PendingCall]]
+        self._callers = {}  # type: Dict[Any, Set[PendingCall]]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, pending: PendingCall, timeout: float = 0, on_timeout=None):
+        """
+        Track a call until it is popped.
+
+        :param timeout: is the number of seconds after which the call is removed and on_timeout(pending) is called;
+            0 for no timeout.
+        """
+        if timeout > 0:
+            # Scheduled first, so a timeout the wheel rejects leaves the table unchanged.
+            pending.timer = self.wheel.call_later(timeout, self._expire, pending, on_timeout)
+
+        calls = self._calls.get(pending.callee)
+        if calls is None:
+            calls = self._calls[pending.callee] = {}
+        calls[pending.invocation_id] = pending
+        made = self._callers.get(pending.caller)
+        if made is None:
+            made = self._callers[pending.caller] = set()
+        made.add(pending)
+        self._count += 1
+
+    def get(self, callee, invocation_id: int) -> Optional[PendingCall]:
+        calls = self._calls.get(callee)
+        return calls.get(invocation_id) if calls is not None else None
+
+    def pop(self, callee, invocation_id: int) -> Optional[PendingCall]:
+        """Stop tracking a call and cancel its timeout; return None if it is not in flight."""
+        calls = self._calls.get(callee)
+        if calls is None:
+            return None
+        pending = calls.pop(invocation_id, None)
+        if pending is None:
+            return None
+
+        if not calls:
+            del self._calls[callee]
+        made = self._callers[pending.caller]
+        made.discard(pending)
+        if not made:
+            del self._callers[pending.caller]
+        self._count -= 1
+        if pending.timer is not None:
+            pending.timer.cancel()
+        return pending
+
+    def pop_callee(self, callee) -> List[PendingCall]:
+        """Stop tracking every call forwarded to a callee."""
+        calls = self._calls.get(callee)
+        return [self.pop(callee, invocation_id) for invocation_id in list(calls)] if calls else []
+
+    def pop_caller(self, caller) -> List[PendingCall]:
+        """Stop tracking every call made by a caller."""
+        made = self._callers.get(caller)
+        return [self.pop(pending.callee, pending.invocation_id) for pending in list(made)] if made else []
+
+    def _expire(self, pending: PendingCall, on_timeout):
+        pending.timer = None
+        if self.pop(pending.callee, pending.invocation_id) is pending and on_timeout is not None:
+            on_timeout(pending)
+
+
+class Dealer:
+    """
+    Registration store and call router of a realm.
+
+    Registrations are indexed by procedure URI in a dict. A procedure may be registered by several callees when they
+    agree on a shared registration policy, which then selects the callee of each call.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        """
+        :param loop: is the event loop call timeouts run on, by default the current event loop.
+        """
+        self.registrations = {}  # type: Dict[int, Registration]
+        self.invocations = CallTable(timer.TimerWheel(loop=loop))
+        self._procedures = {}  # type: Dict[str, Registration]
+
+    def register(self, session, procedure: str, invoke: str = INVOKE_SINGLE) -> Registration:
+        """
+        Add a session as a callee of a procedure, creating its registration if needed.
+
+        :raises error.WampError: if the policy is unknown, or the procedure is already registered by this session or
+            without a matching shared registration policy.
+        """
+        if type(invoke) is not str or invoke not in _policies:
+            raise error.WampError(error.INVALID_ARGUMENT, 'invalid invocation policy %r' % invoke)
+
+        registration = self._procedures.get(procedure)
+        if registration is None:
+            registration = Registration(ids.router_ids.generate(self.registrations), procedure, invoke)
+            self._procedures[procedure] = registration
+            self.registrations[registration.id] = registration
+        elif invoke == INVOKE_SINGLE or registration.invoke != invoke or session in registration.callees:
+            raise error.WampError(error.PROCEDURE_ALREADY_EXISTS)
+
+        registration.callees.add(session)
+        return registration
+
+    def unregister(self, session, registration_id: int) -> bool:
+        """
+        Remove a session from a registration, dropping the registration once it has no callees.
+
+        :return: whether the session was registered.
+        """
+        registration = self.registrations.get(registration_id)
+        if registration is None or session not in registration.callees:
+            return False
+
+        registration.callees.remove(session)
+        if not registration.callees:
+            del self.registrations[registration_id]
+            del self._procedures[registration.procedure]
+        return True
+
+    def lookup(self, procedure: str) -> Optional[Registration]:
+        """Return the registration for a procedure, if any."""
+        return self._procedures.get(procedure)
+
+    def call(self, session, call: message.Call) -> PendingCall:
+        """
+        Forward a call to a callee of its procedure as an invocation.
+
+        A positive timeout option, in milliseconds, fails the call with wamp.error.canceled if the callee has not
+        answered in time.
+
+        :raises error.WampError: if the procedure is not registered or the timeout is not a finite, non-negative number.
+        """
+        timeout = call.options.get('timeout', 0)
+        if type(timeout) not in (int, float) or not 0 <= timeout <= MAX_TIMEOUT:
+            raise error.WampError(error.INVALID_ARGUMENT, 'invalid timeout %r' % (timeout,))
+
+        registration = self._procedures.get(call.procedure)
+        if registration is None:
+            raise error.WampError(error.NO_SUCH_PROCEDURE)
+
+        callee = registration.callees.select()
+        if callee.peer and session.peer:
+            # Calls forwarded by a peer router only go to local callees, so they cannot bounce between routers.
+            callee = next((c for c in registration.callees if not c.peer), None)
+            if callee is None:
+                raise error.WampError(error.NO_SUCH_PROCEDURE)
+
+        request_id = callee.request_ids.generate()
+        pending = PendingCall(session, call.request_id, callee, request_id, registration)
+        self.invocations.add(pending, timeout / 1000, self._timeout)
+        registration.callees.begin(callee)
+
+        callee.send(message.Invocation(request_id=request_id,
+                                       registration_id=registration.id,
+                                       details={},
+                                       args=call.args,
+                                       kwargs=call.kwargs))
+        return pending
+
+    def yield_(self, session, yield_: message.Yield):
+        """Return the result of an invocation to its caller."""
+        pending = self._complete(session, yield_.request_id)
+        if pending is not None:
+            pending.caller.send(message.Result(request_id=pending.request_id,
+                                               details={},
+                                               args=yield_.args,
+                                               kwargs=yield_.kwargs))
+
+    def error(self, session, error_: message.Error):
+        """Return the error of an invocation to its caller."""
+        pending = self._complete(session, error_.request_id)
+        if pending is not None:
+            pending.caller.send(message.Error(request_type=message.Type.CALL,
+                                              request_id=pending.request_id,
+                                              details=error_.details,
+                                              error=error_.error,
+                                              args=error_.args,
+                                              kwargs=error_.kwargs))
+
+    def detach(self, session):
+        """
+        Drop the in-flight calls of a session that is leaving, in time proportional to their number.
+
+        Calls the session made are forgotten, so the late answers of their callees are ignored. Calls forwarded to the
+        session fail with wamp.error.canceled.
+        """
+        for pending in self.invocations.pop_caller(session):
+            pending.registration.callees.end(pending.callee)
+        for pending in self.invocations.pop_callee(session):
+            pending.registration.callees.end(session)
+            pending.caller.send(message.Error(request_type=message.Type.CALL,
+                                              request_id=pending.request_id,
+                                              details={'message': 'callee left'},
+                                              error=error.CANCELED))
+
+    def _complete(self, session, request_id: int) -> Optional[PendingCall]:
+        pending = self.invocations.pop(session, request_id)
+        if pending is not None:
+            pending.registration.callees.end(session)
+        return pending
+
+    @staticmethod
+    def _timeout(pending: PendingCall):
+        pending.registration.callees.end(pending.callee)
+        pending.caller.send(message.Error(request_type=message.Type.CALL,
+                                          request_id=pending.request_id,
+                                          details={},
+                                          error=error.CANCELED))
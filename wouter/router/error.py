@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Errors reported to peers as WAMP ERROR messages.
+"""
+
+AUTHENTICATION_FAILED = 'wamp.error.authentication_failed'
+INVALID_ARGUMENT = 'wamp.error.invalid_argument'
+INVALID_URI = 'wamp.error.invalid_uri'
+NO_AUTH_METHOD = 'wamp.error.no_auth_method'
+NOT_AUTHORIZED = 'wamp.error.not_authorized'
+NO_SUCH_SESSION = 'wamp.error.no_such_session'
+NO_SUCH_SUBSCRIPTION = 'wamp.error.no_such_subscription'
+NO_SUCH_PROCEDURE = 'wamp.error.no_such_procedure'
+NO_SUCH_REGISTRATION = 'wamp.error.no_such_registration'
+PROCEDURE_ALREADY_EXISTS = 'wamp.error.procedure_already_exists'
+PROTOCOL_VIOLATION = 'wamp.error.protocol_violation'
+CANCELED = 'wamp.error.canceled'
+
+
+class WampError(Exception):
+    def __init__(self, error: str, message: str = None):
+        """
+        A request that could not be fulfilled.
+
+        :param error: is the URI that identifies the error, sent to the peer in the ERROR reply.
+        :param message: is an optional human readable description, sent in the ERROR details.
+        """
+        Exception.__init__(self, error, message)
+        self.error = error
+        self.message = message
+
+    def details(self) -> dict:
+        return {'message': self.message} if self.message else {}
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Event history: the last events of selected topics, retained for subscribers that join late.
+
+Each retained topic has a ring buffer of its last publications, bounded in length and optionally in age. A retained
+publication keeps the EventFanout its events were encoded with, so a subscriber fetching history gets frames spliced
+from templates already encoded for its serializer rather than events encoded again.
+
+Subscribers fetch the history of one of their subscriptions with the wamp.subscription.get_events router procedure.
+Its result is the list of the retained EVENT messages, oldest first, each addressed to that subscription.
+"""
+import collections
+import time
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple  # noqa: F401
+
+from wouter.router import broker
+from wouter.router import error
+from wouter.router import meta
+from wouter.router import serializer
+
+# Topics and topic patterns whose events are retained, as (uri, match) pairs, and the keyword arguments of the History
+# of each realm. Set from the command line.
+topics = []  # type: List[Tuple[str, str]]
+options = {}  # type: Dict[str, Any]
+
+
+class Publication:
+    """A retained publication, with the encoders of its events to exact and to pattern subscriptions."""
+    __slots__ = ('time', 'topic', 'fanouts')
+
+    def __init__(self, publication_id: int, topic: str, args: list = None, kwargs: dict = None):
+        self.time = time.monotonic()
+        self.topic = topic
+        self.fanouts = (broker.EventFanout(publication_id, {}, args, kwargs),
+                        broker.EventFanout(publication_id, {'topic': topic}, args, kwargs))
+
+    def frame(self, subscription: broker.Subscription, serializer_: serializer.Serializer) -> serializer.Payload:
+        """Return the EVENT frame of the publication for a subscription."""
+        fanout = self.fanouts[subscription.match != broker.MATCH_EXACT]
+        return fanout.frame(subscription.id, serializer_)
+
+
+class _TopicNode:
+    """A node of the trie of retained topics, keyed by URI component; topic is set on the node a topic ends at."""
+    __slots__ = ('children', 'topic')
+
+    def __init__(self):
+        self.children = {}  # type: dict
+        self.topic = None  # type: Optional[str]
+
+
+class History:
+    """
+    The retained publications of the topics of a realm.
+
+    Beyond max_topics retained topics, recording a new topic evicts the topic published to least recently. Retained
+    topics are indexed in a trie keyed by URI component, so finding those a pattern matches costs time proportional
+    to the part of the trie the pattern reaches rather than to the number of retained topics.
+    """
+
+    def __init__(self,
+                 topics_: Iterable[Tuple[str, str]],
+                 limit: int = 100,
+                 max_age: float = None,
+                 max_topics: int = 1000):
+        """
+        :param topics_: are the topics and topic patterns to retain publications of, as (uri, match) pairs.
+        :param limit: is the number of publications retained per topic.
+        :param max_age: is the number of seconds publications are retained for, by default until replaced.
+        :param max_topics: is the number of topics retained.
+        """
+        self.limit = limit
+        self.max_age = max_age
+        self.max_topics = max_topics
+        self._rules = broker.Broker()
+        for uri, match in topics_:
+            self._rules.subscribe(None, uri, match)
+        self._buffers = collections.OrderedDict()  # type: Dict[str, Deque[Publication]]
+        self._index = _TopicNode()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def topics(self) -> Iterable[str]:
+        """Return the topics with retained publications."""
+        return self._buffers.keys()
+
+    def record(self, publication_id: int, topic: str, args: list = None, kwargs: dict = None) -> Optional[Publication]:
+        """
+        Retain a publication if its topic has history.
+
+        :return: the retained publication, whose encoders the events delivered now can share, or None.
+        """
+        if not self._rules.match(topic):
+            return None
+
+        buffer = self._buffers.get(topic)
+        if buffer is None:
+            if len(self._buffers) >= self.max_topics:
+                self._unindex(self._buffers.popitem(last=False)[0])
+            buffer = self._buffers[topic] = collections.deque(maxlen=self.limit)
+            self._indexed(topic).topic = topic
+        else:
+            self._buffers.move_to_end(topic)
+            self._expire(buffer)
+
+        publication = Publication(publication_id, topic, args, kwargs)
+        buffer.append(publication)
+        return publication
+
+    def matching(self, uri: str, match: str = broker.MATCH_EXACT) -> List[str]:
+        """Return the retained topics matching a topic or pattern, with the semantics of Broker.match."""
+        if match == broker.MATCH_EXACT:
+            return [uri] if uri in self._buffers else []
+
+        topics_ = []  # type: List[str]
+        if match == broker.MATCH_PREFIX:
+            *path, last = uri.split('.')
+            node = self._index
+            for component in path:
+                node = node.children.get(component)
+                if node is None:
+                    return topics_
+            # Prefixes match by string, so the last component of the prefix may be the start of a topic component.
+            nodes = [child for component, child in node.children.items() if component.startswith(last)]
+            while nodes:
+                node = nodes.pop()
+                if node.topic is not None:
+                    topics_.append(node.topic)
+                nodes.extend(node.children.values())
+            return topics_
+
+        nodes = [self._index]
+        for component in uri.split('.'):
+            matched = []
+            for node in nodes:
+                if component:
+                    child = node.children.get(component)
+                    if child is not None:
+                        matched.append(child)
+                else:
+                    matched.extend(node.children.values())
+            nodes = matched
+        topics_.extend(node.topic for node in nodes if node.topic is not None)
+        return topics_
+
+    def publications(self, topics_: Iterable[str], limit: int = None, max_age: float = None) -> List[Publication]:
+        """
+        Return the retained publications of some topics, oldest first.
+
+        :param limit: is the number of most recent publications to return, by default all.
+        :param max_age: is the age in seconds of the oldest publication to return, by default any.
+        """
+        publications = []  # type: List[Publication]
+        for topic in topics_:
+            buffer = self._buffers.get(topic)
+            if buffer:
+                self._expire(buffer)
+                publications.extend(buffer)
+        publications.sort(key=lambda publication: publication.time)
+
+        if max_age is not None:
+            oldest = time.monotonic() - max_age
+            publications = [publication for publication in publications if publication.time >= oldest]
+        if limit is not None:
+            publications = publications[-limit:] if limit else []
+        return publications
+
+    def _indexed(self, topic: str) -> _TopicNode:
+        node = self._index
+        for component in topic.split('.'):
+            child = node.children.get(component)
+            if child is None:
+                child = node.children[component] = _TopicNode()
+            node = child
+        return node
+
+    def _unindex(self, topic: str):
+        """Remove a topic from the trie, pruning the nodes left without topics."""
+        path = [self._index]
+        components = topic.split('.')
+        for component in components:
+            path.append(path[-1].children[component])
+        path[-1].topic = None
+        for component, parent, node in zip(reversed(components), reversed(path[:-1]), reversed(path[1:])):
+            if node.children or node.topic is not None:
+                break
+            del parent.children[component]
+
+    def _expire(self, buffer: Deque[Publication]):
+        if self.max_age is not None:
+            oldest = time.monotonic() - self.max_age
+            while buffer and buffer[0].time < oldest:
+                buffer.popleft()
+
+
+@meta.procedure('wamp.subscription.get_events')
+def get_events(session, subscription_id: int, limit: int = None, max_age: float = None) -> serializer.RawPayload:
+    """
+    Return the retained events of a subscription of the calling session.
+
+    A prefix or wildcard subscription gets the events of every retained topic it matches.
+    """
+    if type(subscription_id) is not int:
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid subscription id %r' % subscription_id)
+    if limit is not None and (type(limit) is not int or limit < 0):
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid limit %r' % limit)
+    if max_age is not None and type(max_age) not in (int, float):
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid max_age %r' % max_age)
+
+    broker_ = session.realm.broker
+    subscription = broker_.subscriptions.get(subscription_id)
+    if subscription is None or session not in subscription.subscribers:
+        raise error.WampError(error.NO_SUCH_SUBSCRIPTION)
+
+    frames = []  # type: List[serializer.Payload]
+    history = broker_.history
+    if history is not None:
+        topics_ = history.matching(subscription.uri, subscription.match)
+        frames = [publication.frame(subscription, session.serializer)
+                  for publication in history.publications(topics_, limit, max_age)]
+
+    # The frames are already encoded, so the RESULT carries them as a raw payload of the session serializer.
+    serializer_ = session.serializer.serializer if session.serializer.batched else session.serializer
+    return serializer.RawPayload(serializer_, serializer_.array([serializer_.array(frames)]), 1)
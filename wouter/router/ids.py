@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+WAMP ID generation.
+
+IDs are integers in [1, 2 ** 53]. Global scope IDs (sessions, publications) are drawn at random; router scope IDs
+(subscriptions, registrations) and session scope IDs (requests) are sequential.
+"""
+import os
+import struct
+import threading
+from typing import Container
+
+MAX_ID = 2 ** 53
+
+_MASK = MAX_ID - 1
+
+
+class RandomIds:
+    """
+    Random IDs for global scope.
+
+    IDs are drawn from the operating system's random source in batches, so the cost of the system call is spread over
+    many IDs and taking one is a list pop.
+    """
+
+    def __init__(self, batch: int = 1024):
+        self.batch = batch
+        self._unpack = struct.Struct('>%dQ' % batch).unpack
+        self._pool = []
+
+    def _refill(self):
+        self._pool = [(n & _MASK) + 1 for n in self._unpack(os.urandom(8 * self.batch))]
+
+    def generate(self, live: Container[int] = ()) -> int:
+        """Return a random ID not in live."""
+        while True:
+            if not self._pool:
+                self._refill()
+            id_ = self._pool.pop()
+            if id_ not in live:
+                return id_
+
+
+class SequentialIds:
+    """Sequential IDs for router and session scope, starting from 1 and wrapping after 2 ** 53."""
+
+    def __init__(self):
+        self._next = 1
+
+    def generate(self, live: Container[int] = ()) -> int:
+        """Return the next ID not in live."""
+        while True:
+            id_ = self._next
+            self._next = id_ + 1 if id_ < MAX_ID else 1
+            if id_ not in live:
+                return id_
+
+
+class SharedIds:
+    """An ID generator used from the threads of every shard, which draw from it one at a time."""
+
+    def __init__(self, ids):
+        self._ids = ids
+        self._lock = threading.Lock()
+
+    def generate(self, live: Container[int] = ()) -> int:
+        with self._lock:
+            return self._ids.generate(live)
+
+
+# Shared by sessions and publications.
+global_ids = SharedIds(RandomIds())
+
+# Shared by subscriptions and registrations.
+router_ids = SharedIds(SequentialIds())
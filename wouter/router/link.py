@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Links between routers that share their realms.
+
+A link carries publications and calls between the routers at either end, so that the clients of one can receive the
+events and call the procedures of the clients of the other. Each router announces the procedures its own clients
+register; the other router adds a Peer to their registrations as a proxy callee, so calls cross the link like any
+other invocation, policies and timeouts included.
+
+Each router also announces the topics and patterns its own clients subscribe to. The other router keeps them as an
+interest summary, indexed by a Broker of its own, and only sends a publication over the link when the summary matches
+its topic.
+
+Routers are linked in a full mesh: messages received over a link are only routed to local clients, never forwarded
+over another link. The worker processes of one router link to each other over Unix domain sockets; the nodes of a
+cluster link over TCP.
+
+A TCP link is authenticated with a secret shared by the nodes of the cluster: the accepting router sends a random
+challenge and the connecting router answers with its HMAC-SHA256 under the secret. Neither router announces its
+clients or handles their messages until the link is authenticated, and a router closes the link on a frame longer than
+its maximum length.
+
+Link messages are msgpack arrays framed with a 4 octet length:
+    [CHALLENGE, challenge]
+    [AUTHENTICATE, signature]
+    [REGISTER, realm, procedure, invoke]
+    [UNREGISTER, realm, procedure]
+    [SUBSCRIBE, realm, topic, match]
+    [UNSUBSCRIBE, realm, topic, match]
+    [PUBLISH, realm, publication_id, topic, args, kwargs]
+    [CALL, realm, request_id, procedure, args, kwargs]
+    [RESULT, realm, request_id, args, kwargs]
+    [ERROR, realm, request_id, error, details, args, kwargs]
+"""
+import asyncio
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import struct
+from typing import Callable, Dict, Optional, Set  # noqa: F401
+
+from wouter.router import broker
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import message
+from wouter.router import realm
+from wouter.router import serializer
+
+logger = logging.getLogger(__name__)
+
+# Link message types.
+REGISTER = 1
+UNREGISTER = 2
+PUBLISH = 3
+CALL = 4
+RESULT = 5
+ERROR = 6
+SUBSCRIBE = 7
+UNSUBSCRIBE = 8
+CHALLENGE = 9
+AUTHENTICATE = 10
+
+_header = struct.Struct('>I')
+
+# The longest frame accepted by default, in octets.
+MAX_LENGTH = 16 * 1024 * 1024
+
+# Open links to other routers.
+links = set()  # type: Set[Link]
+
+
+def has_local_callees(registration) -> bool:
+    """Return whether a registration has callees other than the peers of links."""
+    return any(not callee.peer for callee in registration.callees)
+
+
+class Peer:
+    """Stands in for the clients of the router at the other end of a link, as the caller and callee of a realm."""
+    peer = True
+
+    def __init__(self, link: 'Link', realm_: realm.Realm):
+        self.link = link
+        self.realm = realm_
+        self.request_ids = ids.SequentialIds()
+        # The topics and patterns the remote clients subscribe to.
+        self.interest = broker.Broker()
+
+    def send(self, msg: message.Message):
+        """Forward an invocation of a remote callee, or the answer to a remote caller, over the link."""
+        name = self.realm.name
+        args, kwargs = serializer.decode_payload(msg.args, msg.kwargs)
+        if msg.type is message.Type.INVOCATION:
+            procedure = self.realm.dealer.registrations[msg.registration_id].procedure
+            self.link.send([CALL, name, msg.request_id, procedure, args, kwargs])
+        elif msg.type is message.Type.RESULT:
+            self.link.send([RESULT, name, msg.request_id, args, kwargs])
+        elif msg.type is message.Type.ERROR:
+            self.link.send([ERROR, name, msg.request_id, msg.error, msg.details, args, kwargs])
+
+
+class Link(asyncio.Protocol):
+    """One end of a link between two routers."""
+
+    def __init__(self, secret: Optional[bytes] = None, accepting: bool = False, max_length: int = MAX_LENGTH):
+        """
+        :param secret: is shared by the routers at either end; without one the link is not authenticated.
+        :param accepting: is whether this end accepted the link, and so challenges the other end.
+        :param max_length: is the longest frame accepted, in octets.
+        """
+        self.secret = secret
+        self.accepting = accepting
+        self.max_length = max_length
+        self.authenticated = secret is None
+        self.transport = None  # type: Optional[asyncio.Transport]
+        self.peers = {}  # type: Dict[str, Peer]
+        self.closed = asyncio.Future()
+        self._buffer = bytearray()
+        self._challenge = b''
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        if self.authenticated:
+            self._open()
+        elif self.accepting:
+            self._challenge = os.urandom(32)
+            self.send([CHALLENGE, self._challenge])
+
+    def _open(self):
+        """Start routing over the link, announcing the registrations and subscriptions of local clients."""
+        links.add(self)
+        for _, realm_ in realm.items():
+            for registration in realm_.dealer.registrations.values():
+                if has_local_callees(registration):
+                    self.register(realm_, registration)
+            for subscription in realm_.broker.subscriptions.values():
+                self.subscribe(realm_, subscription)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        links.discard(self)
+        if not self.closed.done():
+            self.closed.set_result(None)
+        for peer in self.peers.values():
+            dealer_ = peer.realm.dealer
+            dealer_.detach(peer)
+            for registration in list(dealer_.registrations.values()):
+                dealer_.unregister(peer, registration.id)
+        self.peers.clear()
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        while len(self._buffer) >= _header.size:
+            length, = _header.unpack_from(self._buffer)
+            if length > self.max_length:
+                logger.warning('link message exceeds maximum length of %d, closing link', self.max_length)
+                self.transport.close()
+                return
+            if len(self._buffer) < _header.size + length:
+                return
+            payload = bytes(self._buffer[_header.size:_header.size + length])
+            del self._buffer[:_header.size + length]
+
+            try:
+                msg = serializer.MSGPACK.unserialize(payload)
+                if not self.authenticated:
+                    if not self._authenticate(*msg):
+                        logger.warning('link authentication failed, closing link')
+                        self.transport.close()
+                        return
+                    continue
+                _handlers[msg[0]](self, self.peer(msg[1]), *msg[2:])
+            except (ValueError, TypeError, LookupError, error.WampError):
+                logger.exception('invalid link message, closing link')
+                self.transport.close()
+                return
+
+    def _sign(self, challenge: bytes) -> bytes:
+        return hmac.new(self.secret, challenge, hashlib.sha256).digest()
+
+    def _authenticate(self, type_: int, value: bytes) -> bool:
+        """Check the answer to the challenge of this end, or answer the challenge of the accepting end."""
+        if self.accepting:
+            if type_ != AUTHENTICATE or not hmac.compare_digest(value, self._sign(self._challenge)):
+                return False
+        else:
+            if type_ != CHALLENGE:
+                return False
+            self.send([AUTHENTICATE, self._sign(value)])
+        self.authenticated = True
+        self._open()
+        return True
+
+    def send(self, msg: list):
+        payload = serializer.MSGPACK.serialize(msg)
+        self.transport.write(_header.pack(len(payload)) + payload)
+
+    def peer(self, name: str) -> Peer:
+        """Return the stand-in for the remote clients of a realm."""
+        peer = self.peers.get(name)
+        if peer is None:
+            peer = self.peers[name] = Peer(self, realm.get(name))
+        return peer
+
+    # Announcements of local clients.
+
+    def register(self, realm_: realm.Realm, registration):
+        self.send([REGISTER, realm_.name, registration.procedure, registration.callees.invoke])
+
+    def unregister(self, realm_: realm.Realm, procedure: str):
+        self.send([UNREGISTER, realm_.name, procedure])
+
+    def subscribe(self, realm_: realm.Realm, subscription: broker.Subscription):
+        self.send([SUBSCRIBE, realm_.name, subscription.uri, subscription.match])
+
+    def unsubscribe(self, realm_: realm.Realm, subscription: broker.Subscription):
+        self.send([UNSUBSCRIBE, realm_.name, subscription.uri, subscription.match])
+
+    def publish(self, realm_: realm.Realm, publication_id: int, publish: message.Publish):
+        """Forward a publication if the remote router has subscribers to its topic."""
+        peer = self.peers.get(realm_.name)
+        if peer is None or not peer.interest.match(publish.topic):
+            return
+        args, kwargs = serializer.decode_payload(publish.args, publish.kwargs)
+        self.send([PUBLISH, realm_.name, publication_id, publish.topic, args, kwargs])
+
+    # Messages from the remote router.
+
+    def _on_register(self, peer: Peer, procedure: str, invoke: str):
+        registration = peer.realm.dealer.lookup(procedure)
+        if registration is not None and peer in registration.callees:
+            return
+        try:
+            peer.realm.dealer.register(peer, procedure, invoke)
+        except error.WampError as e:
+            logger.warning('cannot register remote procedure %s: %s', procedure, e.error)
+
+    def _on_unregister(self, peer: Peer, procedure: str):
+        registration = peer.realm.dealer.lookup(procedure)
+        if registration is not None:
+            peer.realm.dealer.unregister(peer, registration.id)
+
+    def _on_subscribe(self, peer: Peer, topic: str, match: str):
+        peer.interest.subscribe(peer, topic, match)
+
+    def _on_unsubscribe(self, peer: Peer, topic: str, match: str):
+        subscription = peer.interest.lookup(topic, match)
+        if subscription is not None:
+            peer.interest.unsubscribe(peer, subscription.id)
+
+    def _on_publish(self, peer: Peer, publication_id: int, topic: str, args: list, kwargs: dict):
+        peer.realm.broker.dispatch(publication_id, topic, args, kwargs)
+
+    def _on_call(self, peer: Peer, request_id: int, procedure: str, args: list, kwargs: dict):
+        try:
+            peer.realm.dealer.call(peer, message.Call(request_id=request_id,
+                                                      options={},
+                                                      procedure=procedure,
+                                                      args=args,
+                                                      kwargs=kwargs))
+        except error.WampError as e:
+            self.send([ERROR, peer.realm.name, request_id, e.error, e.details(), None, None])
+
+    def _on_result(self, peer: Peer, request_id: int, args: list, kwargs: dict):
+        peer.realm.dealer.yield_(peer, message.Yield(request_id=request_id, options={}, args=args, kwargs=kwargs))
+
+    def _on_error(self, peer: Peer, request_id: int, error_: str, details: dict, args: list, kwargs: dict):
+        peer.realm.dealer.error(peer, message.Error(request_type=message.Type.INVOCATION,
+                                                    request_id=request_id,
+                                                    details=details,
+                                                    error=error_,
+                                                    args=args,
+                                                    kwargs=kwargs))
+
+
+# Handlers of the messages received over a link.
+_handlers = {
+    REGISTER: Link._on_register,
+    UNREGISTER: Link._on_unregister,
+    PUBLISH: Link._on_publish,
+    CALL: Link._on_call,
+    RESULT: Link._on_result,
+    ERROR: Link._on_error,
+    SUBSCRIBE: Link._on_subscribe,
+    UNSUBSCRIBE: Link._on_unsubscribe,
+}  # type: Dict[int, Callable[..., None]]
+
+
+def start_link(host: str = 'localhost', port: int = 9002, secret: Optional[bytes] = None,
+               max_length: int = MAX_LENGTH):
+    """Return a coroutine that accepts links from other routers on a TCP port, authenticated by a shared secret."""
+    factory = functools.partial(Link, secret, True, max_length)
+    return asyncio.get_event_loop().create_server(factory, host, port)
+
+
+async def keep_link(host: str, port: int, delay: float = 1.0, secret: Optional[bytes] = None,
+                    max_length: int = MAX_LENGTH):
+    """Link to the router listening on a TCP port, and link again whenever the link is lost."""
+    loop = asyncio.get_event_loop()
+    factory = functools.partial(Link, secret, False, max_length)
+    while True:
+        try:
+            _, link_ = await loop.create_connection(factory, host, port)
+        except OSError as e:
+            logger.warning('cannot link to %s:%s: %s', host, port, e)
+        else:
+            logger.info('linked to %s:%s', host, port)
+            await link_.closed
+            logger.warning('link to %s:%s lost', host, port)
+        await asyncio.sleep(delay)
+
+
+def start_link_unix(path: str):
+    """Return a coroutine that accepts links from other routers on a Unix domain socket."""
+    return asyncio.get_event_loop().create_unix_server(Link, path)
+
+
+async def connect_link_unix(path: str, attempts: int = 100, delay: float = 0.05):
+    """Link to the router listening on a Unix domain socket, waiting for it to start listening."""
+    loop = asyncio.get_event_loop()
+    for attempt in range(attempts):
+        try:
+            return await loop.create_unix_connection(Link, path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(delay)
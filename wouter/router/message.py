@@ -17,6 +17,9 @@
 
 import enum
 import abc
+from typing import Dict, Tuple  # noqa: F401
+
+from wouter.router.serializer import RawPayload
 
 
 @enum.unique
@@ -24,6 +27,8 @@ class Type(enum.Enum):
     HELLO = 1
     WELCOME = 2
     ABORT = 3
+    CHALLENGE = 4
+    AUTHENTICATE = 5
     GOODBYE = 6
     ERROR = 8
     PUBLISH = 16
@@ -43,16 +48,42 @@ class Type(enum.Enum):
     YIELD = 70
 
 
-class Message(abc.ABC):
-    type = ...  # type: Type
+# Roles a client may announce in HELLO, and a router in WELCOME.
+CLIENT_ROLES = frozenset(('publisher', 'subscriber', 'caller', 'callee'))
+ROUTER_ROLES = frozenset(('broker', 'dealer'))
+
+# Index of the args element of the messages whose application payload a router forwards without inspecting it.
+PAYLOAD_INDEX = {
+    Type.ERROR.value: 5,
+    Type.PUBLISH.value: 4,
+    Type.CALL.value: 4,
+    Type.YIELD.value: 3,
+}
 
-    def __init__(self, type_: Type):
-        self.type = type_
+
+class Message(metaclass=abc.ABCMeta):
+    """
+    Base class of all WAMP messages.
+
+    Messages are created per delivery (one Event per subscriber on publish), so every subclass declares __slots__ for
+    its fields and keeps its Type as a class attribute rather than per instance.
+    """
+    __slots__ = ()
+
+    type = ...  # type: Type
 
     @classmethod
-    @abc.abstractmethod
     def unmarshal(cls, msg: list):
-        pass
+        """
+        Decode a raw message list into an instance of this class.
+
+        :param msg: the unserialized message, type code first.
+        :raises ValueError: if the message is malformed or of another type.
+        """
+        decoded = decode(msg)
+        if type(decoded) is not cls:
+            raise ValueError('Invalid message')
+        return decoded
 
     @abc.abstractmethod
     def marshal(self) -> list:
@@ -60,8 +91,9 @@ class Message(abc.ABC):
 
 
 class Hello(Message):
-    realm = ...  # type: str
-    details = ...  # type: dict
+    __slots__ = ('realm', 'details')
+
+    type = Type.HELLO
 
     def __init__(self, realm: str, details: dict):
         """
@@ -79,31 +111,24 @@ class Hello(Message):
                 - callee
             A Client can support any combination of the above roles but must support at least one role.
         """
-        Message.__init__(self, type_=Type.HELLO)
         self.realm = realm
 
         if details.get('roles'):
-            if all(r in ['publisher', 'subscriber', 'caller', 'callee'] for r in details['roles']):
+            if type(details['roles']) is dict and CLIENT_ROLES.issuperset(details['roles']):
                 self.details = details
             else:
                 raise ValueError('Invalid message roles')
         else:
             raise ValueError('Invalid message details')
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.HELLO.value:
-            return cls(realm=msg[1], details=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.realm, self.details]
 
 
 class Welcome(Message):
-    session = ...  # type: int
-    details = ...  # type: dict
+    __slots__ = ('session', 'details')
+
+    type = Type.WELCOME
 
     def __init__(self, session: int, details: dict):
         """
@@ -117,28 +142,21 @@ class Welcome(Message):
                 - dealer
             A Router must support at least one role, and MAY support both roles.
         """
-        Message.__init__(self, type_=Type.WELCOME)
         self.session = session
 
-        if details.get('roles') and all(r in ['dealer', 'broker'] for r in details['roles']):
+        if details.get('roles') and ROUTER_ROLES.issuperset(details['roles']):
             self.details = details
         else:
             raise ValueError('Invalid message details')
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.WELCOME.value:
-            return cls(session=msg[1], details=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.session, self.details]
 
 
 class Abort(Message):
-    details = ...  # type: dict
-    reason = ...  # type: str
+    __slots__ = ('details', 'reason')
+
+    type = Type.ABORT
 
     def __init__(self, details: dict, reason: str):
         """
@@ -147,23 +165,57 @@ class Abort(Message):
         :param details: MUST be a dictionary that allows to provide additional, optional closing information.
         :param reason: MUST be an URI.
         """
-        Message.__init__(self, type_=Type.ABORT)
         self.details = details
         self.reason = reason
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.ABORT.value:
-            return cls(details=msg[1], reason=msg[2])
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.details, self.reason]
 
 
+class Challenge(Message):
+    __slots__ = ('authmethod', 'extra')
+
+    type = Type.CHALLENGE
+
+    def __init__(self, authmethod: str, extra: dict):
+        """
+        Sent by a Router to a Client that must authenticate before the session is established.
+
+        :param authmethod: is the authentication method the Router selected from those announced in HELLO.
+        :param extra: is a dictionary of method specific information, such as the challenge to sign.
+        """
+        self.authmethod = authmethod
+        self.extra = extra
+
+    def marshal(self) -> list:
+        return [self.type.value, self.authmethod, self.extra]
+
+
+class Authenticate(Message):
+    __slots__ = ('signature', 'extra')
+
+    type = Type.AUTHENTICATE
+
+    def __init__(self, signature: str, extra: dict):
+        """
+        Sent by a Client in reply to a CHALLENGE.
+
+        :param signature: is the signature of the challenge, or the ticket itself, depending on the method.
+        :param extra: is a dictionary of method specific information.
+        """
+        if type(signature) is not str:
+            raise ValueError('Invalid message signature')
+        self.signature = signature
+        self.extra = extra
+
+    def marshal(self) -> list:
+        return [self.type.value, self.signature, self.extra]
+
+
 class Goodbye(Message):
-    details = ...  # type: dict
-    reason = ...  # type: str
+    __slots__ = ('details', 'reason')
+
+    type = Type.GOODBYE
 
     def __init__(self, details: dict, reason: str):
         """
@@ -172,27 +224,17 @@ class Goodbye(Message):
         :param details: MUST be a dictionary that allows to provide additional, optional closing information
         :param reason: MUST be an URI.
         """
-        Message.__init__(self, type_=Type.GOODBYE)
         self.details = details
         self.reason = reason
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.GOODBYE.value:
-            return cls(details=msg[1], reason=msg[2])
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.details, self.reason]
 
 
 class Error(Message):
-    request_type = ...  # type: Type
-    request_id = ...  # type: int
-    details = ...  # type: dict
-    error = ...  # type: str
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_type', 'request_id', 'details', 'error', 'args', 'kwargs')
+
+    type = Type.ERROR
 
     def __init__(self,
                  request_type: Type,
@@ -204,7 +246,7 @@ class Error(Message):
         """
         Error reply sent by a Peer as an error response to different kinds of requests.
 
-        :param request_type: MUST be the TYPE of the original request.
+        :param request_type: MUST be the TYPE of the original request, as a Type or its integer code.
         :param request_id: MUST be the ID from the original request.
         :param details: is a dictionary with additional error details.
         :param error: is an URI that identifies the error of why the request could not be fulfilled.
@@ -213,25 +255,13 @@ class Error(Message):
         :param kwargs: is a dictionary containing arbitrary, application defined, keyword-based error information.
             This will be forwarded by the Dealer to the Caller that initiated the call.
         """
-        Message.__init__(self, type_=Type.ERROR)
-        self.request_type = request_type
+        self.request_type = Type(request_type)
         self.request_id = request_id
         self.details = details
         self.error = error
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.ERROR.value:
-            if len(msg) > 6:
-                return cls(request_type=Type(msg[1]), request_id=msg[2], details=msg[3], error=msg[4], args=msg[5],
-                           kwargs=msg[6])
-            elif len(msg) > 5:
-                return cls(request_type=Type(msg[1]), request_id=msg[2], details=msg[3], error=msg[4], args=msg[5])
-            elif len(msg) > 4:
-                return cls(request_type=Type(msg[1]), request_id=msg[2], details=msg[3], error=msg[4])
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_type.value, self.request_id, self.details, self.error, self.args,
@@ -243,11 +273,9 @@ class Error(Message):
 
 
 class Publish(Message):
-    request_id = ...  # type: int
-    options = ...  # type: dict
-    topic = ...  # str
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_id', 'options', 'topic', 'args', 'kwargs')
+
+    type = Type.PUBLISH
 
     def __init__(self, request_id: int, options: dict, topic: str, args: list = None, kwargs: dict = None):
         """
@@ -262,25 +290,12 @@ class Publish(Message):
         :param kwargs: is an optional dictionary containing application-level event payload, provided as keyword
             arguments. The dictionary may be empty.
         """
-        Message.__init__(self, type_=Type.PUBLISH)
         self.request_id = request_id
         self.options = options
         self.topic = topic
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.PUBLISH.value:
-            if len(msg) > 5:
-                return cls(request_id=msg[1], options=msg[2], topic=msg[3], args=msg[4], kwargs=msg[5])
-            elif len(msg) > 4:
-                return cls(request_id=msg[1], options=msg[2], topic=msg[3], args=msg[4])
-            elif len(msg) > 3:
-                return cls(request_id=msg[1], options=msg[2], topic=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_id, self.options, self.topic, self.args, self.kwargs]
@@ -291,8 +306,9 @@ class Publish(Message):
 
 
 class Published(Message):
-    request_id = ...  # type: int
-    publication_id = ...  # type: int
+    __slots__ = ('request_id', 'publication_id')
+
+    type = Type.PUBLISHED
 
     def __init__(self, request_id: int, publication_id: int):
         """
@@ -301,25 +317,17 @@ class Published(Message):
         :param request_id: is the ID from the original publication request.
         :param publication_id: is a ID chosen by the Broker for the publication.
         """
-        Message.__init__(self, type_=Type.PUBLISHED)
         self.request_id = request_id
         self.publication_id = publication_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.PUBLISHED.value:
-            return cls(request_id=msg[1], publication_id=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.publication_id]
 
 
 class Subscribe(Message):
-    request_id = ...  # type: int
-    options = ...  # type: dict
-    topic = ...  # type: str
+    __slots__ = ('request_id', 'options', 'topic')
+
+    type = Type.SUBSCRIBE
 
     def __init__(self, request_id: int, options: dict, topic: str):
         """
@@ -331,28 +339,18 @@ class Subscribe(Message):
             extensible way. This is described further below.
         :param topic: is the topic the Subscriber wants to subscribe to and MUST be an URI.
         """
-        Message.__init__(self, type_=Type.SUBSCRIBE)
         self.request_id = request_id
         self.options = options
         self.topic = topic
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.SUBSCRIBE.value:
-            return cls(request_id=msg[1], options=msg[2], topic=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.options, self.topic]
 
 
 class Subscribed(Message):
-    """
+    __slots__ = ('request_id', 'subscription_id')
 
-    """
-    request_id = ...  # type: int
-    subscription_id = ...  # type: int
+    type = Type.SUBSCRIBED
 
     def __init__(self, request_id: int, subscription_id: int):
         """
@@ -362,24 +360,17 @@ class Subscribed(Message):
         :param request_id: MUST be the ID from the original request.
         :param subscription_id: MUST be an ID chosen by the Broker for the subscription.
         """
-        Message.__init__(self, type_=Type.SUBSCRIBED)
         self.request_id = request_id
         self.subscription_id = subscription_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.SUBSCRIBED.value:
-            return cls(request_id=msg[1], subscription_id=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.subscription_id]
 
 
 class Unsubscribe(Message):
-    request_id = ...  # type: int
-    subscription_id = ...  # type: int
+    __slots__ = ('request_id', 'subscription_id')
+
+    type = Type.UNSUBSCRIBE
 
     def __init__(self, request_id: int, subscription_id: int):
         """
@@ -391,23 +382,17 @@ class Unsubscribe(Message):
         :param subscription_id: MUST be the ID for the subscription to unsubscribe from, originally handed out by the
             Broker to the Subscriber.
         """
-        Message.__init__(self, type_=Type.UNSUBSCRIBE)
         self.request_id = request_id
         self.subscription_id = subscription_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.UNSUBSCRIBE.value:
-            return cls(request_id=msg[1], subscription_id=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.subscription_id]
 
 
 class Unsubscribed(Message):
-    request_id = ...  # type: int
+    __slots__ = ('request_id',)
+
+    type = Type.UNSUBSCRIBED
 
     def __init__(self, request_id: int):
         """
@@ -415,26 +400,16 @@ class Unsubscribed(Message):
 
         :param request_id: MUST be the ID from the original request.
         """
-        Message.__init__(self, type_=Type.UNSUBSCRIBED)
         self.request_id = request_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.UNSUBSCRIBED.value:
-            return cls(request_id=msg[1])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id]
 
 
 class Event(Message):
-    subscription_id = ...  # type: int
-    publication_id = ...  # type: int
-    details = ...  # type: dict
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('subscription_id', 'publication_id', 'details', 'args', 'kwargs')
+
+    type = Type.EVENT
 
     def __init__(self, subscription_id: int, publication_id: int, details: dict, args: list = None,
                  kwargs: dict = None):
@@ -453,25 +428,12 @@ class Event(Message):
         :param args: is the application-level event payload that was provided with the original publication request.
         :param kwargs: is the application-level event payload that was provided with the original publication request.
         """
-        Message.__init__(self, type_=Type.EVENT)
         self.subscription_id = subscription_id
         self.publication_id = publication_id
         self.details = details
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.EVENT.value:
-            if len(msg) > 5:
-                return cls(subscription_id=msg[1], publication_id=msg[2], details=msg[3], args=msg[4], kwargs=msg[5])
-            elif len(msg) > 4:
-                return cls(subscription_id=msg[1], publication_id=msg[2], details=msg[3], args=msg[4])
-            elif len(msg) > 3:
-                return cls(subscription_id=msg[1], publication_id=msg[2], details=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.subscription_id, self.publication_id, self.details, self.args, self.kwargs]
@@ -482,11 +444,9 @@ class Event(Message):
 
 
 class Call(Message):
-    request_id = ...  # type: int
-    options = ...  # type: dict
-    procedure = ...  # type: str
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_id', 'options', 'procedure', 'args', 'kwargs')
+
+    type = Type.CALL
 
     def __init__(self, request_id: int, options: dict, procedure: str, args: list = None, kwargs: dict = None):
         """
@@ -500,25 +460,12 @@ class Call(Message):
         :param args: is a list of positional call arguments (each of arbitrary type). The list may be of zero length.
         :param kwargs: is a dictionary of keyword call arguments (each of arbitrary type). The dictionary may be empty.
         """
-        Message.__init__(self, type_=Type.CALL)
         self.request_id = request_id
         self.options = options
         self.procedure = procedure
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.CALL.value:
-            if len(msg) > 5:
-                return cls(request_id=msg[1], options=msg[2], procedure=msg[3], args=msg[4], kwargs=msg[5])
-            elif len(msg) > 4:
-                return cls(request_id=msg[1], options=msg[2], procedure=msg[3], args=msg[4])
-            elif len(msg) > 3:
-                return cls(request_id=msg[1], options=msg[2], procedure=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_id, self.options, self.procedure, self.args, self.kwargs]
@@ -529,10 +476,9 @@ class Call(Message):
 
 
 class Result(Message):
-    request_id = ...  # type: int
-    details = ...  # type: dict
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_id', 'details', 'args', 'kwargs')
+
+    type = Type.RESULT
 
     def __init__(self, request_id: int, details: dict, args: list = None, kwargs: dict = None):
         """
@@ -543,24 +489,11 @@ class Result(Message):
         :param args: is the original list of positional result elements as returned by the Callee.
         :param kwargs: is the original dictionary of keyword result elements as returned by the Callee.
         """
-        Message.__init__(self, type_=Type.RESULT)
         self.request_id = request_id
         self.details = details
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.RESULT.value:
-            if len(msg) > 4:
-                return cls(request_id=msg[1], details=msg[2], args=msg[3], kwargs=msg[4])
-            elif len(msg) > 3:
-                return cls(request_id=msg[1], details=msg[2], args=msg[3])
-            elif len(msg) > 2:
-                return cls(request_id=msg[1], details=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_id, self.details, self.args, self.kwargs]
@@ -571,9 +504,9 @@ class Result(Message):
 
 
 class Register(Message):
-    request_id = ...  # type: int
-    options = ...  # type: dict
-    procedure = ...  # type: str
+    __slots__ = ('request_id', 'options', 'procedure')
+
+    type = Type.REGISTER
 
     def __init__(self, request_id: int, options: dict, procedure: str):
         """
@@ -586,25 +519,18 @@ class Register(Message):
             way. This is described further below.
         :param procedure: is the procedure the Callee wants to register
         """
-        Message.__init__(self, type_=Type.REGISTER)
         self.request_id = request_id
         self.options = options
         self.procedure = procedure
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.REGISTER.value:
-            return cls(request_id=msg[1], options=msg[2], procedure=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.options, self.procedure]
 
 
 class Registered(Message):
-    request_id = ...  # type: int
-    registration_id = ...  # type: int
+    __slots__ = ('request_id', 'registration_id')
+
+    type = Type.REGISTERED
 
     def __init__(self, request_id: int, registration_id: int):
         """
@@ -614,24 +540,17 @@ class Registered(Message):
         :param request_id: is the ID from the original request.
         :param registration_id: is an ID chosen by the Dealer for the registration.
         """
-        Message.__init__(self, type_=Type.REGISTERED)
         self.request_id = request_id
         self.registration_id = registration_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.REGISTERED.value:
-            return cls(request_id=msg[1], registration_id=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.registration_id]
 
 
 class Unregister(Message):
-    request_id = ...  # type: int
-    registration_id = ...  # type: int
+    __slots__ = ('request_id', 'registration_id')
+
+    type = Type.UNREGISTER
 
     def __init__(self, request_id: int, registration_id: int):
         """
@@ -643,23 +562,17 @@ class Unregister(Message):
         :param registration_id: is the ID for the registration to revoke, originally handed out by the Dealer to the
             Callee.
         """
-        Message.__init__(self, type_=Type.UNREGISTER)
         self.request_id = request_id
         self.registration_id = registration_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.UNREGISTER.value:
-            return cls(request_id=msg[1], registration_id=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id, self.registration_id]
 
 
 class Unregistered(Message):
-    request_id = ...  # type: int
+    __slots__ = ('request_id',)
+
+    type = Type.UNREGISTERED
 
     def __init__(self, request_id: int):
         """
@@ -667,26 +580,16 @@ class Unregistered(Message):
 
         :param request_id: is the ID from the original request.
         """
-        Message.__init__(self, type_=Type.UNREGISTERED)
         self.request_id = request_id
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.UNREGISTERED.value:
-            return cls(request_id=msg[1])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         return [self.type.value, self.request_id]
 
 
 class Invocation(Message):
-    request_id = ...  # type: int
-    registration_id = ...  # type: int
-    details = ...  # type: dict
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_id', 'registration_id', 'details', 'args', 'kwargs')
+
+    type = Type.INVOCATION
 
     def __init__(self, request_id: int, registration_id: int, details: dict, args: list = None,
                  kwargs: dict = None):
@@ -702,25 +605,12 @@ class Invocation(Message):
         :param args: is the original list of positional call arguments as provided by the Caller.
         :param kwargs: is the original dictionary of keyword call arguments as provided by the Caller.
         """
-        Message.__init__(self, type_=Type.INVOCATION)
         self.request_id = request_id
         self.registration_id = registration_id
         self.details = details
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.INVOCATION.value:
-            if len(msg) > 5:
-                return cls(request_id=msg[1], registration_id=msg[2], details=msg[3], args=msg[4], kwargs=msg[5])
-            elif len(msg) > 4:
-                return cls(request_id=msg[1], registration_id=msg[2], details=msg[3], args=msg[4])
-            elif len(msg) > 3:
-                return cls(request_id=msg[1], registration_id=msg[2], details=msg[3])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_id, self.registration_id, self.details, self.args, self.kwargs]
@@ -731,10 +621,9 @@ class Invocation(Message):
 
 
 class Yield(Message):
-    request_id = ...  # type: int
-    options = ...  # type: dict
-    args = ...  # type: list
-    kwargs = ...  # type: dict
+    __slots__ = ('request_id', 'options', 'args', 'kwargs')
+
+    type = Type.YIELD
 
     def __init__(self, request_id: int, options: dict, args: list = None, kwargs: dict = None):
         """
@@ -746,24 +635,11 @@ class Yield(Message):
         :param args: is a list of positional result elements (each of arbitrary type). The list may be of zero length.
         :param kwargs: is a dictionary of keyword result elements (each of arbitrary type). The dictionary may be empty.
         """
-        Message.__init__(self, type_=Type.YIELD)
         self.request_id = request_id
         self.options = options
         self.args = args
         self.kwargs = kwargs
 
-    @classmethod
-    def unmarshal(cls, msg: list):
-        if msg[0] == Type.YIELD.value:
-            if len(msg) > 4:
-                return cls(request_id=msg[1], options=msg[2], args=msg[3], kwargs=msg[4])
-            elif len(msg) > 3:
-                return cls(request_id=msg[1], options=msg[2], args=msg[3])
-            elif len(msg) > 2:
-                return cls(request_id=msg[1], options=msg[2])
-
-        raise ValueError('Invalid message')
-
     def marshal(self) -> list:
         if self.kwargs:
             return [self.type.value, self.request_id, self.options, self.args, self.kwargs]
@@ -771,3 +647,61 @@ class Yield(Message):
             return [self.type.value, self.request_id, self.options, self.args]
         else:
             return [self.type.value, self.request_id, self.options]
+
+
+# Accepted types of each field. Args are a list, or a RawPayload holding args and kwargs still encoded.
+_ID = (int,)
+_DICT = (dict,)
+_STR = (str,)
+_ARGS = (list, RawPayload)
+
+# Field layouts keyed on the integer type code: (class, minimum length, maximum length, field types). Lengths include
+# the type code and optional trailing args/kwargs, so the positional elements map directly onto each constructor.
+_layouts = {
+    Type.HELLO.value: (Hello, 3, 3, (_STR, _DICT)),
+    Type.WELCOME.value: (Welcome, 3, 3, (_ID, _DICT)),
+    Type.ABORT.value: (Abort, 3, 3, (_DICT, _STR)),
+    Type.CHALLENGE.value: (Challenge, 3, 3, (_STR, _DICT)),
+    Type.AUTHENTICATE.value: (Authenticate, 3, 3, (_STR, _DICT)),
+    Type.GOODBYE.value: (Goodbye, 3, 3, (_DICT, _STR)),
+    Type.ERROR.value: (Error, 5, 7, (_ID, _ID, _DICT, _STR, _ARGS, _DICT)),
+    Type.PUBLISH.value: (Publish, 4, 6, (_ID, _DICT, _STR, _ARGS, _DICT)),
+    Type.PUBLISHED.value: (Published, 3, 3, (_ID, _ID)),
+    Type.SUBSCRIBE.value: (Subscribe, 4, 4, (_ID, _DICT, _STR)),
+    Type.SUBSCRIBED.value: (Subscribed, 3, 3, (_ID, _ID)),
+    Type.UNSUBSCRIBE.value: (Unsubscribe, 3, 3, (_ID, _ID)),
+    Type.UNSUBSCRIBED.value: (Unsubscribed, 2, 2, (_ID,)),
+    Type.EVENT.value: (Event, 4, 6, (_ID, _ID, _DICT, _ARGS, _DICT)),
+    Type.CALL.value: (Call, 4, 6, (_ID, _DICT, _STR, _ARGS, _DICT)),
+    Type.RESULT.value: (Result, 3, 5, (_ID, _DICT, _ARGS, _DICT)),
+    Type.REGISTER.value: (Register, 4, 4, (_ID, _DICT, _STR)),
+    Type.REGISTERED.value: (Registered, 3, 3, (_ID, _ID)),
+    Type.UNREGISTER.value: (Unregister, 3, 3, (_ID, _ID)),
+    Type.UNREGISTERED.value: (Unregistered, 2, 2, (_ID,)),
+    Type.INVOCATION.value: (Invocation, 4, 6, (_ID, _ID, _DICT, _ARGS, _DICT)),
+    Type.YIELD.value: (Yield, 3, 5, (_ID, _DICT, _ARGS, _DICT)),
+}  # type: Dict[int, Tuple[type, int, int, tuple]]
+
+
+def decode(msg: list) -> Message:
+    """
+    Decode a raw message list into the Message subclass selected by its type code.
+
+    Dispatch is a single dict lookup on the type code followed by a length check against the precomputed layout, so
+    the caller does not need to know the message class in advance.
+
+    :param msg: the unserialized message, type code first.
+    :raises ValueError: if the type code is unknown, or the message length or a field type does not match its layout.
+    """
+    layout = _layouts.get(msg[0]) if msg and type(msg[0]) is int else None
+    if layout is None:
+        raise ValueError('Invalid message type')
+
+    cls, min_length, max_length, field_types = layout
+    if not min_length <= len(msg) <= max_length:
+        raise ValueError('Invalid message length')
+    for value, types in zip(msg[1:], field_types):
+        if type(value) not in types:
+            raise ValueError('Invalid message field')
+
+    return cls(*msg[1:])
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Procedures the router answers itself, such as the WAMP meta API, instead of forwarding them to a callee, and the meta
+events of realms.
+
+The session, subscription and registration procedures answer from the indexes the realm, broker and dealer keep for
+routing, so each costs time proportional to the size of its result rather than to the number of sessions.
+
+Meta events are published when enabled from the command line. Whether a meta topic has subscribers is cached until
+the subscriptions of the realm change, so raising an event nobody subscribes to costs a dict lookup, and the events
+raised in one loop iteration are dispatched together at its end, after the replies to the requests that raised them.
+"""
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa: F401
+
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import message
+from wouter.router import serializer
+from wouter.router import uri
+
+ON_JOIN = 'wamp.session.on_join'
+ON_LEAVE = 'wamp.session.on_leave'
+SUBSCRIPTION_ON_CREATE = 'wamp.subscription.on_create'
+SUBSCRIPTION_ON_SUBSCRIBE = 'wamp.subscription.on_subscribe'
+SUBSCRIPTION_ON_UNSUBSCRIBE = 'wamp.subscription.on_unsubscribe'
+SUBSCRIPTION_ON_DELETE = 'wamp.subscription.on_delete'
+REGISTRATION_ON_CREATE = 'wamp.registration.on_create'
+REGISTRATION_ON_REGISTER = 'wamp.registration.on_register'
+REGISTRATION_ON_UNREGISTER = 'wamp.registration.on_unregister'
+REGISTRATION_ON_DELETE = 'wamp.registration.on_delete'
+
+# Whether realms publish meta events, set from the command line.
+events = False
+
+# Router procedures by URI, each called with the calling session followed by the positional and keyword arguments of
+# the call. A procedure returns the args of its RESULT, as a list or a serializer.RawPayload.
+procedures = {}  # type: Dict[str, Callable[..., Any]]
+_signatures = {}  # type: Dict[str, inspect.Signature]
+
+
+def procedure(uri: str):
+    """Decorator adding a function to the router procedures."""
+    def add(function: Callable[..., Any]) -> Callable[..., Any]:
+        procedures[uri] = function
+        _signatures[uri] = inspect.signature(function)
+        return function
+    return add
+
+
+def call(session, call_: message.Call) -> bool:
+    """
+    Answer a call to a router procedure.
+
+    :return: whether the procedure is a router procedure.
+    :raises error.WampError: if the arguments do not match the procedure.
+    """
+    function = procedures.get(call_.procedure)
+    if function is None:
+        return False
+
+    args, kwargs = serializer.decode_payload(call_.args, call_.kwargs)
+    if type(args or []) is not list or type(kwargs or {}) is not dict:
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid arguments')
+    try:
+        _signatures[call_.procedure].bind(session, *(args or ()), **(kwargs or {}))
+    except TypeError as e:
+        raise error.WampError(error.INVALID_ARGUMENT, str(e))
+
+    session.send(message.Result(request_id=call_.request_id,
+                                details={},
+                                args=function(session, *(args or ()), **(kwargs or {}))))
+    return True
+
+
+class Events:
+    """The meta events of a realm, dispatched by its broker at the end of the loop iteration that raised them."""
+
+    def __init__(self, broker_):
+        """
+        :param broker_: is the wouter.router.broker.Broker of the realm.
+        """
+        self.broker = broker_
+        self._pending = []  # type: List[Tuple[str, list]]
+        self._flushing = False
+        # Whether each meta topic has subscribers, as of a version of the subscriptions of the broker.
+        self._subscribed = {}  # type: Dict[str, Tuple[int, bool]]
+
+    def publish(self, loop: asyncio.AbstractEventLoop, topic: str, args: list):
+        """Raise a meta event, unless its topic has no subscribers."""
+        version = self.broker.version
+        subscribed = self._subscribed.get(topic)
+        if subscribed is None or subscribed[0] != version:
+            subscribed = self._subscribed[topic] = (version, bool(self.broker.match(topic)))
+        if not subscribed[1]:
+            return
+
+        self._pending.append((topic, args))
+        if not self._flushing:
+            self._flushing = True
+            loop.call_soon(self.flush)
+
+    def flush(self):
+        """Dispatch the meta events raised since the last flush."""
+        self._flushing = False
+        pending, self._pending = self._pending, []
+        for topic, args in pending:
+            self.broker.dispatch(ids.global_ids.generate(), topic, args, None)
+
+
+def _authroles(filter_authroles) -> Optional[set]:
+    if filter_authroles is None:
+        return None
+    if type(filter_authroles) is not list or not all(type(role) is str for role in filter_authroles):
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid authroles %r' % (filter_authroles,))
+    return set(filter_authroles)
+
+
+def _match(options) -> str:
+    if options is None:
+        return 'exact'
+    if type(options) is not dict:
+        raise error.WampError(error.INVALID_ARGUMENT, 'invalid options %r' % (options,))
+    return options.get('match', 'exact')
+
+
+@procedure('wamp.session.count')
+def session_count(session, filter_authroles: list = None) -> list:
+    """Count the sessions of the realm, or those of some authroles."""
+    roles = _authroles(filter_authroles)
+    realm_ = session.realm
+    if roles is None:
+        return [len(realm_.sessions)]
+    return [sum(len(realm_.authroles.get(role, ())) for role in roles)]
+
+
+@procedure('wamp.session.list')
+def session_list(session, filter_authroles: list = None) -> list:
+    """List the ids of the sessions of the realm, or of those of some authroles."""
+    roles = _authroles(filter_authroles)
+    realm_ = session.realm
+    if roles is None:
+        return [list(realm_.sessions)]
+    return [[id_ for role in roles for id_ in realm_.authroles.get(role, ())]]
+
+
+@procedure('wamp.session.get')
+def session_get(session, session_id: int) -> list:
+    """Return the details of a session of the realm."""
+    other = session.realm.sessions.get(session_id) if type(session_id) is int else None
+    if other is None:
+        raise error.WampError(error.NO_SUCH_SESSION)
+    return [other.details()]
+
+
+@procedure('wamp.subscription.lookup')
+def subscription_lookup(session, topic: str, options: dict = None) -> list:
+    """Return the id of the subscription to a topic or pattern, or None."""
+    match = _match(options)
+    uri.check(topic, empty=match == 'wildcard')
+    subscription = session.realm.broker.lookup(topic, match)
+    return [subscription.id if subscription is not None else None]
+
+
+@procedure('wamp.subscription.match')
+def subscription_match(session, topic: str) -> list:
+    """Return the ids of the subscriptions matching a topic, or None."""
+    uri.check(topic)
+    return [[subscription.id for subscription in session.realm.broker.match(topic)] or None]
+
+
+@procedure('wamp.subscription.list_subscribers')
+def subscription_list_subscribers(session, subscription_id: int) -> list:
+    """Return the ids of the sessions subscribed to a subscription."""
+    subscription = session.realm.broker.subscriptions.get(subscription_id) if type(subscription_id) is int else None
+    if subscription is None:
+        raise error.WampError(error.NO_SUCH_SUBSCRIPTION)
+    return [[subscriber.id for subscriber in subscription.subscribers]]
+
+
+@procedure('wamp.registration.lookup')
+def registration_lookup(session, procedure_: str, options: dict = None) -> list:
+    """Return the id of the registration of a procedure, or None. Registrations are exact, never patterns."""
+    match = _match(options)
+    uri.check(procedure_, empty=match == 'wildcard')
+    registration = session.realm.dealer.lookup(procedure_) if match == 'exact' else None
+    return [registration.id if registration is not None else None]
+
+
+@procedure('wamp.registration.match')
+def registration_match(session, procedure_: str) -> list:
+    """Return the id of the registration a call to a procedure goes to, or None."""
+    uri.check(procedure_)
+    registration = session.realm.dealer.lookup(procedure_)
+    return [registration.id if registration is not None else None]
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Bounded outbound message queues.
+
+Each session queues its outbound messages until the transport can take them. The queue is bounded in messages and
+bytes; a policy decides what happens when a slow consumer lets it fill up.
+"""
+import collections
+from typing import Any, Dict, List  # noqa: F401
+
+# Overflow policies.
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+CONFLATE = 'conflate'
+ABORT = 'abort'
+
+POLICIES = (DROP_OLDEST, DROP_NEWEST, CONFLATE, ABORT)
+
+
+class SendQueue:
+    """
+    Serialized messages awaiting the transport, bounded in count and size.
+
+    Only events, which are queued with a key, are ever dropped. Replies such as WELCOME, RESULT or SUBSCRIBED are
+    queued without a key, and a peer that lost one would wait for it forever, so when a reply does not fit the queue
+    drops events to make room for it, and if that is not enough the put fails and the session is aborted.
+
+    When an event would exceed either bound:
+        - drop_oldest discards queued events from the front until it fits, or the event itself when it cannot fit.
+        - drop_newest discards the event.
+        - conflate replaces the queued event with the same key, keeping its place in the queue, or falls back to
+          drop_oldest when there is none. Events are keyed on their subscription and topic, so a slow subscriber
+          only receives the latest event of each topic.
+        - abort rejects the event, and the session is aborted.
+    """
+
+    def __init__(self, max_messages: int = 10000, max_bytes: int = 16 * 1024 * 1024, policy: str = ABORT):
+        if policy not in POLICIES:
+            raise ValueError('Invalid queue policy %r' % policy)
+
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.bytes = 0
+        self.dropped = 0
+        # Entries are [payload, key, size] lists. Dropped events stay in _entries with a None payload until the next
+        # drain, or until they outnumber the queued messages, so dropping from the middle of the queue is O(1).
+        self._entries = collections.deque()
+        self._events = collections.deque()
+        self._count = 0
+        self._tombstones = 0
+        self._keys = {}  # type: Dict[Any, list]
+
+    def __len__(self):
+        return self._count
+
+    def put(self, payload, key: Any = None) -> bool:
+        """
+        Queue a payload.
+
+        :param key: marks the payload as an event that may be dropped, and identifies the events that supersede each
+            other under the conflate policy.
+        :return: False if the payload must not be dropped but does not fit, in which case the session is aborted,
+            True otherwise, even if an event was dropped.
+        """
+        size = len(payload)
+        if self._count >= self.max_messages or self.bytes + size > self.max_bytes:
+            policy = self.policy
+            if key is None:
+                if policy == ABORT or size > self.max_bytes or not self._evict(size):
+                    return False
+            elif policy == ABORT:
+                return False
+            elif policy == DROP_NEWEST or size > self.max_bytes:
+                self.dropped += 1
+                return True
+            else:
+                if policy == CONFLATE:
+                    entry = self._keys.get(key)
+                    if entry is not None and self.bytes - entry[2] + size <= self.max_bytes:
+                        self.bytes += size - entry[2]
+                        entry[0] = payload
+                        entry[2] = size
+                        self.dropped += 1
+                        return True
+                if not self._evict(size):
+                    self.dropped += 1
+                    return True
+
+        entry = [payload, key, size]
+        self._entries.append(entry)
+        self._count += 1
+        self.bytes += size
+        if key is not None:
+            self._events.append(entry)
+            if self.policy == CONFLATE:
+                self._keys[key] = entry
+        return True
+
+    def _evict(self, size: int) -> bool:
+        """
+        Drop events from the front until size more bytes and one more message fit.
+
+        :return: whether they fit.
+        """
+        events = self._events
+        while self._count >= self.max_messages or self.bytes + size > self.max_bytes:
+            if not events:
+                return False
+            entry = events.popleft()
+            payload, key, entry_size = entry
+            entry[0] = None
+            self.bytes -= entry_size
+            self._count -= 1
+            self._tombstones += 1
+            self.dropped += 1
+            if self._keys.get(key) is entry:
+                del self._keys[key]
+
+        if self._tombstones > self._count:
+            self._entries = collections.deque(entry for entry in self._entries if entry[0] is not None)
+            self._tombstones = 0
+        return True
+
+    def drain(self) -> List[Any]:
+        """Remove and return every queued payload, oldest first."""
+        if self._tombstones:
+            payloads = [entry[0] for entry in self._entries if entry[0] is not None]
+        else:
+            payloads = [entry[0] for entry in self._entries]
+        self.clear()
+        return payloads
+
+    def clear(self):
+        self._entries.clear()
+        self._events.clear()
+        self._keys.clear()
+        self._count = 0
+        self._tombstones = 0
+        self.bytes = 0
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+WAMP RawSocket transport over TCP and Unix domain sockets.
+
+A client opens with a 4 octet handshake announcing its serializer and the maximum message length it accepts; the router
+answers with its own maximum or an error code. Every message after that is framed with a 4 octet header: a frame type
+(regular message, ping or pong) and a 24-bit payload length.
+"""
+import asyncio
+import logging
+import socket
+import struct
+from typing import Dict, Optional  # noqa: F401
+
+from wouter.router import router
+from wouter.router import serializer
+from wouter.router import session
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x7f
+
+# Serializer identifiers of the handshake.
+serializers = {
+    1: serializer.JSON,
+    2: serializer.MSGPACK,
+    3: serializer.CBOR,
+}  # type: Dict[int, serializer.Serializer]
+
+# Handshake error codes.
+ERROR_SERIALIZER_UNSUPPORTED = 1
+ERROR_MAX_LENGTH_UNACCEPTABLE = 2
+ERROR_RESERVED_BITS = 3
+ERROR_MAX_CONNECTIONS = 4
+
+# Frame types.
+FRAME_MESSAGE = 0
+FRAME_PING = 1
+FRAME_PONG = 2
+
+_header = struct.Struct('>I')
+
+# the length field of a frame header is 24 bits wide
+MAX_LENGTH = 0xffffff
+
+
+def max_length(exponent: int) -> int:
+    """
+    Return the maximum message length announced by a handshake length exponent.
+
+    Exponent 15 announces 2 ** 24 octets, one more than a frame header can carry, so it is clamped to MAX_LENGTH.
+    """
+    return min(1 << (9 + exponent), MAX_LENGTH)
+
+
+class RawSocketProtocol(asyncio.Protocol):
+    """
+    Server side of a RawSocket connection.
+
+    The protocol is the transport of its Session: the session writes serialized messages through write() and the
+    protocol feeds each received message to Session.receive().
+    """
+
+    def __init__(self, max_length_exponent: int = 15):
+        """
+        :param max_length_exponent: announces 2 ** (9 + exponent) octets as the longest message this router accepts;
+            15, the default, announces the longest a frame header can carry, MAX_LENGTH.
+        """
+        self.max_length_exponent = max_length_exponent
+        self.max_length = max_length(max_length_exponent)
+        self.peer_max_length = 0
+        self.transport = None  # type: Optional[asyncio.Transport]
+        self.session = None  # type: Optional[session.Session]
+        self._buffer = bytearray()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        router.connections.add(self)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        router.connections.discard(self)
+        if self.session is not None:
+            router.sessions.discard(self.session)
+            self.session.connection_lost()
+        self.session = None
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+
+        if self.session is None and not self._handshake():
+            return
+
+        buffer = self._buffer
+        offset = 0
+        while len(buffer) - offset >= 4:
+            header = _header.unpack_from(buffer, offset)[0]
+            frame_type, length = header >> 24, header & 0xffffff
+            if length > self.max_length or frame_type > FRAME_PONG:
+                logger.warning('invalid frame from %s, closing connection', self.transport.get_extra_info('peername'))
+                self.close()
+                return
+
+            end = offset + 4 + length
+            if len(buffer) < end:
+                break
+            payload = bytes(buffer[offset + 4:end])
+            offset = end
+
+            if frame_type == FRAME_MESSAGE:
+                if not self._receive(payload):
+                    return
+            elif frame_type == FRAME_PING:
+                self._write_frame(FRAME_PONG, payload)
+
+        del buffer[:offset]
+
+    def _handshake(self) -> bool:
+        """Answer the client handshake once its 4 octets have arrived; return whether the session is established."""
+        if len(self._buffer) < 4:
+            return False
+
+        magic, options, reserved1, reserved2 = self._buffer[:4]
+        del self._buffer[:4]
+
+        if magic != MAGIC:
+            logger.warning('invalid rawsocket handshake from %s', self.transport.get_extra_info('peername'))
+            self.close()
+            return False
+
+        serializer_ = serializers.get(options & 0x0f)
+        if serializer_ is None:
+            return self._refuse(ERROR_SERIALIZER_UNSUPPORTED)
+        if reserved1 or reserved2:
+            return self._refuse(ERROR_RESERVED_BITS)
+
+        self.peer_max_length = max_length(options >> 4)
+        self.transport.write(bytes((MAGIC, self.max_length_exponent << 4 | options & 0x0f, 0, 0)))
+        self.session = session.Session(self, serializer_)
+        router.sessions.add(self.session)
+        return True
+
+    def _refuse(self, error: int) -> bool:
+        self.transport.write(bytes((MAGIC, error << 4, 0, 0)))
+        self.close()
+        return False
+
+    def _receive(self, payload: bytes) -> bool:
+        self.session.receive(payload)
+        return not self.transport.is_closing()
+
+    def _write_frame(self, frame_type: int, payload: bytes):
+        self.transport.write(_header.pack(frame_type << 24 | len(payload)) + payload)
+
+    def write(self, payload: serializer.Payload):
+        """Frame and send a serialized message."""
+        if self.transport.is_closing():
+            return
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if len(payload) > self.peer_max_length:
+            logger.warning('message exceeds maximum length of %s, closing connection',
+                           self.transport.get_extra_info('peername'))
+            self.close()
+            return
+        self._write_frame(FRAME_MESSAGE, payload)
+
+    def close(self):
+        self.transport.close()
+
+    def pause_writing(self):
+        """Hold messages in the send queue of the session while the socket buffer is above its high-water mark."""
+        if self.session is not None:
+            self.session.pause_writing()
+
+    def resume_writing(self):
+        if self.session is not None:
+            self.session.resume_writing()
+
+
+def start_rawsocket(host: str = 'localhost', port: int = 8080, reuse_port: bool = False, **kwargs):
+    """
+    Return a coroutine that starts a RawSocket listener on a TCP port.
+
+    :param reuse_port: lets the listeners of several worker processes share the port.
+    """
+    return asyncio.get_event_loop().create_server(lambda: RawSocketProtocol(**kwargs), host, port,
+                                                  reuse_port=reuse_port)
+
+
+def start_rawsocket_unix(path: str = None, sock: socket.socket = None, **kwargs):
+    """
+    Return a coroutine that starts a RawSocket listener on a Unix domain socket.
+
+    :param sock: is an already bound socket to accept on instead of path, such as one shared by worker processes.
+    """
+    return asyncio.get_event_loop().create_unix_server(lambda: RawSocketProtocol(**kwargs), path, sock=sock)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Realms: routing namespaces that sessions attach to, each with its own broker and dealer.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple  # noqa: F401
+
+from wouter.router import authorizer
+from wouter.router import broker
+from wouter.router import dealer
+from wouter.router import history
+from wouter.router import meta
+
+
+class Realm:
+    def __init__(self, name: str):
+        self.name = name
+        self.broker = broker.Broker(history.History(history.topics, **history.options) if history.topics else None)
+        self.dealer = dealer.Dealer()
+        self.authorizer = None  # type: Optional[authorizer.Authorizer]
+        if authorizer.permissions or authorizer.procedure is not None:
+            self.authorizer = authorizer.Authorizer(self.dealer, authorizer.permissions, authorizer.procedure,
+                                                    **authorizer.options)
+        self.sessions = {}  # type: Dict[int, Any]
+        # The sessions of each authrole, by id, so the meta API counts and lists them without a scan.
+        self.authroles = {}  # type: Dict[str, Dict[int, Any]]
+        self.events = meta.Events(self.broker) if meta.events else None  # type: Optional[meta.Events]
+
+    def join(self, session):
+        self.sessions[session.id] = session
+        with lock:
+            sessions[session.id] = session
+        role = self.authroles.get(session.authrole)
+        if role is None:
+            role = self.authroles[session.authrole] = {}
+        role[session.id] = session
+
+    def leave(self, session):
+        self.sessions.pop(session.id, None)
+        with lock:
+            sessions.pop(session.id, None)
+        role = self.authroles.get(session.authrole)
+        if role is not None and role.pop(session.id, None) is not None and not role:
+            del self.authroles[session.authrole]
+
+
+realms = {}  # type: Dict[str, Realm]
+
+# Sessions of every realm, by id.
+sessions = {}  # type: Dict[int, Any]
+
+# Guards changes to realms and sessions, which the threads of every shard make, against each other and against
+# iteration from the main loop. Each realm and its own sessions are only used from the loop serving it.
+lock = threading.Lock()
+
+
+def get(name: str) -> Realm:
+    """Return the realm with a name, creating it when the first session attaches."""
+    realm = realms.get(name)
+    if realm is None:
+        with lock:
+            realm = realms.get(name)
+            if realm is None:
+                realm = realms[name] = Realm(name)
+    return realm
+
+
+def items() -> List[Tuple[str, Realm]]:
+    """Return the realms with their names, sorted by name."""
+    with lock:
+        return sorted(realms.items())
@@ -2,11 +2,15 @@
 
 """Main module."""
 import asyncio
+import logging
 from typing import Set, Any
 
 import websockets
+from wouter.router import serializer
 from wouter.router import session
 
+logger = logging.getLogger(__name__)
+
 
 
 """
@@ -127,24 +131,83 @@ sessions = set()  # type: Set[session.Session]
 connections = set()   # type: Set[websockets.WebSocketServerProtocol]
 
 
-async def consumer_handler(websocket, path):
-    """Await message from connected websocket"""
-    session_ = session.Session(websocket)
-    sessions.add(session_)
+class WebSocketTransport:
+    """
+    Queues outbound payloads for the producer handler of a websocket connection.
+
+    The session is paused while payloads are waiting to be sent, so that messages to a slow client back up in the
+    bounded send queue of the session rather than here.
+    """
+    closing = None
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue = asyncio.Queue()
+        self.session = None  # type: session.Session
+
+    def write(self, payload: serializer.Payload):
+        self.queue.put_nowait(payload)
+        if self.session is not None:
+            self.session.pause_writing()
+
+    def close(self):
+        """Close the websocket once the payloads queued before it have been sent."""
+        self.queue.put_nowait(self.closing)
 
+
+async def consumer_handler(websocket, session_: session.Session):
+    """Await message from connected websocket"""
     while True:
-        message = await websocket.recv()
-        print('consumed message ' + str(message))
+        try:
+            payload = await websocket.recv()
+        except websockets.ConnectionClosed:
+            return
 
+        session_.receive(payload)
+
+
+async def producer_handler(websocket, transport: WebSocketTransport):
+    """Send queued messages to connected websocket"""
+    while True:
+        payload = await transport.queue.get()
+        try:
+            if payload is transport.closing:
+                await websocket.close()
+                return
+            await websocket.send(payload)
+        except websockets.ConnectionClosed:
+            return
+
+        if transport.queue.empty() and transport.session is not None:
+            transport.session.resume_writing()
+
+
+async def connection_handler(websocket, path=None):
+    serializer_ = serializer.get(websocket.subprotocol)
+    transport = WebSocketTransport(websocket)
+    session_ = transport.session = session.Session(transport, serializer_)
+    sessions.add(session_)
 
-async def connection_handler(websocket, path):
     # Register.
     connections.add(websocket)
     try:
-        await consumer_handler(websocket, path)
+        consumer = asyncio.ensure_future(consumer_handler(websocket, session_))
+        producer = asyncio.ensure_future(producer_handler(websocket, transport))
+        done, pending = await asyncio.wait([consumer, producer], return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
     finally:
         # Unregister.
         connections.remove(websocket)
+        sessions.discard(session_)
+        session_.connection_lost()
+
 
+def start_router(host: str = 'localhost', port: int = 9001, reuse_port: bool = False):
+    """
+    Return an awaitable that starts the websocket listener, offering every supported WAMP subprotocol.
 
-start_router = websockets.serve(connection_handler, 'localhost', 9001)
+    :param reuse_port: lets the listeners of several worker processes share the port.
+    """
+    return websockets.serve(connection_handler, host, port, subprotocols=serializer.SUBPROTOCOLS,
+                            reuse_port=reuse_port)
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+WAMP serializers, negotiated through the WebSocket subprotocol.
+
+Each serializer prefers a compiled codec when one is installed (ujson, msgpack, cbor2) and falls back to the standard
+library or the pure-Python codecs in wouter.router.codec otherwise.
+
+In passthrough mode the router decodes only the routing header of the messages that carry an application payload,
+and keeps their args and kwargs as a RawPayload that is written back byte for byte to receivers using the same
+serializer.
+"""
+import abc
+import functools
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from wouter.router import codec
+
+try:
+    import ujson
+
+    _json_dumps = functools.partial(ujson.dumps, ensure_ascii=False, escape_forward_slashes=False)
+    _json_loads = ujson.loads
+except ImportError:
+    _json_dumps = functools.partial(json.dumps, ensure_ascii=False, separators=(',', ':'))
+    _json_loads = json.loads
+
+try:
+    import msgpack
+
+    _msgpack_packb = functools.partial(msgpack.packb, use_bin_type=True)
+    _msgpack_unpackb = functools.partial(msgpack.unpackb, raw=False)
+except ImportError:
+    _msgpack_packb = codec.msgpack_packb
+    _msgpack_unpackb = codec.msgpack_unpackb
+
+try:
+    import cbor2
+
+    _cbor_dumps = cbor2.dumps
+    _cbor_loads = cbor2.loads
+except ImportError:
+    _cbor_dumps = codec.cbor_dumps
+    _cbor_loads = codec.cbor_loads
+
+Payload = Union[str, bytes]
+
+_json_decode = json.JSONDecoder().raw_decode
+_json_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class RawPayload:
+    """
+    The args and kwargs of a message, kept in the encoding they were received in.
+
+    It takes the place of the args element of a message list, with no kwargs element following. The serializer that
+    produced it writes it back unchanged, any other serializer decodes it first.
+    """
+    __slots__ = ('serializer', 'data', 'count', '_items')
+
+    def __init__(self, serializer_: 'Serializer', data: Payload, count: int = None):
+        """
+        :param serializer_: is the serializer the payload was received with.
+        :param data: is the encoding of the elements, without the enclosing array.
+        :param count: is the number of elements, needed to write the array header of a binary serializer.
+        """
+        self.serializer = serializer_
+        self.data = data
+        self.count = count
+        self._items = None  # type: Optional[list]
+
+    def items(self) -> list:
+        """Decode the elements, args followed by kwargs if present."""
+        if self._items is None:
+            self._items = self.serializer.unserialize(self.serializer.serialize([self]))
+        return self._items
+
+
+def decode_payload(args: Any, kwargs: Optional[dict]) -> Tuple[Optional[list], Optional[dict]]:
+    """Return the args and kwargs of a message, decoding them if they are a RawPayload."""
+    if type(args) is not RawPayload:
+        return args, kwargs
+    items = args.items()
+    return items[0], items[1] if len(items) > 1 else None
+
+
+class Serializer(metaclass=abc.ABCMeta):
+    """
+    Converts between message lists and transport payloads.
+
+    Besides whole messages, a serializer can encode a message with one integer element left open as a template, then
+    splice values into it. The broker uses this to encode an EVENT payload once and only vary the subscription id.
+    """
+    id = ...  # type: str
+    binary = ...  # type: bool
+    batched = False
+
+    @property
+    def subprotocol(self) -> str:
+        return 'wamp.2.' + self.id
+
+    @abc.abstractmethod
+    def serialize(self, msg: list) -> Payload:
+        pass
+
+    @abc.abstractmethod
+    def unserialize(self, payload: Payload) -> list:
+        pass
+
+    def unserialize_routing(self, payload: Payload, payload_index: Dict[int, int]) -> list:
+        """
+        Decode only the routing header of a message that carries an application payload.
+
+        :param payload_index: maps the type codes of messages with a payload to the index of their args element.
+        :return: the message list, its elements from args on replaced by a RawPayload. Messages of other types, or
+            without args, are decoded in full.
+        """
+        return self.unserialize(payload)
+
+    @abc.abstractmethod
+    def template(self, msg: list, index: int) -> Tuple[Payload, Payload]:
+        """
+        Encode msg with the element at index left out.
+
+        :return: the (head, tail) surrounding the open element, for use with splice().
+        """
+
+    @abc.abstractmethod
+    def splice(self, template: Tuple[Payload, Payload], value: int) -> Payload:
+        """Fill the open element of a template with an integer."""
+
+    @abc.abstractmethod
+    def array(self, items: List[Payload]) -> Payload:
+        """Encode an array of already serialized items."""
+
+
+class JSONSerializer(Serializer):
+    id = 'json'
+    binary = False
+
+    def serialize(self, msg: list) -> str:
+        if type(msg) is list and msg and type(msg[-1]) is RawPayload:
+            raw = msg[-1]
+            if raw.serializer is self:
+                return (_json_dumps(msg[:-1])[:-1] + ',' if len(msg) > 1 else '[') + raw.data + ']'
+            msg = msg[:-1] + raw.items()
+        return _json_dumps(msg)
+
+    def unserialize(self, payload: Payload) -> list:
+        msg = _json_loads(payload)
+        if type(msg) is not list:
+            raise ValueError('Invalid message')
+        return msg
+
+    def unserialize_routing(self, payload: Payload, payload_index: Dict[int, int]) -> list:
+        if type(payload) is not str:
+            payload = bytes(payload).decode('utf-8')
+        skip = _json_whitespace.match
+        last = len(payload.rstrip(' \t\n\r')) - 1
+        start = skip(payload).end()
+        if last <= start or payload[start] != '[' or payload[last] != ']':
+            raise ValueError('Invalid message')
+
+        msg = []
+        size = None
+        offset = start + 1
+        while True:
+            item, offset = _json_decode(payload, skip(payload, offset).end())
+            msg.append(item)
+            offset = skip(payload, offset).end()
+            if offset == last:
+                return msg
+            if payload[offset] != ',':
+                raise ValueError('Invalid message')
+            offset += 1
+
+            if size is None:
+                size = payload_index.get(item) if type(item) is int else None
+                if size is None:
+                    return self.unserialize(payload)
+            if len(msg) == size:
+                if skip(payload, offset).end() == last:
+                    raise ValueError('Invalid message')
+                msg.append(RawPayload(self, payload[offset:last]))
+                return msg
+
+    def template(self, msg: list, index: int) -> Tuple[str, str]:
+        head = _json_dumps(msg[:index])[:-1] + (',' if index else '')
+        tail = msg[index + 1:]
+        return head, ',' + self.serialize(tail)[1:] if tail else ']'
+
+    def splice(self, template: Tuple[str, str], value: int) -> str:
+        return '%s%d%s' % (template[0], value, template[1])
+
+    def array(self, items: List[str]) -> str:
+        return '[' + ','.join(items) + ']'
+
+
+class _BinarySerializer(Serializer):
+    binary = True
+
+    def __init__(self, dumps, loads, array_header, array_start, load_from):
+        self._dumps = dumps
+        self._loads = loads
+        self._array_header = array_header
+        self._array_start = array_start
+        self._load_from = load_from
+
+    def serialize(self, msg: list) -> bytes:
+        if type(msg) is list and msg and type(msg[-1]) is RawPayload:
+            msg, length, raw = self._split_raw(msg)
+            return self._array_header(length) + b''.join(self._dumps(item) for item in msg) + raw
+        return self._dumps(msg)
+
+    def unserialize(self, payload: Payload) -> list:
+        msg = self._loads(payload)
+        if type(msg) is not list:
+            raise ValueError('Invalid message')
+        return msg
+
+    def unserialize_routing(self, payload: Payload, payload_index: Dict[int, int]) -> list:
+        data = bytes(payload)
+        length, offset = self._array_start(data)
+        if not length:
+            return self.unserialize(payload)
+
+        code, offset = self._load_from(data, offset)
+        size = payload_index.get(code) if type(code) is int else None
+        if size is None or length <= size:
+            return self.unserialize(payload)
+
+        msg = [code]
+        while len(msg) < size:
+            item, offset = self._load_from(data, offset)
+            msg.append(item)
+        msg.append(RawPayload(self, data[offset:], length - size))
+        return msg
+
+    def template(self, msg: list, index: int) -> Tuple[bytes, bytes]:
+        msg, length, raw = self._split_raw(msg)
+        dumps = self._dumps
+        head = self._array_header(length) + b''.join(dumps(item) for item in msg[:index])
+        return head, b''.join(dumps(item) for item in msg[index + 1:]) + raw
+
+    def _split_raw(self, msg: list) -> Tuple[list, int, bytes]:
+        """Separate a trailing RawPayload, returning the other elements, the array length and the bytes to append."""
+        raw = msg[-1] if msg else None
+        if type(raw) is not RawPayload:
+            return msg, len(msg), b''
+        if raw.serializer is not self:
+            msg = msg[:-1] + raw.items()
+            return msg, len(msg), b''
+        return msg[:-1], len(msg) - 1 + raw.count, raw.data
+
+    def splice(self, template: Tuple[bytes, bytes], value: int) -> bytes:
+        return template[0] + self._dumps(value) + template[1]
+
+    def array(self, items: List[bytes]) -> bytes:
+        return self._array_header(len(items)) + b''.join(items)
+
+
+class MsgPackSerializer(_BinarySerializer):
+    id = 'msgpack'
+
+    def __init__(self):
+        _BinarySerializer.__init__(self, _msgpack_packb, _msgpack_unpackb, codec.msgpack_array_header,
+                                   codec.msgpack_array_start, codec.msgpack_unpack_from)
+
+
+class CBORSerializer(_BinarySerializer):
+    id = 'cbor'
+
+    def __init__(self):
+        _BinarySerializer.__init__(self, _cbor_dumps, _cbor_loads, codec.cbor_array_header, codec.cbor_array_start,
+                                   codec.cbor_decode_from)
+
+
+class BatchedSerializer(Serializer):
+    """
+    Batched variant of a serializer, carrying several messages per transport payload.
+
+    JSON messages are each terminated by the 0x18 separator; binary messages are each prefixed with their length as a
+    4-byte big-endian integer, as the separator may occur inside binary data.
+    """
+    batched = True
+
+    def __init__(self, serializer: Serializer):
+        self.serializer = serializer
+        self.id = serializer.id + '.batched'
+        self.binary = serializer.binary
+
+    def serialize(self, msg: list) -> Payload:
+        return self.serializer.serialize(msg)
+
+    def unserialize(self, payload: Payload) -> list:
+        return self.serializer.unserialize(payload)
+
+    def unserialize_routing(self, payload: Payload, payload_index: Dict[int, int]) -> list:
+        return self.serializer.unserialize_routing(payload, payload_index)
+
+    def template(self, msg: list, index: int) -> Tuple[Payload, Payload]:
+        return self.serializer.template(msg, index)
+
+    def splice(self, template: Tuple[Payload, Payload], value: int) -> Payload:
+        return self.serializer.splice(template, value)
+
+    def array(self, items: List[Payload]) -> Payload:
+        return self.serializer.array(items)
+
+    def join(self, payloads: List[Payload]) -> Payload:
+        """Pack serialized messages into one transport payload."""
+        if self.binary:
+            return b''.join(len(payload).to_bytes(4, 'big') + payload for payload in payloads)
+        return '\x18'.join(payloads) + '\x18'
+
+    def split(self, payload: Payload) -> List[Payload]:
+        """Unpack a transport payload into its serialized messages."""
+        if not self.binary:
+            payloads = payload.split('\x18')
+            if payloads[-1]:
+                raise ValueError('Unterminated batch')
+            del payloads[-1]
+            return payloads
+
+        payloads = []
+        offset = 0
+        end = len(payload)
+        while offset < end:
+            length = int.from_bytes(payload[offset:offset + 4], 'big')
+            offset += 4
+            if offset + length > end:
+                raise ValueError('Truncated batch')
+            payloads.append(payload[offset:offset + length])
+            offset += length
+        return payloads
+
+
+JSON = JSONSerializer()
+MSGPACK = MsgPackSerializer()
+CBOR = CBORSerializer()
+
+# Supported subprotocols in order of preference.
+serializers = {s.subprotocol: s for s in (CBOR,
+                                          MSGPACK,
+                                          JSON,
+                                          BatchedSerializer(CBOR),
+                                          BatchedSerializer(MSGPACK),
+                                          BatchedSerializer(JSON))}  # type: Dict[str, Serializer]
+SUBPROTOCOLS = list(serializers)
+
+
+def get(subprotocol: Optional[str]) -> Optional[Serializer]:
+    """Return the serializer for a negotiated subprotocol, JSON when none was negotiated, or None if unsupported."""
+    if subprotocol is None:
+        return JSON
+    return serializers.get(subprotocol)
@@ -15,13 +15,65 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import asyncio
+import collections
 import enum
+import functools
+import logging
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional  # noqa: F401
 
+from wouter.monitor import metrics
+from wouter.router import auth
+from wouter.router import authorizer
+from wouter.router import broker
+from wouter.router import dealer
+from wouter.router import error
+from wouter.router import ids
+from wouter.router import link
 from wouter.router import message
+from wouter.router import meta
+from wouter.router import queue
+from wouter.router import realm
+from wouter.router import serializer
+from wouter.router import shard
+from wouter.router import uri
+
+logger = logging.getLogger(__name__)
+
+# Roles and features announced in WELCOME.
+ROLES = {
+    'broker': {
+        'features': {
+            'pattern_based_subscription': True,
+            'publisher_exclusion': True,
+        },
+    },
+    'dealer': {
+        'features': {
+            'shared_registration': True,
+            'call_timeout': True,
+        },
+    },
+}
+
+# Keyword arguments of the SendQueue of each new session, set from the command line.
+queue_options = {}  # type: Dict[str, Any]
+
+# Whether to leave the args and kwargs of received messages encoded, see serializer.RawPayload. Set from the command
+# line.
+passthrough = False
+
+# Reason of the ABORT sent to a session whose send queue overflows under the abort policy.
+SLOW_CONSUMER = 'wouter.close.slow_consumer'
 
 
 @enum.unique
 class State(enum.Enum):
+    """
+    Session states. The messages a session accepts in each state are listed in _transitions; any other message is a
+    protocol violation.
+    """
     CLOSED = 'closed'
     ESTABLISHING = 'establishing'
     FAILED = 'failed'
@@ -39,27 +91,497 @@ class Session:
      3. router welcome
      4. router role and feature announcement
     """
+    # Whether this stands in for the clients of another router, see link.Peer.
+    peer = False
 
-    def __init__(self, websocket):
-        self.state = State.CLOSED
-        self.realm = ''
-        self.publications = []
-        self.subscriptions = []
-        self.registrations = []
-        self.requests = []
+    def __init__(self, transport, serializer_: serializer.Serializer, loop: asyncio.AbstractEventLoop = None):
+        """
+        :param transport: the connection this session is attached to; it must provide write(payload) and close().
+        :param serializer_: the serializer negotiated for the transport.
+        :param loop: the event loop outbound writes are flushed on.
+        """
+        self.transport = transport
+        self.serializer = serializer_
+        self.loop = loop or asyncio.get_event_loop()
+        # The shard the session was handed to, after which loop is the loop of the shard and transport forwards to the
+        # loop of the connection.
+        self.shard = None  # type: Optional[shard.Shard]
+        self.queue = queue.SendQueue(**queue_options)
+        self.paused = False
+        self._flushing = False
+        self.realm = None  # type: Optional[realm.Realm]
+        self.state = State.CLOSED  # type: State
+        self.id = None  # type: Optional[int]
+        self.request_ids = ids.SequentialIds()
+        # What the session owns in its realm, by id, so leaving removes exactly that.
+        self.subscriptions = {}  # type: Dict[int, broker.Subscription]
+        self.registrations = {}  # type: Dict[int, dealer.Registration]
         self.roles = []
+        self.authid = None  # type: Optional[str]
+        self.authrole = auth.ANONYMOUS
+        self.authmethod = auth.ANONYMOUS
+        # The authentication in progress while the session is challenged.
+        self._attempt = None  # type: Optional[auth.Attempt]
+        # Messages received while the dynamic authorizer decides on an earlier one, handled once it has.
+        self._held = None  # type: Optional[Deque[message.Message]]
+
+    @property
+    def state(self) -> State:
+        return self._state
+
+    @state.setter
+    def state(self, state: State):
+        # Swap in the handlers of the new state, so dispatching a message is a single lookup on its class. Realms with
+        # an authorizer have handlers that authorize first.
+        self._state = state
+        if self.realm is not None and self.realm.authorizer is not None:
+            self._dispatch = _authorizing_transitions[state]
+        else:
+            self._dispatch = _transitions[state]
+
+    def receive(self, payload: serializer.Payload):
+        """
+        Decode a payload received from the transport.
+
+        A payload that is not a valid WAMP message aborts the session with a protocol violation.
+        """
+        metrics.counters.bytes_received += len(payload)
+        try:
+            if type(payload) is not str and not self.serializer.binary:
+                payload = bytes(payload).decode('utf-8')
+            if self.shard is not None:
+                frames = self.serializer.split(payload) if self.serializer.batched else [payload]
+                self.loop.call_soon_threadsafe(self._receive_on_shard, frames)
+            elif self.serializer.batched:
+                frames = self.serializer.split(payload)
+                for index, frame in enumerate(frames):
+                    self._receive(frame)
+                    if self.shard is not None:
+                        # The HELLO handed the session to a shard, which receives the rest of the batch.
+                        self.loop.call_soon_threadsafe(self._receive_on_shard, frames[index + 1:])
+                        break
+            else:
+                self._receive(payload)
+        except ValueError as e:
+            if self.shard is not None:
+                self.loop.call_soon_threadsafe(self.protocol_violation, 'invalid message: %s' % e)
+            else:
+                self.protocol_violation('invalid message: %s' % e)
+
+    def _receive_on_shard(self, frames: List[serializer.Payload]):
+        """Handle payloads forwarded to the shard of the session, aborting the session at an invalid one."""
+        try:
+            for frame in frames:
+                self._receive(frame)
+        except ValueError as e:
+            self.protocol_violation('invalid message: %s' % e)
+
+    def _receive(self, payload: serializer.Payload):
+        if passthrough:
+            msg = message.decode(self.serializer.unserialize_routing(payload, message.PAYLOAD_INDEX))
+        else:
+            msg = message.decode(self.serializer.unserialize(payload))
+        if self._held is not None:
+            self._held.append(msg)
+            return
+        self._handle(msg)
+
+    def _handle(self, msg: message.Message, handler: Callable[['Session', Any], None] = None):
+        if handler is None:
+            handler = self._dispatch.get(msg.__class__)
+            if handler is None:
+                self.protocol_violation('unexpected %s message in state %s' % (msg.type.name, self._state.value))
+                return
+
+        started = time.perf_counter()
+        try:
+            handler(self, msg)
+        except error.WampError as e:
+            if type(msg) is message.Publish and not msg.options.get('acknowledge'):
+                # Only acknowledged publications are answered, with PUBLISHED or an ERROR.
+                logger.debug('unacknowledged publication by session %s failed: %s', self.id, e.error)
+            else:
+                self.send(message.Error(request_type=msg.type,
+                                        request_id=msg.request_id,
+                                        details=e.details(),
+                                        error=e.error))
+        metrics.routing[msg.__class__].observe(time.perf_counter() - started)
+
+    def send(self, msg: message.Message):
+        """Serialize a message and write it to the transport."""
+        metrics.sent[msg.__class__] += 1
+        self.send_frame(self.serializer.serialize(msg.marshal()))
+
+    def send_frame(self, payload: serializer.Payload, key: Any = None):
+        """
+        Queue an already serialized message for the transport.
+
+        Messages sent in the same event loop iteration are written together when the loop next runs callbacks, as a
+        single payload for batched serializers. While the transport is paused they wait in the bounded send queue.
+
+        :param key: identifies the messages that supersede each other when the send queue conflates.
+        """
+        if self.state is State.FAILED:
+            return
+        if not self.queue.put(payload, key):
+            self.overflow()
+            return
+
+        if not self._flushing and not self.paused:
+            self._flushing = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Write queued messages to the transport."""
+        self._flushing = False
+        if self.paused or not self.queue:
+            return
+
+        outbox = self.queue.drain()
+        if self.serializer.batched:
+            payload = self.serializer.join(outbox)
+            metrics.counters.bytes_sent += len(payload)
+            self.transport.write(payload)
+        else:
+            for payload in outbox:
+                metrics.counters.bytes_sent += len(payload)
+                self.transport.write(payload)
+
+    def pause_writing(self):
+        """Hold outbound messages in the send queue until the transport calls resume_writing()."""
+        if self.shard is not None:
+            # The transport calls from the loop of the connection.
+            self.loop.call_soon_threadsafe(self._pause_writing)
+        else:
+            self._pause_writing()
+
+    def resume_writing(self):
+        if self.shard is not None:
+            self.loop.call_soon_threadsafe(self._resume_writing)
+        else:
+            self._resume_writing()
+
+    def _pause_writing(self):
+        self.paused = True
+
+    def _resume_writing(self):
+        self.paused = False
+        self.flush()
+
+    def overflow(self):
+        """
+        Fail a session that is not reading its messages fast enough.
+
+        Queued messages are discarded and the session is aborted once the current callback, which may be iterating
+        over the subscribers of a topic, has returned.
+        """
+        logger.warning('send queue of session %s overflowed, aborting', self.id)
+        self.state = State.FAILED
+        self.queue.clear()
+        self.loop.call_soon(self._abort_slow_consumer)
+
+    def _abort_slow_consumer(self):
+        payload = self.serializer.serialize(
+            message.Abort(details={'message': 'send queue overflowed'}, reason=SLOW_CONSUMER).marshal())
+        self.transport.write(self.serializer.join([payload]) if self.serializer.batched else payload)
+        self.leave()
+        self.transport.close()
+
+    def protocol_violation(self, reason: str):
+        """
+        Abort the session for a message the protocol does not allow.
+
+        The session fails, so the messages that follow on the same connection are ignored.
+        """
+        if self._state is State.FAILED:
+            return
+        logger.warning('protocol violation by session %s: %s', self.id, reason)
+        self.send(message.Abort(details={'message': reason}, reason=error.PROTOCOL_VIOLATION))
+        self.leave()
+        self.close()
+        self.state = State.FAILED
+
+    def close(self):
+        """Write queued messages, then close the transport."""
+        self.paused = False
+        self.flush()
+        self.transport.close()
 
-    def hello(self):
-        pass
+    def hello(self, msg: message.Hello):
+        if not uri.is_valid(msg.realm):
+            self.send(message.Abort(details={'message': 'invalid realm URI %r' % (msg.realm,)},
+                                    reason=error.INVALID_URI))
+            self.close()
+            return
+
+        shard_ = shard.get(msg.realm)
+        if shard_ is not None and self.shard is None:
+            # Hand the session to the shard serving the realm, which handles this HELLO and every later message.
+            self.shard = shard_
+            self.transport = shard.ThreadTransport(self.transport, self.loop)
+            self.loop = shard_.loop
+            self.loop.call_soon_threadsafe(self.hello, msg)
+            return
+
+        self.id = ids.global_ids.generate(realm.sessions)
+        self.roles = msg.details['roles']
+        if auth.methods:
+            try:
+                self._attempt = auth.challenge(self.id, msg.realm, msg.details)
+            except error.WampError as e:
+                self.send(message.Abort(details=e.details(), reason=e.error))
+                self.close()
+                return
+            if self._attempt is not None:
+                self.state = State.CHALLENGING
+                self.send(message.Challenge(authmethod=self._attempt.authmethod, extra=self._attempt.extra()))
+                return
+        self.join(msg.realm)
+
+    def authenticate(self, msg: message.Authenticate):
+        """Verify the reply to the challenge off the event loop; the session waits in ESTABLISHING meanwhile."""
+        self.state = State.ESTABLISHING
+        task = self.loop.create_task(auth.get().verify(self.loop, self._attempt, msg.signature))
+        task.add_done_callback(self._authenticated)
+
+    def _authenticated(self, task: asyncio.Future):
+        attempt, self._attempt = self._attempt, None
+        if self._state is not State.ESTABLISHING:
+            # Aborted, or the connection was lost, while verifying.
+            return
+        try:
+            verified = not task.cancelled() and task.result()
+        except Exception:
+            logger.exception('verifying the authentication of %r on session %s failed', attempt.authid, self.id)
+            verified = False
+        if not verified:
+            logger.info('authentication of %r failed on session %s', attempt.authid, self.id)
+            self.send(message.Abort(details={'message': auth.FAILED}, reason=error.AUTHENTICATION_FAILED))
+            self.close()
+            self.state = State.CLOSED
+            return
+        self.authid = attempt.authid
+        self.authrole = attempt.user.role
+        self.authmethod = attempt.authmethod
+        self.join(attempt.realm)
+
+    def join(self, name: str):
+        """Join a realm and establish the session."""
+        self.state = State.ESTABLISHING
+        self.realm = realm.get(name)
+        self.realm.join(self)
+        self.welcome()
+        self._meta_event(meta.ON_JOIN, [self.details()])
+
+    def details(self) -> dict:
+        """Return the details of the session reported by the meta API."""
+        return {'session': self.id, 'authid': self.authid, 'authrole': self.authrole, 'authmethod': self.authmethod}
+
+    def _meta_event(self, topic: str, args: list):
+        events = self.realm.events
+        if events is not None:
+            events.publish(self.loop, topic, args)
 
     def welcome(self):
-        pass
+        self.state = State.ESTABLISHED
+        details = {'roles': ROLES, 'authrole': self.authrole, 'authmethod': self.authmethod}
+        if self.authid is not None:
+            details['authid'] = self.authid
+        self.send(message.Welcome(session=self.id, details=details))
+
+    def abort(self, msg: message.Abort):
+        self.leave()
+        self.close()
+
+    def goodbye(self, msg: message.Goodbye):
+        self.send(message.Goodbye(details={}, reason='wamp.close.goodbye_and_out'))
+        self.leave()
+        self.close()
+
+    def error(self, msg: message.Error):
+        if msg.request_type is not message.Type.INVOCATION:
+            self.protocol_violation('unexpected ERROR message for %s' % msg.request_type.name)
+        elif not uri.is_valid(msg.error):
+            self.protocol_violation('invalid error URI %r' % (msg.error,))
+        else:
+            self.realm.dealer.error(self, msg)
+
+    def leave(self):
+        """
+        Detach from the realm.
+
+        The subscriptions, registrations and in-flight calls of the session are removed in time proportional to their
+        number; callers waiting on its invocations get an error.
+        """
+        if self.realm is not None:
+            self.realm.dealer.detach(self)
+            for subscription in list(self.subscriptions.values()):
+                self._unsubscribe(subscription)
+            for registration in list(self.registrations.values()):
+                self._unregister(registration)
+            self.realm.leave(self)
+            self._meta_event(meta.ON_LEAVE, [self.id, self.authid, self.authrole])
+            self.realm = None
+        self.state = State.CLOSED
+
+    def connection_lost(self):
+        """Leave the realm once the transport has closed."""
+        if self.shard is not None:
+            # The transport calls from the loop of the connection.
+            self.loop.call_soon_threadsafe(self.leave)
+        else:
+            self.leave()
+
+    def authorize(self, msg: message.Message, uri_: str, action: str,
+                  handler: Callable[['Session', Any], None]) -> bool:
+        """
+        Ask the authorizer of the realm whether the session may take the action of a message.
+
+        :return: whether the message can be handled now. While the dynamic authorizer decides, the message and those
+            that follow it are held, then handled in order.
+        :raises error.WampError: if the action is denied.
+        """
+        decision = self.realm.authorizer.authorize(self, uri_, action)
+        if decision is True:
+            return True
+        if decision is False:
+            raise error.WampError(error.NOT_AUTHORIZED, 'not authorized to %s %r' % (action, uri_))
+        self._held = collections.deque()
+        decision.add_done_callback(functools.partial(self._decided, msg, handler))
+        return False
+
+    def _decided(self, msg: message.Message, handler: Callable[['Session', Any], None], decision: asyncio.Future):
+        held, self._held = self._held, None
+        if self._state is not State.ESTABLISHED:
+            return
+        self._handle(msg, handler if decision.result() else _unauthorized)
+        while held and self._held is None:
+            self._handle(held.popleft())
+        if held:
+            # Held again by another dynamic authorization.
+            self._held.extend(held)
+
+    def subscribe(self, msg: message.Subscribe):
+        match = msg.options.get('match', 'exact')
+        uri.check(msg.topic, empty=match == 'wildcard')
+        subscription = self.realm.broker.subscribe(self, msg.topic, match)
+        self.subscriptions[subscription.id] = subscription
+        self.send(message.Subscribed(request_id=msg.request_id, subscription_id=subscription.id))
+        if len(subscription.subscribers) == 1:
+            for link_ in link.links:
+                link_.subscribe(self.realm, subscription)
+            self._meta_event(meta.SUBSCRIPTION_ON_CREATE, [self.id, {'id': subscription.id,
+                                                                     'uri': subscription.uri,
+                                                                     'match': subscription.match}])
+        self._meta_event(meta.SUBSCRIPTION_ON_SUBSCRIBE, [self.id, subscription.id])
+
+    def unsubscribe(self, msg: message.Unsubscribe):
+        subscription = self.subscriptions.get(msg.subscription_id)
+        if subscription is None:
+            raise error.WampError(error.NO_SUCH_SUBSCRIPTION)
+        self._unsubscribe(subscription)
+        self.send(message.Unsubscribed(request_id=msg.request_id))
+
+    def _unsubscribe(self, subscription: broker.Subscription):
+        del self.subscriptions[subscription.id]
+        self.realm.broker.unsubscribe(self, subscription.id)
+        self._meta_event(meta.SUBSCRIPTION_ON_UNSUBSCRIBE, [self.id, subscription.id])
+        if not subscription.subscribers:
+            for link_ in link.links:
+                link_.unsubscribe(self.realm, subscription)
+            self._meta_event(meta.SUBSCRIPTION_ON_DELETE, [self.id, subscription.id])
+
+    def publish(self, msg: message.Publish):
+        uri.check(msg.topic)
+        publication_id = self.realm.broker.publish(self, msg)
+        for link_ in link.links:
+            link_.publish(self.realm, publication_id, msg)
+
+    def register(self, msg: message.Register):
+        uri.check(msg.procedure)
+        registration = self.realm.dealer.register(self, msg.procedure, msg.options.get('invoke', 'single'))
+        self.registrations[registration.id] = registration
+        self.send(message.Registered(request_id=msg.request_id, registration_id=registration.id))
+        for link_ in link.links:
+            link_.register(self.realm, registration)
+        if len(registration.callees) == 1:
+            self._meta_event(meta.REGISTRATION_ON_CREATE, [self.id, {'id': registration.id,
+                                                                     'uri': registration.procedure,
+                                                                     'match': 'exact',
+                                                                     'invoke': registration.invoke}])
+        self._meta_event(meta.REGISTRATION_ON_REGISTER, [self.id, registration.id])
+
+    def unregister(self, msg: message.Unregister):
+        registration = self.registrations.get(msg.registration_id)
+        if registration is None:
+            raise error.WampError(error.NO_SUCH_REGISTRATION)
+        self._unregister(registration)
+        self.send(message.Unregistered(request_id=msg.request_id))
+
+    def _unregister(self, registration: dealer.Registration):
+        del self.registrations[registration.id]
+        self.realm.dealer.unregister(self, registration.id)
+        if not link.has_local_callees(registration):
+            for link_ in link.links:
+                link_.unregister(self.realm, registration.procedure)
+        self._meta_event(meta.REGISTRATION_ON_UNREGISTER, [self.id, registration.id])
+        if not registration.callees:
+            self._meta_event(meta.REGISTRATION_ON_DELETE, [self.id, registration.id])
+
+    def call(self, msg: message.Call):
+        uri.check(msg.procedure)
+        if not meta.call(self, msg):
+            self.realm.dealer.call(self, msg)
+
+    def yield_(self, msg: message.Yield):
+        self.realm.dealer.yield_(self, msg)
+
+
+# Handlers of the messages a router accepts in each session state, by message class.
+_established = {
+    message.Abort: Session.abort,
+    message.Goodbye: Session.goodbye,
+    message.Error: Session.error,
+    message.Subscribe: Session.subscribe,
+    message.Unsubscribe: Session.unsubscribe,
+    message.Publish: Session.publish,
+    message.Register: Session.register,
+    message.Unregister: Session.unregister,
+    message.Call: Session.call,
+    message.Yield: Session.yield_,
+}  # type: Dict[type, Callable[[Session, Any], None]]
+
+_transitions = {
+    State.CLOSED: {message.Hello: Session.hello},
+    State.ESTABLISHING: {message.Abort: Session.abort},
+    State.CHALLENGING: {message.Abort: Session.abort, message.Authenticate: Session.authenticate},
+    State.ESTABLISHED: _established,
+    # The peer acknowledges the GOODBYE of the router.
+    State.CLOSING: {message.Goodbye: Session.abort},
+    State.SHUTTING_DOWN: {},
+    State.FAILED: {},
+}  # type: Dict[State, Dict[type, Callable[[Session, Any], None]]]
+
+
+def _authorizing(action: str, attribute: str,
+                 handler: Callable[[Session, Any], None]) -> Callable[[Session, Any], None]:
+    """Wrap the handler of a message to authorize its action on the URI in an attribute of the message first."""
+    def authorize(session: Session, msg: message.Message):
+        if session.authorize(msg, getattr(msg, attribute), action, handler):
+            handler(session, msg)
+    return authorize
+
 
-    def abort(self):
-        pass
+def _unauthorized(session: Session, msg: message.Message):
+    raise error.WampError(error.NOT_AUTHORIZED)
 
-    def goodbye(self):
-        pass
 
-    def error(self):
-        pass
+# The transitions of sessions in realms with an authorizer.
+_authorizing_transitions = dict(_transitions)
+_authorizing_transitions[State.ESTABLISHED] = dict(_established)
+_authorizing_transitions[State.ESTABLISHED].update({
+    message.Subscribe: _authorizing(authorizer.SUBSCRIBE, 'topic', Session.subscribe),
+    message.Publish: _authorizing(authorizer.PUBLISH, 'topic', Session.publish),
+    message.Register: _authorizing(authorizer.REGISTER, 'procedure', Session.register),
+    message.Call: _authorizing(authorizer.CALL, 'procedure', Session.call),
+})
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Realm sharding: groups of realms served by event loops on dedicated threads.
+
+Listeners and the I/O of every connection stay on the main loop. When the HELLO of a session names a realm assigned to
+a shard, the session is handed to the loop of that shard, which from then on runs its message handlers, its send
+queue and the broker and dealer of the realm. Received payloads and outbound writes cross between the two loops with
+call_soon_threadsafe, once per payload and once per flush of the send queue.
+
+A burst of traffic in one realm then queues on the loop of its shard, rather than ahead of the messages of every
+other realm on a single loop.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional  # noqa: F401
+
+from wouter.router import serializer
+
+logger = logging.getLogger(__name__)
+
+# The shard of each sharded realm, by realm name. Realms without a shard are served by the main loop.
+shards = {}  # type: Dict[str, Shard]
+
+
+class Shard:
+    """An event loop running on its own thread, serving a group of realms."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Stop the loop and wait for the thread to exit."""
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        self.loop.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        logger.info('shard %s started', self.name)
+        self.loop.run_forever()
+
+
+class ThreadTransport:
+    """
+    The transport of a session handed to a shard.
+
+    Writes and closes are forwarded to the loop the connection runs on, in the order the session makes them.
+    """
+
+    def __init__(self, transport, loop: asyncio.AbstractEventLoop):
+        """
+        :param transport: is the transport of the connection.
+        :param loop: is the event loop the connection runs on.
+        """
+        self.transport = transport
+        self.loop = loop
+
+    def write(self, payload: serializer.Payload):
+        self.loop.call_soon_threadsafe(self.transport.write, payload)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.transport.close)
+
+
+def assign(realms: Iterable[str]) -> Shard:
+    """
+    Create a shard serving a group of realms.
+
+    :raises ValueError: if a realm already belongs to a shard.
+    """
+    realms = list(realms)
+    for name in realms:
+        if name in shards:
+            raise ValueError('realm %r is already assigned to a shard' % name)
+
+    shard = Shard('shard-%d' % len(set(shards.values())))
+    for name in realms:
+        shards[name] = shard
+    return shard
+
+
+def get(realm: str) -> Optional[Shard]:
+    """Return the shard serving a realm, or None if it is served by the main loop."""
+    return shards.get(realm)
+
+
+def start():
+    """Start the thread of every shard."""
+    for shard in _all():
+        shard.start()
+
+
+def stop():
+    """Stop every shard and forget the assignments."""
+    for shard in _all():
+        shard.stop()
+    shards.clear()
+
+
+def _all() -> List[Shard]:
+    unique = []  # type: List[Shard]
+    for shard in shards.values():
+        if shard not in unique:
+            unique.append(shard)
+    return unique
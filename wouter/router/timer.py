@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Hierarchical timer wheel.
+
+Timers are kept in buckets on a set of wheels, each covering `slots` times the span of the one below. Scheduling and
+cancelling a timer are O(1); a timer is moved down a level at most once per wheel, when its bucket comes around. The
+wheel runs on one repeating event loop callback while it holds timers, rather than one loop handle per timer.
+"""
+import asyncio
+import logging
+import math
+from typing import Any, Callable, List, Optional, Set  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ('expires', 'callback', 'args', 'wheel', 'bucket')
+
+    def __init__(self, expires: int, callback: Callable, args: tuple, wheel: 'TimerWheel'):
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.wheel = wheel
+        self.bucket = None  # type: Optional[Set[Timer]]
+
+    def cancel(self):
+        """Cancel the timer; does nothing if it already fired or was cancelled."""
+        if self.bucket is not None:
+            self.bucket.discard(self)
+            self.bucket = None
+            self.wheel.count -= 1
+
+    def cancelled(self) -> bool:
+        return self.bucket is None
+
+
+class TimerWheel:
+    def __init__(self,
+                 resolution: float = 0.01,
+                 bits: int = 8,
+                 levels: int = 4,
+                 loop: asyncio.AbstractEventLoop = None):
+        """
+        :param resolution: is the duration of a tick in seconds; timers fire on the first tick at or after their delay.
+        :param bits: sets 2 ** bits slots per wheel.
+        :param levels: is the number of wheels; delays beyond 2 ** (bits * levels) ticks are clamped to that span.
+        :param loop: is the event loop the wheel runs on, by default the current event loop.
+        """
+        self.resolution = resolution
+        self.loop = loop
+        self.count = 0
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._levels = levels
+        self._span = 1 << (bits * levels)
+        self._wheels = [[set() for _ in range(1 << bits)] for _ in range(levels)]  # type: List[List[Set[Timer]]]
+        self._tick = 0
+        self._handle = None  # type: Optional[asyncio.Handle]
+
+    def __len__(self):
+        return self.count
+
+    def _now(self) -> int:
+        return int(self._get_loop().time() / self.resolution)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        return self.loop
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        """Schedule callback(*args) after delay seconds and return its timer."""
+        if self._handle is None:
+            self._tick = self._now()
+            self._schedule_tick()
+        return self.schedule(self._tick + math.ceil(delay / self.resolution), callback, *args)
+
+    def schedule(self, expires: int, callback: Callable, *args: Any) -> Timer:
+        """Schedule callback(*args) on an absolute tick."""
+        timer = Timer(expires, callback, args, self)
+        self._place(timer)
+        self.count += 1
+        return timer
+
+    def _place(self, timer: Timer):
+        delta = timer.expires - self._tick
+        if delta < 0:
+            timer.expires = self._tick
+            delta = 0
+        elif delta >= self._span:
+            timer.expires = self._tick + self._span - 1
+            delta = self._span - 1
+
+        level = 0
+        while delta >> (self._bits * (level + 1)):
+            level += 1
+
+        bucket = self._wheels[level][(timer.expires >> (self._bits * level)) & self._mask]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def _cascade(self, level: int) -> int:
+        """Move the timers of the current bucket of a wheel down to the wheels below; return the bucket index."""
+        index = (self._tick >> (self._bits * level)) & self._mask
+        bucket = self._wheels[level][index]
+        if bucket:
+            self._wheels[level][index] = set()
+            for timer in bucket:
+                self._place(timer)
+        return index
+
+    def advance(self, now: int):
+        """Fire every timer that expires on or before tick now."""
+        wheel = self._wheels[0]
+        while self._tick <= now:
+            index = self._tick & self._mask
+            if index == 0:
+                level = 1
+                while level < self._levels and self._cascade(level) == 0:
+                    level += 1
+
+            bucket = wheel[index]
+            self._tick += 1
+            if not bucket:
+                continue
+
+            wheel[index] = set()
+            self.count -= len(bucket)
+            for timer in bucket:
+                timer.bucket = None
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    logger.exception('timer callback %r failed', timer.callback)
+
+            if not self.count:
+                break
+
+    def _schedule_tick(self):
+        loop = self._get_loop()
+        self._handle = loop.call_at((self._tick + 1) * self.resolution, self._run)
+
+    def _run(self):
+        self.advance(self._now())
+        if self.count:
+            self._schedule_tick()
+        else:
+            self._handle = None
+
+    def close(self):
+        """Cancel every timer and stop the wheel."""
+        for wheel in self._wheels:
+            for bucket in wheel:
+                for timer in bucket:
+                    timer.bucket = None
+                bucket.clear()
+        self.count = 0
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
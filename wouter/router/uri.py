@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+URI validation (WAMP basic profile, section 5.1.1).
+
+Loose URIs only exclude whitespace, '#' and empty components; strict URIs consist of lowercase letters, digits and
+underscores. Wildcard patterns may also have empty components.
+
+Validation results are kept in an LRU cache, so the hot topics and procedures seen on every publication and call are
+only matched against a pattern the first time.
+"""
+import functools
+import re
+
+from wouter.router import error
+
+LOOSE = 'loose'
+STRICT = 'strict'
+
+# Validation mode of the router, set from the command line.
+mode = LOOSE
+
+CACHE_SIZE = 4096
+
+_patterns = {
+    (LOOSE, False): re.compile(r'([^\s.#]+\.)*([^\s.#]+)'),
+    (LOOSE, True): re.compile(r'(([^\s.#]+\.)|\.)*([^\s.#]+)?'),
+    (STRICT, False): re.compile(r'([0-9a-z_]+\.)*([0-9a-z_]+)'),
+    (STRICT, True): re.compile(r'(([0-9a-z_]+\.)|\.)*([0-9a-z_]+)?'),
+}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _valid(uri: str, mode_: str, empty: bool) -> bool:
+    return _patterns[mode_, empty].fullmatch(uri) is not None
+
+
+def is_valid(uri, empty: bool = False, mode_: str = None) -> bool:
+    """
+    Return whether a URI is valid.
+
+    :param empty: allows empty components, as in wildcard patterns.
+    :param mode_: is LOOSE or STRICT, by default the mode of the router.
+    """
+    return type(uri) is str and _valid(uri, mode_ or mode, empty)
+
+
+def check(uri, empty: bool = False):
+    """
+    Validate a URI in the mode of the router.
+
+    :raises error.WampError: if the URI is invalid.
+    """
+    if not (type(uri) is str and _valid(uri, mode, empty)):
+        raise error.WampError(error.INVALID_URI, 'invalid URI %r' % (uri,))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018, Leigh McKenzie
+# All rights reserved.
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+
+"""
+Multi-process mode.
+
+The router forks worker processes that each run an event loop and accept connections on the same ports, which the
+kernel balances between them with SO_REUSEPORT. Workers share their realms over a full mesh of links on Unix domain
+sockets, so a subscriber connected to one worker receives the events published on another, and calls reach callees
+on any worker.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import tempfile
+from typing import Awaitable, Callable, List
+
+from wouter.router import link
+
+logger = logging.getLogger(__name__)
+
+
+def link_path(directory: str, index: int) -> str:
+    return os.path.join(directory, 'worker-%d.sock' % index)
+
+
+def spawn(count: int, serve: Callable[[int], Awaitable]) -> int:
+    """
+    Fork worker processes and wait for them to exit.
+
+    :param count: is the number of workers.
+    :param serve: starts the listeners of a worker given its index, and must set reuse_port on the ports they share.
+    :return: 0 if every worker exited cleanly, 1 otherwise.
+    """
+    directory = tempfile.mkdtemp(prefix='wouter-')
+    children = []  # type: List[int]
+    try:
+        for index in range(count):
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    status = _work(index, directory, serve)
+                except KeyboardInterrupt:
+                    status = 0
+                except Exception:
+                    logger.exception('worker %d failed', index)
+                finally:
+                    os._exit(status)
+            children.append(pid)
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: _kill(children, signum))
+        return _wait(children)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _work(index: int, directory: str, serve: Callable[[int], Awaitable]) -> int:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(serve(index))
+
+    # Each worker accepts links from the workers after it and links to the workers before it.
+    loop.run_until_complete(link.start_link_unix(link_path(directory, index)))
+    for peer in range(index):
+        loop.run_until_complete(link.connect_link_unix(link_path(directory, peer)))
+
+    logger.info('worker %d of pid %d started', index, os.getpid())
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    loop.run_forever()
+    return 0
+
+
+def _kill(children: List[int], signum: int):
+    for pid in children:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _wait(children: List[int]) -> int:
+    status = 0
+    remaining = set(children)
+    while remaining:
+        try:
+            pid, code = os.wait()
+        except KeyboardInterrupt:
+            # Workers receive the interrupt of the terminal too.
+            continue
+        except ChildProcessError:
+            break
+        remaining.discard(pid)
+        if code:
+            status = 1
+            logger.warning('worker process %d exited with status %d', pid, code)
+    return status